@@ -0,0 +1,61 @@
+"""
+Runs a single Poetry command in this process, and writes its measurements as JSON to the given file.
+
+Usage: python -m benchmarks.measure RESULT_PATH (plugin|baseline) POETRY_ARGS...
+
+For the baseline, the plugin is installed but never activated, such that only its own overhead differs.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+
+def peak_rss_kib() -> int | None:
+    """Returns the peak resident memory of this process, in KiB, if the platform reports it."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # reported in bytes on macOS, in KiB elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def main(argv: list[str]) -> int:
+    result_path, variant, *args = argv
+    from cleo.io.inputs.argv_input import ArgvInput
+    from cleo.io.outputs.null_output import NullOutput
+    from cleo.io.outputs.stream_output import StreamOutput
+    from poetry.console.application import Application
+
+    from poetry_plugin_mono_repo_deps.metrics import METRICS_ENV
+    from poetry_plugin_mono_repo_deps.plugin import MonoRepoDepsPlugin
+
+    metrics_path = Path(f"{result_path}.metrics")
+    if variant == "baseline":
+        setattr(MonoRepoDepsPlugin, "activate", lambda _self, _application: None)
+    else:
+        os.environ[METRICS_ENV] = str(metrics_path)
+
+    application = Application()
+    application.auto_exits(False)
+    start = time.perf_counter()
+    exit_code = application.run(ArgvInput(["poetry", *args]), NullOutput(), StreamOutput(sys.stderr))
+    duration = time.perf_counter() - start
+
+    result: dict[str, Any] = {"exit_code": exit_code, "duration": duration, "peak_rss_kib": peak_rss_kib()}
+    if metrics_path.exists():
+        result["metrics"] = json.loads(metrics_path.read_text().splitlines()[-1])
+        metrics_path.unlink()
+    Path(result_path).write_text(json.dumps(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+
+PYTHON_VERSIONS = "^3.8"
+VERSION = "0.1.0"
+EXTERNAL_VERSION = "1.0.0"
+
+
+@dataclass(frozen=True)
+class MonorepoShape:
+    """The dimensions of a generated mono repository."""
+
+    packages: int
+    """The number of internal packages, the last one is the target of the benchmarked commands"""
+    fanout: int
+    """The number of path dependencies of each package, on the packages preceding it"""
+    groups: int
+    """The number of dependency groups the path dependencies are spread over, the main group included"""
+    lock_size: int
+    """The number of external packages, all of which are locked by the target package"""
+
+    @property
+    def key(self) -> str:
+        return f"packages={self.packages},fanout={self.fanout},groups={self.groups},lock_size={self.lock_size}"
+
+
+def package_name(index: int) -> str:
+    return f"lib-{index:04d}"
+
+
+def external_name(index: int) -> str:
+    return f"ext-{index:04d}"
+
+
+def group_name(index: int) -> str:
+    return "main" if index == 0 else f"group-{index}"
+
+
+def path_dependencies(shape: MonorepoShape, index: int) -> dict[str, list[int]]:
+    """Returns the packages each group of the package depends on, spread round robin over the groups."""
+    groups: dict[str, list[int]] = {}
+    for i, dependency in enumerate(range(index - 1, max(-1, index - 1 - shape.fanout), -1)):
+        groups.setdefault(group_name(i % max(1, shape.groups)), []).append(dependency)
+    return groups
+
+
+def external_dependencies(shape: MonorepoShape, index: int) -> list[int]:
+    """Returns the external packages the package depends on, the target depends on the root of all of them."""
+    if shape.lock_size == 0:
+        return []
+    if index == shape.packages - 1:
+        return [0]
+    return [index % shape.lock_size]
+
+
+def external_children(shape: MonorepoShape, index: int) -> list[int]:
+    """The external packages form a binary tree, such that the exporter has to walk all of them."""
+    return [child for child in (2 * index + 1, 2 * index + 2) if child < shape.lock_size]
+
+
+def write_pyproject(root: Path, shape: MonorepoShape, index: int) -> None:
+    name = package_name(index)
+    project_dir = root / name
+    (project_dir / name.replace("-", "_")).mkdir(parents=True, exist_ok=True)
+    (project_dir / name.replace("-", "_") / "__init__.py").write_text(f"NAME = {name!r}\n")
+    groups = path_dependencies(shape, index)
+    lines = [
+        "[tool.poetry]",
+        f'name = "{name}"',
+        f'version = "{VERSION}"',
+        'description = ""',
+        "authors = []",
+        "",
+        "[tool.poetry.dependencies]",
+        f'python = "{PYTHON_VERSIONS}"',
+    ]
+    lines.extend(
+        f'{package_name(dep)} = {{path = "../{package_name(dep)}", develop = true}}' for dep in groups.pop("main", [])
+    )
+    lines.extend(f'{external_name(dep)} = ">={EXTERNAL_VERSION}"' for dep in external_dependencies(shape, index))
+    for group, dependencies in groups.items():
+        lines.extend(["", f"[tool.poetry.group.{group}.dependencies]"])
+        lines.extend(
+            f'{package_name(dep)} = {{path = "../{package_name(dep)}", develop = true}}' for dep in dependencies
+        )
+    lines.extend(["", "[tool.poetry-monorepo.deps]", ""])
+    (project_dir / "pyproject.toml").write_text("\n".join(lines))
+
+
+def locked_packages(shape: MonorepoShape) -> list[int]:
+    """Returns the internal packages locked by the target: its path dependencies (of all groups), and theirs (main)."""
+    target = shape.packages - 1
+    locked: set[int] = set()
+    pending = [dep for deps in path_dependencies(shape, target).values() for dep in deps]
+    while pending:
+        index = pending.pop()
+        if index not in locked:
+            locked.add(index)
+            pending.extend(path_dependencies(shape, index).get("main", []))
+    return sorted(locked)
+
+
+def lock_entry(name: str, version: str, dependencies: list[str], source: str | None = None) -> list[str]:
+    lines = [
+        "[[package]]",
+        f'name = "{name}"',
+        f'version = "{version}"',
+        'description = ""',
+        "optional = false",
+        f'python-versions = "{PYTHON_VERSIONS if source else "*"}"',
+        "files = []",
+    ]
+    if source is not None:
+        lines.append("develop = true")
+    if dependencies:
+        lines.extend(["", "[package.dependencies]", *dependencies])
+    if source is not None:
+        lines.extend(["", "[package.source]", 'type = "directory"', f'url = "{source}"'])
+    return [*lines, ""]
+
+
+def write_lock(root: Path, shape: MonorepoShape) -> int:
+    """Writes the (fresh) lock file of the target package, returns the number of locked packages."""
+    from poetry.factory import Factory
+
+    lines: list[str] = []
+    internal = locked_packages(shape)
+    for index in internal:
+        name = package_name(index)
+        dependencies = [
+            f'{package_name(dep)} = {{path = "../{package_name(dep)}", develop = true}}'
+            for dep in path_dependencies(shape, index).get("main", [])
+        ]
+        dependencies.extend(
+            f'{external_name(dep)} = ">={EXTERNAL_VERSION}"' for dep in external_dependencies(shape, index)
+        )
+        lines.extend(lock_entry(name, VERSION, dependencies, source=f"../{name}"))
+    for index in range(shape.lock_size):
+        dependencies = [f'{external_name(dep)} = ">={EXTERNAL_VERSION}"' for dep in external_children(shape, index)]
+        lines.extend(lock_entry(external_name(index), EXTERNAL_VERSION, dependencies))
+
+    target_dir = root / package_name(shape.packages - 1)
+    content_hash = Factory().create_poetry(target_dir, disable_plugins=True).locker._get_content_hash()
+    lines.extend(
+        [
+            "[metadata]",
+            'lock-version = "2.0"',
+            f'python-versions = "{PYTHON_VERSIONS}"',
+            f'content-hash = "{content_hash}"',
+            "",
+        ]
+    )
+    (target_dir / "poetry.lock").write_text("\n".join(lines))
+    return len(internal) + shape.lock_size
+
+
+def generate_monorepo(root: Path, shape: MonorepoShape) -> tuple[Path, int]:
+    """
+    Generates a mono repository of the given shape, returns the directory of its target package, and the number of
+    packages in its lock file.
+
+    Only the target package is locked. The external packages are never installed, thus don't need to exist.
+    """
+    if shape.packages < 1:
+        raise ValueError("A mono repository needs at least one package")
+    for index in range(shape.packages):
+        write_pyproject(root, shape, index)
+    return root / package_name(shape.packages - 1), write_lock(root, shape)
@@ -0,0 +1,153 @@
+"""
+Benchmarks `poetry build` and `poetry export` on generated mono repositories, with the plugin and without it.
+
+Each combination of the given dimensions is a scenario. Each command runs in a fresh process, thus the durations
+include Poetry's own startup, which the baseline (without the plugin) shows. The results are saved as JSON, and can be
+compared with the results of an earlier run:
+
+    python -m benchmarks.run --packages 10 100 --lock-size 100 1000 --output after.json --compare before.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+from benchmarks.monorepo import MonorepoShape, generate_monorepo
+
+COMMANDS = {
+    "build": ["build"],
+    "export": ["export", "--without-hashes", "--output", "requirements.txt"],
+}
+VARIANTS = ["baseline", "plugin"]
+ROOT_DIR = Path(__file__).parent.parent
+
+
+def measure(project_dir: Path, variant: str, args: list[str]) -> dict[str, Any]:
+    """Runs the Poetry command in a fresh process, returns its measurements."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        result_path = Path(temp_dir) / "result.json"
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join([str(ROOT_DIR), os.environ.get("PYTHONPATH", "")])}
+        process = subprocess.run(
+            [sys.executable, "-m", "benchmarks.measure", str(result_path), variant, *args],
+            cwd=project_dir,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode != 0 or not result_path.exists():
+            raise RuntimeError(f"Failed to measure {' '.join(args)} ({variant}):\n{process.stderr}")
+        result: dict[str, Any] = json.loads(result_path.read_text())
+    if result["exit_code"] != 0:
+        raise RuntimeError(f"poetry {' '.join(args)} ({variant}) failed with exit code {result['exit_code']}")
+    # the next run shouldn't reuse (or overwrite) the artifacts of this one
+    shutil.rmtree(project_dir / "dist", ignore_errors=True)
+    return result
+
+
+def run_scenario(shape: MonorepoShape, commands: list[str], repeat: int) -> list[dict[str, Any]]:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        start = time.perf_counter()
+        project_dir, lock_size = generate_monorepo(Path(temp_dir), shape)
+        print(f"{shape.key}: generated {lock_size} locked packages in {time.perf_counter() - start:.1f}s")
+        results = []
+        for command, variant in itertools.product(commands, VARIANTS):
+            runs = [measure(project_dir, variant, COMMANDS[command]) for _ in range(repeat)]
+            durations = [run["duration"] for run in runs]
+            peaks = [run["peak_rss_kib"] for run in runs if run["peak_rss_kib"] is not None]
+            results.append(
+                {
+                    "scenario": shape.key,
+                    "shape": vars(shape),
+                    "locked_packages": lock_size,
+                    "command": command,
+                    "variant": variant,
+                    "durations": durations,
+                    "median": statistics.median(durations),
+                    "peak_rss_kib": max(peaks) if peaks else None,
+                    # the timings and counters of the plugin's phases, of the last run
+                    "metrics": runs[-1].get("metrics"),
+                }
+            )
+    return results
+
+
+def environment() -> dict[str, Any]:
+    from importlib.metadata import version
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "poetry": version("poetry"),
+        "poetry-core": version("poetry-core"),
+        "plugin": version("poetry-plugin-mono-repo-deps"),
+    }
+
+
+def overheads(results: list[dict[str, Any]]) -> dict[tuple[str, str], dict[str, Any]]:
+    """Returns the plugin and baseline results of each scenario and command, by scenario and command."""
+    by_key: dict[tuple[str, str], dict[str, Any]] = {}
+    for result in results:
+        by_key.setdefault((result["scenario"], result["command"]), {})[result["variant"]] = result
+    return by_key
+
+
+def print_report(results: list[dict[str, Any]], previous: list[dict[str, Any]] | None) -> None:
+    previous_by_key = overheads(previous or [])
+    print(f"{'scenario':<50} {'command':<8} {'baseline':>9} {'plugin':>9} {'overhead':>9} {'rss':>9} {'previous':>9}")
+    for (scenario, command), variants in overheads(results).items():
+        baseline, plugin = variants["baseline"], variants["plugin"]
+        overhead = plugin["median"] - baseline["median"]
+        rss = (
+            f"{(plugin['peak_rss_kib'] - baseline['peak_rss_kib']) / 1024:+.1f}M"
+            if plugin["peak_rss_kib"] is not None and baseline["peak_rss_kib"] is not None
+            else "-"
+        )
+        before = previous_by_key.get((scenario, command), {}).get("plugin")
+        change = f"{plugin['median'] / before['median'] - 1:+.0%}" if before else "-"
+        print(
+            f"{scenario:<50} {command:<8} {baseline['median']:>8.3f}s {plugin['median']:>8.3f}s {overhead:>+8.3f}s "
+            f"{rss:>9} {change:>9}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--packages", type=int, nargs="+", default=[10, 50], help="The numbers of packages")
+    parser.add_argument("--fanout", type=int, nargs="+", default=[3], help="The path dependencies per package")
+    parser.add_argument("--groups", type=int, nargs="+", default=[2], help="The dependency groups per package")
+    parser.add_argument("--lock-size", type=int, nargs="+", default=[100, 1000], help="The external packages")
+    parser.add_argument("--commands", nargs="+", choices=list(COMMANDS), default=list(COMMANDS))
+    parser.add_argument("--repeat", type=int, default=3, help="The runs of each command, the median is reported")
+    parser.add_argument("--output", type=Path, help="The JSON file to save the results to")
+    parser.add_argument("--compare", type=Path, help="The JSON file of an earlier run to compare with")
+    args = parser.parse_args(argv)
+
+    results = []
+    for packages, fanout, groups, lock_size in itertools.product(
+        args.packages, args.fanout, args.groups, args.lock_size
+    ):
+        results.extend(run_scenario(MonorepoShape(packages, fanout, groups, lock_size), args.commands, args.repeat))
+
+    previous = json.loads(args.compare.read_text())["results"] if args.compare else None
+    print_report(results, previous)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps({"environment": environment(), "results": results}, indent=2) + "\n")
+        print(f"Saved the results to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Rewrites the path dependencies of a project in-process, without running a Poetry command.
+
+The functions never modify the given Poetry project (nor the files of the project), all results are new objects. Thus,
+these can be called many times in one process, from multiple threads.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Union, cast
+
+from poetry_plugin_mono_repo_deps.plugin import (
+    Config,
+    LockedPackageIndex,
+    create_named_dependency,
+    find_package,
+    is_to_be_replaced_dependency,
+    load_config,
+    load_locked_packages,
+    modify_locked_package_to_named,
+    named_requirements,
+    pin_pyproject_content,
+    replaced_dependencies,
+)
+
+if TYPE_CHECKING:
+    from poetry.core.packages.dependency import Dependency
+    from poetry.poetry import Poetry
+
+Project = Union["Poetry", Path, str]
+"""A loaded Poetry project, or the directory (or pyproject.toml) of one"""
+
+
+@dataclass(frozen=True)
+class RewrittenProject:
+    """A project with its path dependencies replaced by named dependencies, as the plugin does for its commands."""
+
+    dependencies: dict[str, list[Dependency]]
+    """The dependencies of each dependency group of the root package, by group name, as `build` and `export` see them"""
+    named_requirements: dict[str, str]
+    """The named requirements (PEP 508) that replaced the path dependencies, by (canonical) name"""
+    lock_data: dict[str, Any] | None
+    """The lock data with the locked path packages as named packages, as `export` sees it, if the project is locked"""
+    pyproject: str
+    """The content of the pyproject.toml with its path dependencies replaced, as `build` includes it in the sdist"""
+
+
+def load_project(project: Project) -> Poetry:
+    """Returns the Poetry project, loading it (without plugins) if a directory or pyproject.toml is given."""
+    from poetry.factory import Factory
+
+    if not isinstance(project, (Path, str)):
+        return project
+    path = Path(project)
+    return Factory().create_poetry(path.parent if path.name == "pyproject.toml" else path, disable_plugins=True)
+
+
+def rewrite_dependencies(config: Config, poetry: Poetry, locked: LockedPackageIndex) -> dict[str, list[Dependency]]:
+    """Returns the dependencies of each group of the root package, with the path dependencies replaced."""
+    dependencies: dict[str, list[Dependency]] = {}
+    for group_name in poetry.package.dependency_group_names():
+        group = poetry.package.dependency_group(group_name)
+        replacements: dict[str, Dependency] = {}
+        for dep in group.dependencies:
+            package = find_package(locked, dep.name) if is_to_be_replaced_dependency(config, dep) else None
+            if package is not None:
+                replacements[dep.name] = create_named_dependency(config.constraint, dep, package)
+        dependencies[group_name] = replaced_dependencies(group.dependencies, replacements)
+    return dependencies
+
+
+def read_lock_data(poetry: Poetry) -> dict[str, Any] | None:
+    """Returns a copy of the lock data of the project, if it is locked."""
+    from poetry.utils._compat import tomllib
+
+    lock_path = poetry.locker.lock
+    if not lock_path.exists():
+        return None
+    with lock_path.open("rb") as f:
+        return tomllib.load(f)
+
+
+def rewrite_lock_data(config: Config, poetry: Poetry, locked: LockedPackageIndex) -> dict[str, Any] | None:
+    """Returns a copy of the lock data of the project, with the locked path packages as named packages."""
+    lock_data = read_lock_data(poetry)
+    if lock_data is None:
+        return None
+    for info in cast(List[Dict[str, Any]], lock_data.get("package", [])):
+        modify_locked_package_to_named(config, info, locked)
+    return lock_data
+
+
+def rewrite_project(project: Project, config: Config | None = None) -> RewrittenProject:
+    """
+    Returns the dependencies, lock data and pyproject.toml of the project, with its path dependencies replaced.
+
+    Uses the configuration of the project by default. As with the plugin itself, a project that doesn't configure (or
+    disables) the plugin is left as is, and the versions of the path dependencies are taken from the lock file (or from
+    the path dependencies themselves, depending on the configuration).
+    """
+    poetry = load_project(project)
+    if config is None:
+        config = load_config(poetry)
+    # the loaded document, which the (in-process) caller may have changed since it was read from disk
+    content = poetry.pyproject.data.as_string()
+    if config is None:
+        return RewrittenProject(
+            dependencies={
+                group_name: list(poetry.package.dependency_group(group_name).dependencies)
+                for group_name in poetry.package.dependency_group_names()
+            },
+            named_requirements={},
+            lock_data=read_lock_data(poetry),
+            pyproject=content,
+        )
+    # a new index for each call, as the versions read from the path dependencies are set on it
+    locked = load_locked_packages(config, poetry)
+    pyproject = pin_pyproject_content(config, locked, content.encode("utf-8"))
+    return RewrittenProject(
+        dependencies=rewrite_dependencies(config, poetry, locked),
+        named_requirements=named_requirements(config, poetry.package, locked),
+        lock_data=rewrite_lock_data(config, poetry, locked),
+        pyproject=pyproject.decode("utf-8"),
+    )
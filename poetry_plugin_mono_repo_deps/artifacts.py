@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from gzip import GzipFile
+from pathlib import Path
+from typing import Callable
+
+from packaging.utils import canonicalize_name, canonicalize_version
+
+REQUIRES_DIST = re.compile(r"^Requires-Dist: (?P<name>[A-Za-z0-9._-]+)(\[[^\]]*\])? @ file:[^\s;]*(?P<marker>.*)$")
+"""A requirement on a file URL in the metadata, like `Requires-Dist: lib-a @ file:///repo/lib-a ; extra == "a"`"""
+
+
+def rewrite_metadata(content: bytes, requirements: dict[str, str]) -> bytes:
+    """Replaces the requirements on file URLs in the (core) metadata with the named requirements, by canonical name."""
+    lines = content.decode("utf-8").split("\n")
+    for i, line in enumerate(lines):
+        if not line:
+            # the headers end at the first empty line, the description follows
+            break
+        match = REQUIRES_DIST.match(line)
+        requirement = requirements.get(canonicalize_name(match["name"])) if match else None
+        if match and requirement:
+            lines[i] = f"Requires-Dist: {requirement}{match['marker']}"
+    return "\n".join(lines).encode("utf-8")
+
+
+def record_hash(content: bytes) -> str:
+    """Returns the hash of a file, as listed in the RECORD of a wheel."""
+    digest = base64.urlsafe_b64encode(hashlib.sha256(content).digest()).rstrip(b"=").decode("ascii")
+    return f"sha256={digest}"
+
+
+def replace_file(path: Path, write: Callable[[io.BufferedWriter], None]) -> None:
+    """Replaces the file by the content written to a temporary file next to it, thus it's never partially written."""
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def rewrite_wheel(path: Path, requirements: dict[str, str]) -> bool:
+    """
+    Replaces the requirements on file URLs in the metadata of the wheel, and updates its RECORD accordingly.
+
+    All other files are streamed from the original archive into the new one. Returns whether the wheel was rewritten.
+    """
+    with zipfile.ZipFile(path) as source:
+        metadata_name = next(
+            (name for name in source.namelist() if name.count("/") == 1 and name.endswith(".dist-info/METADATA")), None
+        )
+        if metadata_name is None:
+            return False
+        metadata = source.read(metadata_name)
+        pinned = rewrite_metadata(metadata, requirements)
+        if pinned == metadata:
+            return False
+        record_name = metadata_name[: -len("METADATA")] + "RECORD"
+        record_line = f"{metadata_name},{record_hash(pinned)},{len(pinned)}"
+        record = "\n".join(
+            record_line if line.startswith(f"{metadata_name},") else line
+            for line in source.read(record_name).decode("utf-8").split("\n")
+        ).encode("utf-8")
+
+        def write(f: io.BufferedWriter) -> None:
+            with zipfile.ZipFile(f, "w", compression=zipfile.ZIP_DEFLATED) as target:
+                for info in source.infolist():
+                    if info.filename == metadata_name:
+                        target.writestr(info, pinned)
+                    elif info.filename == record_name:
+                        target.writestr(info, record)
+                    else:
+                        with source.open(info) as src, target.open(info, "w") as dst:
+                            shutil.copyfileobj(src, dst)
+
+        replace_file(path, write)
+    return True
+
+
+def rewrite_sdist(path: Path, requirements: dict[str, str], rewrite_pyproject: Callable[[bytes], bytes]) -> bool:
+    """
+    Replaces the requirements on file URLs in the PKG-INFO of the sdist, and the path dependencies of its pyproject.
+
+    All other files are streamed from the original archive into the new one, which is compressed reproducibly (like
+    Poetry does). Returns whether the sdist was rewritten.
+    """
+    with tarfile.open(path, "r:gz") as source:
+        members = source.getmembers()
+        top = members[0].name.split("/")[0] if members else ""
+        rewrites: dict[str, Callable[[bytes], bytes]] = {
+            f"{top}/PKG-INFO": lambda content: rewrite_metadata(content, requirements),
+            f"{top}/pyproject.toml": rewrite_pyproject,
+        }
+        rewritten: dict[str, bytes] = {}
+        for member in members:
+            extracted = source.extractfile(member) if member.name in rewrites else None
+            if extracted is not None:
+                content = extracted.read()
+                pinned = rewrites[member.name](content)
+                if pinned != content:
+                    rewritten[member.name] = pinned
+        if not rewritten:
+            return False
+
+        def write(f: io.BufferedWriter) -> None:
+            with GzipFile(fileobj=f, mode="wb", mtime=0) as gz, tarfile.open(
+                fileobj=gz, mode="w", format=tarfile.PAX_FORMAT
+            ) as target:
+                for member in members:
+                    if member.name in rewritten:
+                        member.size = len(rewritten[member.name])
+                        target.addfile(member, io.BytesIO(rewritten[member.name]))
+                    else:
+                        target.addfile(member, source.extractfile(member) if member.isfile() else None)
+
+        replace_file(path, write)
+    return True
+
+
+def artifact_name_version(path: Path) -> tuple[str, str] | None:
+    """Returns the (canonical) name and version of the package of the artifact, based on its file name."""
+    if path.suffix == ".whl":
+        name, version = path.name.split("-")[:2]
+    elif path.name.endswith(".tar.gz"):
+        name, _, version = path.name[: -len(".tar.gz")].rpartition("-")
+    else:
+        return None
+    return canonicalize_name(name), canonicalize_version(version)
+
+
+@dataclass(frozen=True)
+class ArtifactPinning:
+    """Pins the path dependencies in the built artifacts (wheels and sdists) of a package, to named requirements."""
+
+    name: str
+    version: str
+    requirements: dict[str, str]
+    """The named requirements (PEP 508) replacing the path dependencies, by canonical name"""
+    rewrite_pyproject: Callable[[bytes], bytes]
+    """Replaces the path dependencies in the content of the pyproject.toml of the sdist"""
+
+    def find_artifacts(self, directory: Path) -> list[Path]:
+        """Returns the artifacts of this version of the package in the directory."""
+        expected = (canonicalize_name(self.name), canonicalize_version(self.version))
+        return [path for path in sorted(directory.iterdir()) if artifact_name_version(path) == expected]
+
+    def pin(self, path: Path) -> bool:
+        """Pins the path dependencies in the artifact, in place. Returns whether it was rewritten."""
+        if path.suffix == ".whl":
+            return rewrite_wheel(path, self.requirements)
+        if path.name.endswith(".tar.gz"):
+            return rewrite_sdist(path, self.requirements, self.rewrite_pyproject)
+        return False
+
+    def pin_all(self, paths: list[Path], jobs: int) -> list[Path]:
+        """Pins the path dependencies in the artifacts in parallel. Returns the artifacts that were rewritten."""
+        # the archives are mostly (de)compressed, which doesn't hold the GIL
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            return [path for path, pinned in zip(paths, executor.map(self.pin, paths)) if pinned]
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, cast
+
+if TYPE_CHECKING:
+    from cleo.io.io import IO
+    from poetry.core.masonry.builders.builder import Builder
+    from poetry.core.masonry.builders.wheel import WheelBuilder
+
+CACHE_VERSION = 2
+"""The version of the cache layout and keys, part of each key such that changes never reuse older artifacts."""
+
+BUILDERS = {
+    "sdist": ("poetry.core.masonry.builders.sdist", "SdistBuilder"),
+    "wheel": ("poetry.core.masonry.builders.wheel", "WheelBuilder"),
+}
+"""The modules and classes of the builders (by format) of which the artifacts are cached."""
+
+
+def hash_values(*values: Any) -> str:
+    """Returns a hash of the (JSON serializable) values."""
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def tree_hash(directory: Path, ignore_names: list[str], ignore_paths: list[Path]) -> str:
+    """
+    Returns a hash of the names and contents of all files in the directory tree.
+
+    Files and directories with an ignored name (anywhere in the tree) or an ignored path (relative to the directory) are
+    not part of the hash. Symlinks are followed, thus the contents of symlinked directories are part of the hash.
+    """
+    digest = hashlib.sha256()
+    visited: set[str] = set()
+    for root, dirs, files in os.walk(directory, followlinks=True):
+        # symlinks can form a cycle, a directory is only hashed once
+        real_root = os.path.realpath(root)
+        if real_root in visited:
+            dirs[:] = []
+            continue
+        visited.add(real_root)
+        root_path = Path(root)
+        relative_root = root_path.relative_to(directory)
+        dirs[:] = sorted(name for name in dirs if name not in ignore_names and relative_root / name not in ignore_paths)
+        files = [name for name in files if name not in ignore_names and relative_root / name not in ignore_paths]
+        for name in sorted(files):
+            digest.update((relative_root / name).as_posix().encode("utf-8") + b"\0")
+            with (root_path / name).open("rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def external_sources(project_dir: Path, pyproject_data: dict[str, Any]) -> list[str]:
+    """
+    Returns the configured sources of the package (its packages, includes and readme) outside the project directory.
+
+    These are not part of the tree hash of the project directory, thus the artifacts of such a package can't be cached.
+    """
+    from poetry_plugin_mono_repo_deps.staging import is_outside
+
+    poetry_config: dict[str, Any] = pyproject_data.get("tool", {}).get("poetry", {})
+    paths = [os.path.join(package.get("from", ""), package["include"]) for package in poetry_config.get("packages", [])]
+    paths += [include if isinstance(include, str) else include["path"] for include in poetry_config.get("include", [])]
+    readme = poetry_config.get("readme", [])
+    paths += [readme] if isinstance(readme, str) else readme
+    project_readme = pyproject_data.get("project", {}).get("readme")
+    if isinstance(project_readme, dict):
+        project_readme = project_readme.get("file")
+    if isinstance(project_readme, str):
+        paths.append(project_readme)
+    return [path for path in paths if is_outside(path, project_dir)]
+
+
+class ArtifactCache:
+    """
+    A directory of build artifacts, each stored in a directory named after its (content-addressed) key.
+
+    The cache is limited in size, when it grows beyond its maximum size the least recently used artifacts are removed.
+    """
+
+    def __init__(self, directory: Path, max_size: int) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        """The maximum size of the cache, in bytes"""
+
+    def get(self, key: str) -> Path | None:
+        """Returns the artifact with the given key, if it is cached, marking it as recently used."""
+        entry = self.directory / key
+        try:
+            artifacts = list(entry.iterdir())
+            if len(artifacts) != 1:
+                return None
+            # the modification time of the entry is its last use
+            os.utime(entry)
+        except (FileNotFoundError, NotADirectoryError):
+            # not cached, or evicted by a concurrent build
+            return None
+        return artifacts[0]
+
+    def put(self, key: str, artifact: Path) -> None:
+        """Stores a copy of the artifact under the given key, and evicts the least recently used artifacts."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # prepared next to the entries, such that concurrent builds never see a partially written entry
+        staged = Path(tempfile.mkdtemp(dir=self.directory, prefix=".tmp-"))
+        shutil.copyfile(artifact, staged / artifact.name)
+        try:
+            os.replace(staged, self.directory / key)
+        except OSError:
+            # another build already stored the same artifact
+            shutil.rmtree(staged, ignore_errors=True)
+        self.evict()
+
+    def evict(self) -> None:
+        """Removes the least recently used artifacts, until the cache fits its maximum size."""
+        entries = []
+        total_size = 0
+        for entry in self.directory.iterdir():
+            if entry.name.startswith("."):
+                continue
+            try:
+                size = sum(path.stat().st_size for path in entry.iterdir())
+                entries.append((entry.stat().st_mtime_ns, entry, size))
+            except FileNotFoundError:
+                # evicted by a concurrent build
+                continue
+            total_size += size
+        for _, entry, size in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total_size -= size
+
+
+LOCK_SUMMARY_CACHE_ENTRIES = 256
+"""The maximum number of lock summaries that are cached, the least recently used are removed beyond it."""
+
+
+class LockSummaryCache:
+    """
+    A directory of the summaries of parsed lock files, each stored as a JSON file named after the lock file's content.
+
+    A summary only contains the fields of the locked packages that the plugin uses. Packages with identical lock files,
+    like the sibling packages of a mono repository, thus share a single summary, and never parse their lock file again.
+    """
+
+    def __init__(self, directory: Path, max_entries: int = LOCK_SUMMARY_CACHE_ENTRIES) -> None:
+        self.directory = directory
+        self.max_entries = max_entries
+
+    @staticmethod
+    def key(content: bytes) -> str:
+        """Returns the key of the summary of the lock file with the given content."""
+        return hash_values(CACHE_VERSION, hashlib.sha256(content).hexdigest())
+
+    def get(self, key: str) -> list[Any] | None:
+        """Returns the summary with the given key, if it is cached, marking it as recently used."""
+        entry = self.directory / f"{key}.json"
+        try:
+            summary = json.loads(entry.read_text(encoding="utf-8"))
+            # the modification time of the entry is its last use
+            os.utime(entry)
+        except (OSError, ValueError):
+            return None
+        return summary if isinstance(summary, list) else None
+
+    def put(self, key: str, summary: list[Any]) -> None:
+        """Stores the summary under the given key, and evicts the least recently used summaries."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # written next to the entries, such that concurrent commands never read a partially written entry
+        fd, staged = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(summary, f)
+        os.replace(staged, self.directory / f"{key}.json")
+        self.evict()
+
+    def evict(self) -> None:
+        """Removes the least recently used summaries, until at most the maximum number of summaries remain."""
+        entries = []
+        for entry in self.directory.glob("*.json"):
+            try:
+                entries.append((entry.stat().st_mtime_ns, entry))
+            except FileNotFoundError:
+                # evicted by a concurrent command
+                continue
+        entries.sort()
+        for _, entry in entries[: max(0, len(entries) - self.max_entries)]:
+            entry.unlink(missing_ok=True)
+
+
+class CachedBuilds:
+    """
+    Makes poetry-core's builders reuse cached artifacts, and cache the artifacts they build (until `uninstall`).
+
+    The key of an artifact is derived from the given key of the package (its sources and the named dependencies it got),
+    the format, the configuration of the builder, and the tag of a wheel.
+    """
+
+    def __init__(self, io: IO, cache: ArtifactCache, package_key: str) -> None:
+        self._io = io
+        self._cache = cache
+        self._package_key = package_key
+        # the patched build methods of the builders, as found in their class dicts
+        self._originals: dict[type[Builder], Any] | None = None
+
+    def artifact_key(self, fmt: str, builder: Builder) -> str:
+        # since poetry-core==2.0.0, the builders can be configured (for instance with a local version)
+        config_settings = getattr(builder, "_config_settings", None) or {}
+        # the wheel of a package with a build script is specific to the interpreter and platform it is built with
+        tag = cast("WheelBuilder", builder).tag if fmt == "wheel" else None
+        return hash_values(CACHE_VERSION, self._package_key, fmt, config_settings, tag)
+
+    def install(self) -> None:
+        import importlib
+
+        if self._originals is not None:  # pragma: no cover
+            return
+        self._originals = {}
+        for fmt, (module, name) in BUILDERS.items():
+            builder_class = getattr(importlib.import_module(module), name)
+            self._originals[builder_class] = vars(builder_class)["build"]
+            setattr(builder_class, "build", self._cached_build(fmt, vars(builder_class)["build"]))
+
+    def uninstall(self) -> None:
+        if self._originals is None:  # pragma: no cover
+            return
+        for builder_class, original in self._originals.items():
+            setattr(builder_class, "build", original)
+        self._originals = None
+
+    def _cached_build(self, fmt: str, original_build: Any) -> Any:
+        def build(builder: Builder, target_dir: Path | None = None) -> Path:
+            key = self.artifact_key(fmt, builder)
+            cached = self._cache.get(key)
+            if cached is not None:
+                output_dir = target_dir or builder.default_target_dir
+                output_dir.mkdir(parents=True, exist_ok=True)
+                artifact = output_dir / cached.name
+                try:
+                    shutil.copyfile(cached, artifact)
+                except FileNotFoundError:
+                    # evicted by a concurrent build, thus built instead
+                    artifact.unlink(missing_ok=True)
+                else:
+                    self._io.write_line(f"  - Reused cached <c2>{cached.name}</c2>")
+                    return artifact
+            built: Path = original_build(builder, target_dir)
+            self._cache.put(key, built)
+            return built
+
+        return build
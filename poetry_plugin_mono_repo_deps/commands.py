@@ -0,0 +1,488 @@
+from __future__ import annotations
+
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, as_completed, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, ClassVar
+
+from cleo.helpers import argument, option
+from cleo.io.outputs.output import Verbosity
+from poetry.console.commands.command import Command
+
+from poetry_plugin_mono_repo_deps.daemon import DAEMON_ENV, DAEMON_ERRORS, DAEMON_IDLE_TIMEOUT, Daemon, DaemonClient
+from poetry_plugin_mono_repo_deps.relock import patch_lock_file
+from poetry_plugin_mono_repo_deps.workspace import Workspace, WorkspacePackage, changed_paths, load_workspace
+
+if TYPE_CHECKING:
+    from cleo.io.inputs.argument import Argument
+    from cleo.io.inputs.option import Option
+
+
+@dataclass(frozen=True)
+class BuildResult:
+    """The outcome of building a single package."""
+
+    name: str
+    exit_code: int
+    duration: float
+    """The duration of the build, in seconds"""
+    output: str
+
+
+@dataclass(frozen=True)
+class RelockResult:
+    """The outcome of updating the lock file of a single package."""
+
+    name: str
+    exit_code: int
+    patched: tuple[str, ...] | None
+    """The patched internal packages, or None if the lock file was resolved again by `poetry lock`"""
+    duration: float
+    """The duration of the update, in seconds"""
+    output: str
+
+
+def worker_failure(error: Exception) -> str:
+    """Returns the output reporting a worker that failed to run its task, like a crashed (or killed) process."""
+    return f"The worker failed: {type(error).__name__}: {error}"
+
+
+def initialize_worker() -> None:
+    """Drops the logging handlers inherited from the parent process, such that the builds log to their own output."""
+    logging.root.handlers.clear()
+
+
+def build_package(name: str, project_dir: str, args: list[str]) -> BuildResult:
+    """
+    Runs `poetry build` on the project, in the current process.
+
+    The application loads the plugins itself, thus the path dependencies are replaced like for any `poetry build`.
+    """
+    from cleo.io.inputs.argv_input import ArgvInput
+    from cleo.io.outputs.buffered_output import BufferedOutput
+    from poetry.console.application import Application
+
+    start = time.perf_counter()
+    application = Application()
+    application.auto_exits(False)
+    output = BufferedOutput()
+    exit_code = application.run(ArgvInput(["poetry", "build", "--directory", project_dir, *args]), output, output)
+    return BuildResult(name, exit_code, time.perf_counter() - start, output.fetch())
+
+
+def build_packages(
+    workspace: Workspace,
+    packages: list[WorkspacePackage],
+    args: list[str],
+    jobs: int,
+    report: Callable[[BuildResult], None],
+) -> list[BuildResult]:
+    """
+    Builds the packages in a process pool, each package as soon as the internal packages it depends on are built.
+
+    No new builds are started once a build failed, the builds that are already running are awaited. A worker that
+    fails to run a build (like a crashed process) fails that build.
+    """
+    # the (selected) internal packages each package still waits for, and the reverse
+    waiting = {package.name: set(package.dependencies) for package in packages}
+    for dependencies in waiting.values():
+        dependencies.intersection_update(waiting)
+    dependents: dict[str, list[str]] = {name: [] for name in waiting}
+    for name, dependencies in waiting.items():
+        for dependency in dependencies:
+            dependents[dependency].append(name)
+    by_name = {package.name: package for package in packages}
+    results: list[BuildResult] = []
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=initialize_worker) as executor:
+        running: dict[Future[BuildResult], tuple[str, float]] = {}
+
+        def submit_ready() -> None:
+            for name in [name for name, dependencies in waiting.items() if not dependencies]:
+                del waiting[name]
+                project_dir = str(workspace.root / by_name[name].path)
+                running[executor.submit(build_package, name, project_dir, args)] = (name, time.perf_counter())
+
+        submit_ready()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, start = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = BuildResult(name, 1, time.perf_counter() - start, worker_failure(e))
+                results.append(result)
+                report(result)
+                for dependent in dependents[name]:
+                    waiting[dependent].discard(name)
+            if all(result.exit_code == 0 for result in results):
+                submit_ready()
+    return results
+
+
+def relock_package(name: str, project_dir: str) -> RelockResult:
+    """
+    Patches the versions of the internal packages in the lock file of the project, in the current process.
+
+    Falls back to `poetry lock` (without updating the other locked packages) when the lock file can't be patched.
+    """
+    from cleo.io.inputs.argv_input import ArgvInput
+    from cleo.io.outputs.buffered_output import BufferedOutput
+    from poetry.console.application import Application
+    from poetry.core.exceptions import PoetryCoreException
+
+    start = time.perf_counter()
+    try:
+        patched = patch_lock_file(Path(project_dir))
+    except (PoetryCoreException, RuntimeError, ValueError):
+        # `poetry lock` reports why the project (or one of its path dependencies) can't be read
+        patched = None
+    if patched is not None:
+        return RelockResult(name, 0, tuple(patched), time.perf_counter() - start, "")
+
+    application = Application()
+    application.auto_exits(False)
+    args = ["poetry", "lock", "--directory", project_dir]
+    # since poetry==2.0.0, the locked packages are kept by default (and the option has been removed)
+    if application.find("lock").definition.has_option("no-update"):  # pragma: no branch (depends on poetry version)
+        args.append("--no-update")
+    output = BufferedOutput()
+    exit_code = application.run(ArgvInput(args), output, output)
+    return RelockResult(name, exit_code, None, time.perf_counter() - start, output.fetch())
+
+
+def relock_packages(
+    workspace: Workspace,
+    packages: list[WorkspacePackage],
+    jobs: int,
+    report: Callable[[RelockResult], None],
+) -> list[RelockResult]:
+    """
+    Updates the lock files of the packages in a process pool, as these don't depend on each other's lock files.
+
+    A worker that fails to update a lock file (like a crashed process) fails the update of that package.
+    """
+    results: list[RelockResult] = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=initialize_worker) as executor:
+        futures = {
+            executor.submit(relock_package, package.name, str(workspace.root / package.path)): package.name
+            for package in packages
+        }
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = RelockResult(futures[future], 1, None, time.perf_counter() - start, worker_failure(e))
+            results.append(result)
+            report(result)
+    return results
+
+
+def get_jobs(jobs: str | None, packages: list[WorkspacePackage]) -> int:
+    """Returns the number of processes to use, no more than the number of packages they could work on."""
+    return max(1, min(int(jobs or os.cpu_count() or 1), len(packages)))
+
+
+class WorkspaceCommand(Command):
+    """A command on a selection of the packages of the workspace."""
+
+    arguments: ClassVar[list[Argument]] = [
+        argument("packages", "The names of the packages to select.", optional=True, multiple=True)
+    ]
+    options: ClassVar[list[Option]] = [
+        option("all", None, "Select all packages of the workspace.", flag=True),
+        option(
+            "changed",
+            None,
+            "Select the packages containing the changed file (and the packages depending on them).",
+            flag=False,
+            multiple=True,
+        ),
+        option(
+            "since",
+            None,
+            "Select the packages changed in the git revision range, like <comment>main...HEAD</comment> (and the "
+            "packages depending on them).",
+            flag=False,
+        ),
+        option("root", None, "The root directory of the workspace.", flag=False, default="."),
+    ]
+
+    def load_workspace(self) -> Workspace | None:
+        """Returns the workspace under the root, from the daemon if it is running, or None (after reporting why)."""
+        root = Path(self.option("root"))
+        daemon = DaemonClient.from_environment()
+        if daemon is not None:
+            try:
+                return daemon.workspace(root)
+            except DAEMON_ERRORS:
+                # loaded below instead, which reports why it can't be loaded (if that's the cause)
+                pass
+        try:
+            return load_workspace(root)
+        except ValueError as e:
+            self.line_error(f"<error>{e}</error>")
+            return None
+
+    def select_packages(self, workspace: Workspace) -> list[WorkspacePackage] | None:
+        """
+        Returns the selected packages, in topological order, or None (after reporting why) if the selection is invalid.
+
+        Changed packages select all packages that (transitively) depend on them too, as these need to be rebuilt.
+        """
+        try:
+            ordered = workspace.topological_order()
+        except ValueError as e:
+            self.line_error(f"<error>{e}</error>")
+            return None
+        if self.option("all"):
+            return ordered
+        names: set[str] = set()
+        for name in self.argument("packages"):
+            package = workspace.get_package(name)
+            if package is None:
+                self.line_error(f"<error>Package {name} is not part of the workspace at {workspace.root}</error>")
+                return None
+            names.add(package.name)
+        changed = [Path(path).resolve() for path in self.option("changed")]
+        if self.option("since"):
+            try:
+                changed += [workspace.root / path for path in changed_paths(workspace.root, self.option("since"))]
+            except RuntimeError as e:
+                self.line_error(f"<error>{e}</error>")
+                return None
+        if not (names or self.option("changed") or self.option("since")):
+            self.line_error("<error>Specify the packages, the changes, or select all packages with --all</error>")
+            return None
+        names.update(package.name for package in workspace.affected(workspace.packages_for_paths(changed)))
+        return [package for package in ordered if package.name in names]
+
+
+class MonorepoListCommand(WorkspaceCommand):
+    name = "monorepo list"
+    description = "Lists the directories of the selected packages of the monorepo, in build order."
+
+    def handle(self) -> int:
+        workspace = self.load_workspace()
+        if workspace is None:
+            return 1
+        packages = self.select_packages(workspace)
+        if packages is None:
+            return 1
+        for package in packages:
+            self.line(str(workspace.root / package.path))
+        return 0
+
+
+class MonorepoBuildCommand(WorkspaceCommand):
+    name = "monorepo build"
+    description = "Builds the selected packages of the monorepo, each after the internal packages it depends on."
+
+    options: ClassVar[list[Option]] = [
+        *WorkspaceCommand.options,
+        option("format", "f", "Limit the format to either sdist or wheel.", flag=False),
+        option(
+            "output",
+            "o",
+            "Set output directory for build artifacts, relative to each package. Default is `dist`.",
+            flag=False,
+            default="dist",
+        ),
+        option("jobs", "j", "The number of packages to build in parallel. Default is the number of CPUs.", flag=False),
+    ]
+
+    def handle(self) -> int:
+        workspace = self.load_workspace()
+        if workspace is None:
+            return 1
+        packages = self.select_packages(workspace)
+        if packages is None:
+            return 1
+        if not packages:
+            self.line("No packages affected by the changes")
+            return 0
+
+        args = []
+        # the --output option of `poetry build` needs poetry>=1.8.0
+        if self.option("output") != "dist":
+            args += ["--output", self.option("output")]
+        if self.option("format"):
+            args += ["--format", self.option("format")]
+        jobs = get_jobs(self.option("jobs"), packages)
+        self.line(f"Building <c2>{len(packages)}</c2> packages with <c2>{jobs}</c2> jobs")
+
+        start = time.perf_counter()
+        results = build_packages(workspace, packages, args, jobs, self._report)
+        duration = time.perf_counter() - start
+        failed = [result.name for result in results if result.exit_code != 0]
+        if failed:
+            self.line_error(f"<error>Failed to build {', '.join(failed)}, stopped after {duration:.2f}s</error>")
+            return 1
+        self.line(f"Built <c2>{len(results)}</c2> packages in {duration:.2f}s")
+        return 0
+
+    def _report(self, result: BuildResult) -> None:
+        if result.exit_code == 0:
+            self.line(result.output, verbosity=Verbosity.VERBOSE)
+            self.line(f"  - Built <c1>{result.name}</c1> in {result.duration:.2f}s")
+        else:
+            self.line_error(result.output)
+            self.line_error(f"  - <error>Failed to build {result.name} in {result.duration:.2f}s</error>")
+
+
+class MonorepoRelockInternalCommand(WorkspaceCommand):
+    name = "monorepo relock-internal"
+    description = (
+        "Updates the versions of the internal packages in the lock files of the selected packages of the monorepo."
+    )
+    help = """\
+Patches the locked versions (and file hashes) of the path dependencies, without resolving the dependencies again.
+Lock files that are outdated, or of which the requirements of a path dependency changed, are updated by \
+<comment>poetry lock</comment> instead.\
+"""
+
+    options: ClassVar[list[Option]] = [
+        *WorkspaceCommand.options,
+        option(
+            "jobs", "j", "The number of lock files to update in parallel. Default is the number of CPUs.", flag=False
+        ),
+    ]
+
+    def handle(self) -> int:
+        workspace = self.load_workspace()
+        if workspace is None:
+            return 1
+        packages = self.select_packages(workspace)
+        if packages is None:
+            return 1
+        packages = [package for package in packages if (workspace.root / package.path / "poetry.lock").exists()]
+        if not packages:
+            self.line("No lock files to update")
+            return 0
+
+        jobs = get_jobs(self.option("jobs"), packages)
+        self.line(f"Updating <c2>{len(packages)}</c2> lock files with <c2>{jobs}</c2> jobs")
+        start = time.perf_counter()
+        results = relock_packages(workspace, packages, jobs, self._report)
+        duration = time.perf_counter() - start
+        failed = sorted(result.name for result in results if result.exit_code != 0)
+        if failed:
+            self.line_error(f"<error>Failed to update the lock files of {', '.join(failed)}</error>")
+            return 1
+        self.line(f"Updated <c2>{len(results)}</c2> lock files in {duration:.2f}s")
+        return 0
+
+    def _report(self, result: RelockResult) -> None:
+        if result.exit_code != 0:
+            self.line_error(result.output)
+            self.line_error(f"  - <error>Failed to lock {result.name} in {result.duration:.2f}s</error>")
+        elif result.patched is None:
+            self.line(result.output, verbosity=Verbosity.VERBOSE)
+            self.line(f"  - Locked <c1>{result.name}</c1> in {result.duration:.2f}s")
+        elif result.patched:
+            self.line(f"  - Patched <c1>{result.name}</c1>: {', '.join(result.patched)}")
+        else:
+            self.line(f"  - <c1>{result.name}</c1> is up to date", verbosity=Verbosity.VERBOSE)
+
+
+class MonorepoPinArtifactsCommand(Command):
+    name = "monorepo pin-artifacts"
+    description = "Replaces the path dependencies in the built artifacts of the project with named dependencies."
+    help = """\
+Rewrites the metadata of the wheels and sdists in place, like <comment>poetry build</comment> with the \
+<comment>artifacts</comment> rewrite mode does, for instance to pin artifacts that were built before.\
+"""
+
+    arguments: ClassVar[list[Argument]] = [
+        argument(
+            "artifacts",
+            "The artifacts, or the directories with the artifacts of the project, to pin. Default is `dist`.",
+            optional=True,
+            multiple=True,
+        )
+    ]
+    options: ClassVar[list[Option]] = [
+        option("jobs", "j", "The number of artifacts to pin in parallel. Default is the number of CPUs.", flag=False),
+    ]
+
+    def handle(self) -> int:
+        from poetry_plugin_mono_repo_deps.plugin import (
+            Config,
+            create_artifact_pinning,
+            load_config,
+            load_locked_packages,
+        )
+
+        # the command is run explicitly, thus the defaults apply to projects without configuration
+        config = load_config(self.poetry) or Config.from_dict({})
+        pinning = create_artifact_pinning(config, self.poetry.package, load_locked_packages(config, self.poetry))
+        paths: list[Path] = []
+        for artifact in self.argument("artifacts") or [self.poetry.pyproject.path.parent / "dist"]:
+            path = Path(artifact)
+            if not path.exists():
+                self.line_error(f"<error>Artifact {path} does not exist</error>")
+                return 1
+            paths += pinning.find_artifacts(path) if path.is_dir() else [path]
+
+        pinned = pinning.pin_all(paths, int(self.option("jobs") or os.cpu_count() or 1))
+        for path in pinned:
+            self.line(f"  - Pinned the path dependencies of <c2>{path.name}</c2>")
+        self.line(f"Pinned <c2>{len(pinned)}</c2> of <c2>{len(paths)}</c2> artifacts")
+        return 0
+
+
+class MonorepoDaemonCommand(Command):
+    name = "monorepo daemon"
+    description = (
+        "Runs a daemon that keeps the lock files and workspaces of the monorepo in memory, for other commands."
+    )
+    help = f"""\
+Listens on a Unix domain socket until it hasn't received requests for a while. Poetry commands run with the \
+<comment>{DAEMON_ENV}</comment> environment variable set to that socket get the locked packages (and the monorepo \
+commands get the workspace) from the daemon, instead of reading the files again. Changed files are read again.\
+"""
+
+    options: ClassVar[list[Option]] = [
+        option(
+            "socket",
+            None,
+            f"The Unix domain socket to listen on. Default is the value of <comment>{DAEMON_ENV}</comment>.",
+            flag=False,
+        ),
+        option(
+            "idle-timeout",
+            None,
+            f"The seconds without requests after which the daemon stops. Default is {DAEMON_IDLE_TIMEOUT:g}.",
+            flag=False,
+        ),
+        option("stop", None, "Stop the daemon listening on the socket.", flag=True),
+    ]
+
+    def handle(self) -> int:
+        socket_path = self.option("socket") or os.environ.get(DAEMON_ENV)
+        if not socket_path:
+            self.line_error(f"<error>Specify the socket with --socket or the {DAEMON_ENV} environment variable</error>")
+            return 1
+        if self.option("stop"):
+            try:
+                DaemonClient(Path(socket_path)).request("shutdown")
+            except OSError:
+                self.line(f"No daemon is listening on <c1>{socket_path}</c1>")
+                return 0
+            self.line(f"Stopped the daemon listening on <c1>{socket_path}</c1>")
+            return 0
+
+        idle_timeout = float(self.option("idle-timeout") or DAEMON_IDLE_TIMEOUT)
+        self.line(f"Listening on <c1>{socket_path}</c1>, until idle for {idle_timeout:g}s")
+        try:
+            Daemon(Path(socket_path), idle_timeout).serve()
+        except RuntimeError as e:
+            self.line_error(f"<error>{e}</error>")
+            return 1
+        self.line("Stopped the daemon")
+        return 0
@@ -0,0 +1,266 @@
+"""
+A long-running process that keeps the lock files and workspaces of a monorepo in memory, for short-lived Poetry runs.
+
+Clients connect to its Unix domain socket, send a single JSON request (a line) and receive a single JSON response.
+The plugin imports this module for every configured command, thus the server's modules are only imported when used.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Tuple
+
+if TYPE_CHECKING:
+    import socket
+
+    from poetry_plugin_mono_repo_deps.workspace import Workspace, WorkspaceIndex
+
+DAEMON_ENV = "POETRY_MONOREPO_DEPS_DAEMON"
+"""The Unix domain socket of the daemon, the plugin (and the monorepo commands) use the daemon if it is listening."""
+
+DAEMON_IDLE_TIMEOUT = 600.0
+"""The seconds without requests after which the daemon stops, by default."""
+
+DAEMON_TIMEOUT = 60.0
+"""The seconds a client waits for the response of the daemon, before reading the files itself."""
+
+POLL_INTERVAL = 0.5
+"""The seconds between the checks whether the daemon is idle (or stopped)."""
+
+DAEMON_ERRORS = (OSError, RuntimeError, ValueError, KeyError, TypeError)
+"""
+Raised by the client when the daemon can't be reached, fails, or responds with something else than expected (like a
+daemon of another version), in which case the caller reads the files itself.
+"""
+
+Stamp = Tuple[int, int]
+
+
+def file_stamp(path: Path) -> Stamp | None:
+    """Returns the modification time and size of the file, or None if it doesn't exist."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class DaemonClient:
+    """
+    Sends requests to the daemon listening on the socket.
+
+    Each request opens its own connection, thus a client can be shared by threads. When no daemon is listening (or it
+    doesn't respond in time, or as expected), one of the `DAEMON_ERRORS` is raised, such that the caller can fall back
+    to reading the files itself.
+    """
+
+    def __init__(self, socket_path: Path, timeout: float = DAEMON_TIMEOUT) -> None:
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    @staticmethod
+    def from_environment() -> DaemonClient | None:
+        socket_path = os.environ.get(DAEMON_ENV)
+        return DaemonClient(Path(socket_path)) if socket_path else None
+
+    def request(self, request: str, **arguments: Any) -> Any:
+        """
+        Returns the result of the request.
+
+        :raises OSError: when the daemon can't be reached
+        :raises RuntimeError: when the daemon failed to handle the request
+        :raises ValueError: when the response isn't JSON
+        :raises KeyError: when the response has no result
+        """
+        import socket
+
+        if not hasattr(socket, "AF_UNIX"):  # pragma: no cover (Windows)
+            raise OSError("Unix domain sockets are not supported on this platform")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.settimeout(self.timeout)
+            connection.connect(str(self.socket_path))
+            connection.sendall(json.dumps({"request": request, **arguments}).encode("utf-8") + b"\n")
+            with connection.makefile("rb") as stream:
+                line = stream.readline()
+        if not line:
+            raise ConnectionError(f"The daemon on {self.socket_path} closed the connection")
+        response: dict[str, Any] = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(f"The daemon failed to handle the {request} request: {response['error']}")
+        return response["result"]
+
+    def is_running(self) -> bool:
+        try:
+            self.request("ping")
+        except OSError:
+            return False
+        return True
+
+    def lock_summary(self, lock_path: Path) -> list[Any]:
+        """Returns the summary of the locked packages (see `LockedPackageIndex.summary`), empty without lock file."""
+        summary: list[Any] = self.request("lock_summary", path=str(lock_path.absolute()))
+        return summary
+
+    def workspace(self, root: Path) -> Workspace:
+        """Returns the workspace of all projects under the root, see `load_workspace`."""
+        from poetry_plugin_mono_repo_deps.workspace import Workspace, WorkspacePackage
+
+        result = self.request("workspace", root=str(root.absolute()))
+        return Workspace(Path(result["root"]), [WorkspacePackage.from_dict(package) for package in result["packages"]])
+
+    def rewrite(self, project_dir: Path) -> dict[str, Any]:
+        """
+        Returns the rewritten project (see `rewrite_project`), with its dependencies as PEP 508 strings by group.
+
+        The daemon loads the project with its own configuration and the default Poetry configuration.
+        """
+        result: dict[str, Any] = self.request("rewrite", path=str(project_dir.absolute()))
+        return result
+
+
+class Daemon:
+    """
+    Serves the requests of the clients, each connection in its own thread, until it is idle for the given time.
+
+    The summaries of the lock files and the indices of the workspaces are kept in memory. A lock file is only read
+    again once its modification time or size changed, like the projects of the workspace index.
+    """
+
+    def __init__(self, socket_path: Path, idle_timeout: float = DAEMON_IDLE_TIMEOUT) -> None:
+        import threading
+
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self._lock_summaries: dict[Path, tuple[Stamp, list[Any]]] = {}
+        self._workspace_indices: dict[Path, WorkspaceIndex] = {}
+        # guards the workspace index of each root, as loading a workspace updates its index
+        self._workspace_locks: dict[Path, threading.Lock] = {}
+        # guards the caches (but isn't held while reading files), and the state of the connections
+        self._lock = threading.Lock()
+        self._active_connections = 0
+        self._last_activity = time.monotonic()
+        self._stopped = threading.Event()
+        self._handlers: dict[str, Callable[[dict[str, Any]], Any]] = {
+            "ping": lambda _request: {"pid": os.getpid()},
+            "lock_summary": lambda request: self.lock_summary(Path(request["path"])),
+            "workspace": lambda request: self.workspace(Path(request["root"])),
+            "rewrite": lambda request: self.rewrite(Path(request["path"])),
+            "shutdown": lambda _request: self.stop(),
+        }
+
+    def lock_summary(self, lock_path: Path) -> list[Any]:
+        from poetry_plugin_mono_repo_deps.plugin import LockedPackageIndex
+
+        stamp = file_stamp(lock_path)
+        with self._lock:
+            if stamp is None:
+                self._lock_summaries.pop(lock_path, None)
+                return []
+            cached = self._lock_summaries.get(lock_path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        # parsed without holding the lock, concurrent requests for the same (changed) lock file each parse it
+        summary = LockedPackageIndex.from_lock_file(lock_path).summary()
+        with self._lock:
+            self._lock_summaries[lock_path] = (stamp, summary)
+        return summary
+
+    def workspace(self, root: Path) -> dict[str, Any]:
+        import threading
+        from dataclasses import asdict
+
+        from poetry_plugin_mono_repo_deps.workspace import WorkspaceIndex, load_workspace
+
+        root = root.resolve()
+        with self._lock:
+            root_lock = self._workspace_locks.setdefault(root, threading.Lock())
+        # only the requests for the same root wait for each other
+        with root_lock:
+            index = self._workspace_indices.get(root)
+            if index is None:
+                index = self._workspace_indices[root] = WorkspaceIndex(root)
+                index.load()
+            workspace = load_workspace(root, index)
+        return {"root": str(workspace.root), "packages": [asdict(package) for package in workspace.packages.values()]}
+
+    def rewrite(self, project_dir: Path) -> dict[str, Any]:
+        # the API is thread-safe itself, thus the projects aren't rewritten one at a time
+        from poetry_plugin_mono_repo_deps.api import rewrite_project
+
+        project = rewrite_project(project_dir)
+        return {
+            "dependencies": {group: [dep.to_pep_508() for dep in deps] for group, deps in project.dependencies.items()},
+            "named_requirements": project.named_requirements,
+            "lock_data": project.lock_data,
+            "pyproject": project.pyproject,
+        }
+
+    def stop(self) -> None:
+        """Stops accepting connections, the requests that are being handled still get their response."""
+        self._stopped.set()
+
+    def is_idle(self) -> bool:
+        with self._lock:
+            return self._active_connections == 0 and time.monotonic() - self._last_activity >= self.idle_timeout
+
+    def serve(self) -> None:
+        """
+        Listens on the socket until stopped or idle, removes the socket afterwards.
+
+        :raises RuntimeError: when another daemon is listening on the socket already
+        """
+        import socket
+        import threading
+
+        if not hasattr(socket, "AF_UNIX"):  # pragma: no cover (Windows)
+            raise RuntimeError("The daemon needs Unix domain sockets, which are not supported on this platform")
+        if self.socket_path.exists():
+            if DaemonClient(self.socket_path, timeout=POLL_INTERVAL).is_running():
+                raise RuntimeError(f"A daemon is listening on {self.socket_path} already")
+            # left behind by a daemon that was killed
+            self.socket_path.unlink()
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(str(self.socket_path))
+            try:
+                server.listen()
+                server.settimeout(POLL_INTERVAL)
+                while not self._stopped.is_set() and not self.is_idle():
+                    try:
+                        connection, _ = server.accept()
+                    except socket.timeout:
+                        continue
+                    with self._lock:
+                        self._active_connections += 1
+                    threading.Thread(target=self._serve_connection, args=(connection,), daemon=True).start()
+            finally:
+                self.socket_path.unlink()
+
+    def _serve_connection(self, connection: socket.socket) -> None:
+        try:
+            with connection:
+                connection.settimeout(DAEMON_TIMEOUT)
+                with connection.makefile("rb") as stream:
+                    line = stream.readline()
+                connection.sendall(json.dumps(self.handle(line)).encode("utf-8") + b"\n")
+        except OSError:
+            # the client is gone, it reads the files itself instead
+            pass
+        finally:
+            with self._lock:
+                self._active_connections -= 1
+                self._last_activity = time.monotonic()
+
+    def handle(self, line: bytes) -> dict[str, Any]:
+        """Returns the response to the request, any failure is reported to the client."""
+        try:
+            request: dict[str, Any] = json.loads(line)
+            handler = self._handlers.get(request.get("request", ""))
+            if handler is None:
+                return {"error": f"Unknown request {request.get('request')!r}"}
+            return {"result": handler(request)}
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
@@ -0,0 +1,66 @@
+"""
+Splits the requirements exported by `poetry export` into the external and the internal packages.
+
+The external packages rarely change, thus these can be installed (for instance in a container layer) before the
+internal packages, of which the pinned versions change with every release of the monorepo.
+"""
+
+from __future__ import annotations
+
+import re
+from pathlib import Path
+
+INTERNAL_SUFFIX = "-internal"
+"""Appended to the stem of the exported requirements file, for the file with the requirements of internal packages."""
+
+REQUIREMENT_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]*")
+
+
+def internal_requirements_path(output: Path) -> Path:
+    """Returns the file with the requirements of the internal packages, next to the exported requirements file."""
+    return output.with_name(f"{output.stem}{INTERNAL_SUFFIX}{output.suffix}")
+
+
+def split_requirements(content: str, internal: set[str]) -> tuple[str, str, int]:
+    """
+    Returns the requirements of the external packages, those of the internal packages (by canonical name), and the
+    number of internal requirements.
+
+    A requirement continues on the next line when its line ends with a backslash (like its hashes). Options (like the
+    index URLs) apply to both, thus are kept in both. Anything else (like editable path requirements) is external.
+    """
+    from poetry_plugin_mono_repo_deps.plugin import canonicalize_name
+
+    external_lines: list[str] = []
+    internal_lines: list[str] = []
+    moved = 0
+    target = external_lines
+    continued = False
+    for line in content.splitlines(keepends=True):
+        if continued:
+            target.append(line)
+        elif line.startswith("--"):
+            external_lines.append(line)
+            internal_lines.append(line)
+            target = external_lines
+        else:
+            match = REQUIREMENT_NAME.match(line)
+            is_internal = match is not None and canonicalize_name(match.group()) in internal
+            moved += is_internal
+            target = internal_lines if is_internal else external_lines
+            target.append(line)
+        continued = line.rstrip("\r\n").endswith("\\")
+    return "".join(external_lines), "".join(internal_lines), moved
+
+
+def split_requirements_file(output: Path, internal: set[str]) -> tuple[Path, int]:
+    """
+    Moves the requirements of the internal packages from the exported requirements file to their own file.
+
+    Returns that file, which is written even without internal requirements, and the number of requirements moved.
+    """
+    external, internal_requirements, moved = split_requirements(output.read_text(encoding="utf-8"), internal)
+    internal_output = internal_requirements_path(output)
+    internal_output.write_text(internal_requirements, encoding="utf-8")
+    output.write_text(external, encoding="utf-8")
+    return internal_output, moved
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Generator
+
+if TYPE_CHECKING:
+    from cleo.io.io import IO
+
+METRICS_ENV = "POETRY_MONOREPO_DEPS_METRICS"
+"""
+Enables reporting the metrics of each command: the path of a (JSON Lines) file to append them to, or `-` to write them
+to the debug output (`-vvv`).
+"""
+
+METRICS_OUTPUT = "-"
+
+
+class Metrics:
+    """
+    The wall time of each phase of the plugin, and counters of the work it did, during a single command.
+
+    Phases can be nested, for instance `save` is part of `update_pyproject_toml`. A phase that runs multiple times
+    accumulates its durations.
+    """
+
+    def __init__(self) -> None:
+        self.timings: dict[str, float] = {}
+        """The durations of the phases, in seconds"""
+        self.counters: dict[str, int] = {}
+
+    @contextmanager
+    def time(self, phase: str) -> Generator[None, None, None]:
+        """Measures the wall time of the phase, also when it fails."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[phase] = self.timings.get(phase, 0.0) + time.perf_counter() - start
+
+    def count(self, counter: str, amount: int = 1) -> None:
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def to_dict(self, command: str) -> dict[str, Any]:
+        return {"command": command, "timings": dict(self.timings), "counters": dict(self.counters)}
+
+    def report(self, io: IO, command: str, destination: str) -> None:
+        """Writes the metrics of the command to the debug output, or appends them as a JSON line to the file."""
+        import json
+
+        line = json.dumps(self.to_dict(command), sort_keys=True)
+        if destination == METRICS_OUTPUT:
+            if io.is_debug():
+                io.write_line(f"<debug>Plugin metrics: {line}</debug>")
+            return
+        try:
+            with open(destination, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            io.write_error_line(f"<warning>Could not write the plugin metrics to {destination}: {e}</warning>")
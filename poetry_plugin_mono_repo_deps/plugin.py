@@ -1,23 +1,44 @@
 from __future__ import annotations
 
+import os
+import threading
 from copy import deepcopy
 from dataclasses import dataclass
-from typing import Any, Dict, List, TypeVar, cast
+from enum import Enum
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, TypeVar, cast
 
-from cleo.events.console_event import ConsoleEvent
 from cleo.events.console_events import COMMAND, TERMINATE
-from cleo.events.console_terminate_event import ConsoleTerminateEvent
-from cleo.events.event import Event
-from cleo.events.event_dispatcher import EventDispatcher
-from cleo.io.io import IO
-from poetry.console.application import Application
-from poetry.core.packages.dependency import Dependency
-from poetry.core.packages.package import Package
 from poetry.plugins.application_plugin import ApplicationPlugin
-from poetry.poetry import Poetry
-from poetry.repositories.lockfile_repository import LockfileRepository
-from poetry.utils.helpers import merge_dicts
-from tomlkit import TOMLDocument
+from poetry.utils._compat import tomllib
+
+from poetry_plugin_mono_repo_deps.metrics import METRICS_ENV, Metrics
+from poetry_plugin_mono_repo_deps.profiling import PROFILE_ENV
+
+# Poetry loads all application plugins on every invocation, so only import what is needed to register the plugin.
+# The modules needed to rewrite the dependencies are imported once a configured command is run.
+if TYPE_CHECKING:
+    from cleo.commands.command import Command
+    from cleo.events.console_event import ConsoleEvent
+    from cleo.events.console_terminate_event import ConsoleTerminateEvent
+    from cleo.events.event import Event
+    from cleo.events.event_dispatcher import EventDispatcher
+    from cleo.io.io import IO
+    from poetry.console.application import Application
+    from poetry.core.packages.dependency import Dependency
+    from poetry.core.packages.dependency_group import DependencyGroup
+    from poetry.core.packages.package import Package
+    from poetry.core.packages.path_dependency import PathDependency
+    from poetry.core.packages.project_package import ProjectPackage
+    from poetry.packages.locker import Locker
+    from poetry.poetry import Poetry
+
+    from poetry_plugin_mono_repo_deps.artifacts import ArtifactPinning
+    from poetry_plugin_mono_repo_deps.cache import CachedBuilds, LockSummaryCache
+    from poetry_plugin_mono_repo_deps.daemon import DaemonClient
+    from poetry_plugin_mono_repo_deps.profiling import Handler
+    from poetry_plugin_mono_repo_deps.sdist import InMemoryPyproject
+    from poetry_plugin_mono_repo_deps.staging import StagingDirectory
 
 T = TypeVar("T")
 
@@ -31,17 +52,37 @@ def _get_as_type(values: dict[str, Any], key: str, type: type[T]) -> T:
 
 ALLOWED_CONSTRAINTS = [">=", "~=", "=", "==", "^"]
 
+REWRITE_MODE_FILE = "file"
+REWRITE_MODE_MEMORY = "memory"
+REWRITE_MODE_STAGING = "staging"
+REWRITE_MODE_ARTIFACTS = "artifacts"
+REWRITE_MODES = [REWRITE_MODE_FILE, REWRITE_MODE_MEMORY, REWRITE_MODE_STAGING, REWRITE_MODE_ARTIFACTS]
+
+VERSION_SOURCE_LOCK = "lock"
+VERSION_SOURCE_PATH = "path"
+VERSION_SOURCES = [VERSION_SOURCE_LOCK, VERSION_SOURCE_PATH]
+
+EXPORT_MODE_COMBINED = "combined"
+EXPORT_MODE_SPLIT = "split"
+EXPORT_MODES = [EXPORT_MODE_COMBINED, EXPORT_MODE_SPLIT]
+
 TOML_SECTION = "tool.poetry-monorepo.deps"
 
 
-@dataclass
+@dataclass(frozen=True)
 class Config:
     # would be nice to use pydantic, but don't want to bring in new dependencies that might conflict with other plugins
     enabled: bool
-    commands: list[str]
+    commands: frozenset[str]
     constraint: str
-    source_types: list[str]
+    source_types: frozenset[str]
     only_develop: bool
+    rewrite_mode: str = REWRITE_MODE_FILE
+    artifact_cache: bool = False
+    artifact_cache_size: int = 1024
+    version_source: str = VERSION_SOURCE_LOCK
+    lock_cache: bool = False
+    export_mode: str = EXPORT_MODE_COMBINED
 
     default_config = {
         "enabled": True,
@@ -49,29 +90,320 @@ class Config:
         "constraint": "~=",
         "source_types": ["file", "directory"],
         "only_develop": False,
+        "rewrite_mode": REWRITE_MODE_FILE,
+        "artifact_cache": False,
+        "artifact_cache_size": 1024,
+        "version_source": VERSION_SOURCE_LOCK,
+        "lock_cache": False,
+        "export_mode": EXPORT_MODE_COMBINED,
     }
 
     @staticmethod
     def from_dict(values: dict[str, Any]) -> Config:
+        from poetry.utils.helpers import merge_dicts
+
         config = deepcopy(Config.default_config)
         merge_dicts(config, values)
         enabled = _get_as_type(config, "enabled", bool)
-        commands = [str(x) for x in _get_as_type(config, "commands", List)]
+        commands = frozenset(str(x) for x in _get_as_type(config, "commands", List))
         constraint = _get_as_type(config, "constraint", str)
-        source_types = [str(x) for x in _get_as_type(config, "source_types", List)]
+        source_types = frozenset(str(x) for x in _get_as_type(config, "source_types", List))
         only_develop = _get_as_type(config, "only_develop", bool)
+        rewrite_mode = _get_as_type(config, "rewrite_mode", str)
+        if rewrite_mode not in REWRITE_MODES:
+            raise ValueError(f"rewrite_mode should be one of {REWRITE_MODES}")
+        artifact_cache = _get_as_type(config, "artifact_cache", bool)
+        artifact_cache_size = _get_as_type(config, "artifact_cache_size", int)
+        version_source = _get_as_type(config, "version_source", str)
+        if version_source not in VERSION_SOURCES:
+            raise ValueError(f"version_source should be one of {VERSION_SOURCES}")
+        lock_cache = _get_as_type(config, "lock_cache", bool)
+        export_mode = _get_as_type(config, "export_mode", str)
+        if export_mode not in EXPORT_MODES:
+            raise ValueError(f"export_mode should be one of {EXPORT_MODES}")
         return Config(
             enabled=enabled,
             commands=commands,
             constraint=constraint,
             source_types=source_types,
             only_develop=only_develop,
+            rewrite_mode=rewrite_mode,
+            artifact_cache=artifact_cache,
+            artifact_cache_size=artifact_cache_size,
+            version_source=version_source,
+            lock_cache=lock_cache,
+            export_mode=export_mode,
+        )
+
+    def replaces_source_type(self, *source_types: str | None) -> bool:
+        """Whether dependencies with (any of) the given source types are to be replaced by named dependencies."""
+        return any(source_type in self.source_types for source_type in source_types)
+
+
+CONFIG_CACHE_SIZE = 64
+"""The number of parsed configurations that are kept, one per pyproject.toml (version)."""
+
+_config_cache: dict[tuple[Path, str], Config | None] = {}
+_config_cache_lock = threading.Lock()
+
+
+class RewriteStage(Enum):
+    """The parts of Poetry's state in which path dependencies can be replaced by named dependencies."""
+
+    PACKAGE = "package"
+    """The dependency groups of the root package, necessary for commands like `build`"""
+    PYPROJECT = "pyproject"
+    """The pyproject.toml file, necessary for commands like `build` that include it in the artifact"""
+    LOCK_DATA = "lock_data"
+    """The lockers internal lock data, necessary for commands like `export`"""
+
+
+COMMAND_STAGES: dict[str, frozenset[RewriteStage]] = {
+    "build": frozenset({RewriteStage.PACKAGE, RewriteStage.PYPROJECT}),
+    # the exporter matches the root package's requirements against the locked packages
+    "export": frozenset({RewriteStage.PACKAGE, RewriteStage.LOCK_DATA}),
+}
+"""The rewrite stages each command needs, other configured commands get all stages."""
+
+
+def stages_for_command(command_name: str) -> frozenset[RewriteStage]:
+    return COMMAND_STAGES.get(command_name, frozenset(RewriteStage))
+
+
+class LockedPackage:
+    """The fields of a locked package that are used to rewrite the path dependencies, a compact read-only record."""
+
+    __slots__ = ("name", "version", "source_type", "develop", "source_url")
+
+    def __init__(
+        self,
+        name: str,
+        version: str,
+        source_type: str | None = None,
+        develop: bool = False,
+        source_url: str | None = None,
+    ) -> None:
+        self.name = name
+        self.version = version
+        self.source_type = source_type
+        self.develop = develop
+        self.source_url = source_url
+        """The path of a directory or file package, relative to the lock file"""
+
+    @staticmethod
+    def from_lock_data(info: dict[str, Any]) -> LockedPackage:
+        """Extracts the record from the lock data of a package, an entry of the `package` list of the lock file."""
+        source = info.get("source", {})
+        source_type = source.get("type")
+        source_url = source.get("url")
+        return LockedPackage(
+            str(info["name"]),
+            str(info["version"]),
+            None if source_type is None else str(source_type),
+            bool(info.get("develop", False)),
+            None if source_url is None else str(source_url),
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, LockedPackage):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{slot}={getattr(self, slot)!r}" for slot in self.__slots__)
+        return f"LockedPackage({fields})"
+
+
+class LockedPackageIndex:
+    """
+    The locked packages, indexed by their canonical (PEP 503) name.
+
+    Built once per command and shared by all rewrite stages, such that looking up the locked version of a path
+    dependency doesn't require a scan over all locked packages. Only the fields needed by the plugin are kept, read
+    directly from the lock file: neither the lock data nor the (expensive) locked repository of the locker is loaded.
+    """
+
+    def __init__(self, locked_packages: list[dict[str, Any]]) -> None:
+        self._entries: dict[str, LockedPackage] = {}
+        for info in locked_packages:
+            # a package can be locked multiple times (for different markers), the first one wins
+            name = canonicalize_name(info["name"])
+            if name not in self._entries:
+                self._entries[name] = LockedPackage.from_lock_data(info)
+        self._packages: dict[str, Package] = {}
+
+    @staticmethod
+    def from_locker(
+        locker: Locker, cache: LockSummaryCache | None = None, use_lock_data: bool = False
+    ) -> LockedPackageIndex:
+        """Reads the lock file of the locker, or indexes its lock data (which the locker loads once) if so requested."""
+        if not locker.lock.exists():
+            # the versions can still be resolved from the path dependencies themselves
+            return LockedPackageIndex([])
+        if use_lock_data:
+            return LockedPackageIndex(locker.lock_data.get("package", []))
+        return LockedPackageIndex.from_lock_file(locker.lock, cache)
+
+    @staticmethod
+    def from_lock_file(path: Path, cache: LockSummaryCache | None = None) -> LockedPackageIndex:
+        """Reads the lock file, or only its cached summary when the same lock file content was read before."""
+        content = path.read_bytes()
+        key = cache.key(content) if cache is not None else ""
+        summary = cache.get(key) if cache is not None else None
+        if summary is not None:
+            return LockedPackageIndex.from_summary(summary)
+        try:
+            lock_data = tomllib.loads(content.decode("utf-8"))
+        except tomllib.TOMLDecodeError as e:
+            raise RuntimeError(f"Unable to read the lock file ({e}).") from e
+        locked = LockedPackageIndex(lock_data.get("package", []))
+        if cache is not None:
+            cache.put(key, locked.summary())
+        return locked
+
+    @staticmethod
+    def from_summary(summary: list[Any]) -> LockedPackageIndex:
+        """Returns the index of the locked packages of the summary, as returned by `summary`."""
+        locked = LockedPackageIndex([])
+        for name, version, source_type, develop, source_url in summary:
+            locked._entries[canonicalize_name(name)] = LockedPackage(name, version, source_type, develop, source_url)
+        return locked
+
+    def summary(self) -> list[Any]:
+        """Returns the fields of the indexed packages (JSON serializable), from which the index can be recreated."""
+        return [[getattr(entry, slot) for slot in LockedPackage.__slots__] for entry in self._entries.values()]
+
+    def get_entry(self, name: str) -> LockedPackage | None:
+        """Returns the locked package with the given name, if it is locked."""
+        return self._entries.get(canonicalize_name(name))
+
+    def get_version(self, name: str, default: str) -> str:
+        """Returns the locked version of the package with the given name, or the default if it isn't locked."""
+        entry = self.get_entry(name)
+        if entry is None:
+            return default
+        return entry.version
+
+    def get_package(self, name: str) -> Package | None:
+        """Returns a package with the locked name and version, if it is locked."""
+        canonical_name = canonicalize_name(name)
+        package = self._packages.get(canonical_name)
+        if package is None:
+            entry = self._entries.get(canonical_name)
+            if entry is None:
+                return None
+            from poetry.core.packages.package import Package
+
+            package = Package(entry.name, entry.version)
+            self._packages[canonical_name] = package
+        return package
+
+    def replaced_names(self, config: Config) -> set[str]:
+        """Returns the canonical names of the locked packages that are replaced by named packages."""
+        return {
+            name
+            for name, entry in self._entries.items()
+            if is_to_be_replaced_locked_source(config, entry.source_type, entry.develop)
+        }
+
+    def path_entries(self, config: Config) -> list[LockedPackage]:
+        """Returns the locked directory and file packages that are replaced by named packages."""
+        return [
+            entry
+            for entry in self._entries.values()
+            if entry.source_type in ("directory", "file")
+            and entry.source_url is not None
+            and is_to_be_replaced_locked_source(config, entry.source_type, entry.develop)
+        ]
+
+    def set_version(self, name: str, version: str) -> None:
+        """Overrides the locked version of the package with the given name, the lock file itself isn't modified."""
+        canonical_name = canonicalize_name(name)
+        entry = self._entries.get(canonical_name)
+        self._entries[canonical_name] = (
+            LockedPackage(name, version)
+            if entry is None
+            else LockedPackage(entry.name, version, entry.source_type, entry.develop, entry.source_url)
         )
+        self._packages.pop(canonical_name, None)
+
+
+class UndoJournal:
+    """
+    Records the original value of the dependency entries that are modified, such that these can be restored.
+
+    Only copying the modified entries is much cheaper than copying the whole TOML document up front.
+    """
+
+    def __init__(self) -> None:
+        self._entries: list[tuple[dict[str, Any], str, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def record(self, container: dict[str, Any], key: str) -> None:
+        """Records the current value of the key in the container, call before modifying it."""
+        self._entries.append((container, key, deepcopy(container[key])))
+
+    def restore(self) -> None:
+        """Restores all recorded values, in reverse order."""
+        for container, key, value in reversed(self._entries):
+            container[key] = value
+        self._entries = []
+
+
+def canonicalize_name(name: str) -> str:
+    """Returns the canonical (PEP 503) form of the package name."""
+    from packaging.utils import canonicalize_name
+
+    return canonicalize_name(name)
+
+
+def locate_pyproject(cwd: Path) -> Path:
+    """
+    Returns the pyproject.toml file of the project in the directory or its parents, like Poetry's `Factory.locate`.
+
+    :raises RuntimeError: when no pyproject.toml file could be found
+    """
+    for path in [cwd, *cwd.parents]:
+        pyproject_path = path / "pyproject.toml"
+        if pyproject_path.exists():
+            return pyproject_path
+    raise RuntimeError(f"Poetry could not find a pyproject.toml file in {cwd} or its parents")
 
 
 def load_config(poetry: Poetry) -> Config | None:
+    return load_config_file(poetry.pyproject.path)
+
+
+def load_config_file(pyproject_path: Path) -> Config | None:
+    """
+    Loads the configuration from the pyproject.toml file, without loading the Poetry project.
+
+    The configuration is cached per file and content hash, such that running Poetry many times in the same process
+    doesn't parse the same configuration again. On a miss, the (fast) read-only TOML parser is used, as only the tool
+    configuration section is of interest.
+    """
+    import hashlib
+
+    content = pyproject_path.read_bytes()
+    key = (pyproject_path.resolve(), hashlib.sha256(content).hexdigest())
+    # the configuration can be loaded from multiple threads (by the API), which shouldn't evict each other's entries
+    with _config_cache_lock:
+        if key in _config_cache:
+            return _config_cache[key]
+    config = _config_from_toml(tomllib.loads(content.decode("utf-8")))
+    with _config_cache_lock:
+        if len(_config_cache) >= CONFIG_CACHE_SIZE:
+            # evict the oldest entry, dicts keep the insertion order
+            del _config_cache[next(iter(_config_cache))]
+        _config_cache[key] = config
+    return config
+
+
+def _config_from_toml(toml_data: dict[str, Any]) -> Config | None:
     toml_sections = TOML_SECTION.split(".")
-    toml_doc = poetry.pyproject.data
+    toml_doc = toml_data
     for subsection in toml_sections[:-1]:
         toml_doc = toml_doc.get(subsection, {})
     # the last item (deps) needs to be present, can be empty, to enable the plugin:
@@ -82,35 +414,169 @@ def load_config(poetry: Poetry) -> Config | None:
         return None
 
 
+_path_versions: dict[tuple[Path, int], str | None] = {}
+
+
+def read_path_version(path: Path) -> str | None:
+    """
+    Returns the version of the project in the directory, or of the wheel, if it can be determined.
+
+    The versions are cached per file and modification time, such that each project is read only once.
+    """
+    version_path = path / "pyproject.toml" if path.is_dir() else path
+    try:
+        key = (version_path, version_path.stat().st_mtime_ns)
+    except OSError:
+        return None
+    if key not in _path_versions:
+        _path_versions[key] = _read_version(version_path)
+    return _path_versions[key]
+
+
+def _read_version(path: Path) -> str | None:
+    if path.name == "pyproject.toml":
+        with path.open("rb") as f:
+            toml_data = tomllib.load(f)
+        poetry_version = toml_data.get("tool", {}).get("poetry", {}).get("version")
+        version = toml_data.get("project", {}).get("version", poetry_version)
+        return None if version is None else str(version)
+    if path.suffix == ".whl":
+        import zipfile
+
+        with zipfile.ZipFile(path) as whl:
+            for name in whl.namelist():
+                if name.count("/") == 1 and name.endswith(".dist-info/METADATA"):
+                    # the headers of the metadata end at the first empty line
+                    for line in whl.read(name).decode("utf-8").splitlines():
+                        if not line:
+                            break
+                        if line.startswith("Version:"):
+                            return line.partition(":")[2].strip()
+    return None
+
+
+def get_project_directory(application: Application, io: IO) -> Path:
+    """Returns the directory from which the application will load the Poetry project."""
+    # since Poetry==2.0.0, the application resolves the `--project` and `--directory` options itself
+    project_directory: Path | None = getattr(application, "project_directory", None)
+    if project_directory is not None:  # pragma: no cover (only with Poetry>=2.0.0)
+        return project_directory
+    if io.input.has_option("directory") and io.input.option("directory"):  # pragma: no cover
+        return Path(io.input.option("directory"))
+    return Path.cwd()  # pragma: no cover (only with Poetry<2.0.0)
+
+
+def monorepo_build_command() -> Command:
+    from poetry_plugin_mono_repo_deps.commands import MonorepoBuildCommand
+
+    return MonorepoBuildCommand()
+
+
+def monorepo_list_command() -> Command:
+    from poetry_plugin_mono_repo_deps.commands import MonorepoListCommand
+
+    return MonorepoListCommand()
+
+
+def monorepo_relock_internal_command() -> Command:
+    from poetry_plugin_mono_repo_deps.commands import MonorepoRelockInternalCommand
+
+    return MonorepoRelockInternalCommand()
+
+
+def monorepo_pin_artifacts_command() -> Command:
+    from poetry_plugin_mono_repo_deps.commands import MonorepoPinArtifactsCommand
+
+    return MonorepoPinArtifactsCommand()
+
+
+def monorepo_daemon_command() -> Command:
+    from poetry_plugin_mono_repo_deps.commands import MonorepoDaemonCommand
+
+    return MonorepoDaemonCommand()
+
+
+def get_build_output(io: IO) -> str:
+    """Returns the output directory of the artifacts of a command like `build`, possibly relative to the project."""
+    output = io.input.option("output") if io.input.has_option("output") else None
+    return output or "dist"
+
+
 class MonoRepoDepsPlugin(ApplicationPlugin):
     def __init__(self) -> None:
         super().__init__()
-        self._original_toml_data: TOMLDocument | None = None
+        # the modified dependency entries of the pyproject, and the pyproject.toml file before it was overwritten
+        self._pyproject_journal: UndoJournal | None = None
+        self._original_pyproject_content: bytes | None = None
+        self._in_memory_pyproject: InMemoryPyproject | None = None
+        self._staging_directory: StagingDirectory | None = None
+        # the pinning of the artifacts built in the output directory, after the command
+        self._artifact_pinning: tuple[ArtifactPinning, Path] | None = None
+        # the exported requirements file, and the internal packages to move out of it, after the command
+        self._export_split: tuple[Path, set[str]] | None = None
+        # the named dependencies that replaced the path dependencies of the root package, and the artifact cache
+        self._named_dependencies: list[str] = []
+        self._cached_builds: CachedBuilds | None = None
+        # the timings and counters of the current command, reported when the command terminates
+        self._metrics = Metrics()
+        # the invalid profiling configuration, reported once the IO of the first command is available
+        self._profiling_error: str | None = None
 
     def activate(self, application: Application) -> None:
         self._application = application
+        # the commands are only imported once they are run
+        application.command_loader.register_factory("monorepo build", monorepo_build_command)
+        application.command_loader.register_factory("monorepo list", monorepo_list_command)
+        application.command_loader.register_factory("monorepo relock-internal", monorepo_relock_internal_command)
+        application.command_loader.register_factory("monorepo pin-artifacts", monorepo_pin_artifacts_command)
+        application.command_loader.register_factory("monorepo daemon", monorepo_daemon_command)
         dispatcher = application.event_dispatcher
         if dispatcher is not None:
-            dispatcher.add_listener(COMMAND, self.handle_command)
-            dispatcher.add_listener(TERMINATE, self.handle_terminate)
+            handle_command: Handler = self.handle_command
+            handle_terminate: Handler = self.handle_terminate
+            profile_directory = os.environ.get(PROFILE_ENV)
+            if profile_directory:
+                from poetry_plugin_mono_repo_deps.profiling import HandlerProfiler
+
+                try:
+                    profiler = HandlerProfiler.from_environment(Path(profile_directory))
+                    handle_command, handle_terminate = profiler.wrap(handle_command), profiler.wrap(handle_terminate)
+                except ValueError as e:
+                    self._profiling_error = str(e)
+            dispatcher.add_listener(COMMAND, handle_command)
+            dispatcher.add_listener(TERMINATE, handle_terminate)
         else:  # pragma: no cover
             pass
 
-    def handle_command(self, event: Event, _event_name: str, _dispatcher: EventDispatcher) -> None:
+    def load_command_config(self, io: IO) -> Config | None:
+        """
+        Loads the configuration of the project, without loading the Poetry project if it isn't loaded yet.
+
+        Loading the Poetry project parses the pyproject.toml, lock file and Poetry configuration, which is wasted effort
+        for all the commands that the plugin ignores.
+        """
+        if self._application._poetry is not None:
+            return load_config(self._application._poetry)
         try:
-            poetry = self._application.poetry
-        except RuntimeError:
-            # should only happen if poetry runs outside poetry folder structure
+            pyproject_path = locate_pyproject(get_project_directory(self._application, io))
+            return load_config_file(pyproject_path)
+        except (RuntimeError, tomllib.TOMLDecodeError):
+            # should only happen if poetry runs outside poetry folder structure (or with an invalid pyproject.toml)
             # as we modify poetry lock files, the plugin can only work in poetry folders
             # and is only relevant for commands that work in poetry folders
             # thus, either the command is not relevant
             # or, the command would fail itself
-            return
+            return None
 
-        config = load_config(poetry)
-
-        event = cast(ConsoleEvent, event)  # because we listen to COMMANDs
+    def handle_command(self, event: Event, _event_name: str, _dispatcher: EventDispatcher) -> None:
+        event = cast("ConsoleEvent", event)  # because we listen to COMMANDs
         io = event.io
+        if self._profiling_error is not None:
+            io.write_error_line(f"<warning>Not profiling, as {self._profiling_error}.</warning>")
+            self._profiling_error = None
+        self._metrics = metrics = Metrics()
+        with metrics.time("config"):
+            config = self.load_command_config(io)
         if config is None:  # pragma: no cover
             if io.is_debug():  # pragma: no cover
                 io.write_line(
@@ -130,111 +596,248 @@ class MonoRepoDepsPlugin(ApplicationPlugin):
         if io.is_debug():  # pragma: no cover
             io.write_line("<debug>Replacing path dependencies with named dependencies.</debug>")
 
-        # for build
-        self.update_locked_repository(io, config)
-        if command.name != "export":
-            self.update_pyproject_toml(config)
+        poetry = self._application.poetry
+
+        stages = stages_for_command(command.name)
+        with metrics.time("locked_packages"):
+            from poetry_plugin_mono_repo_deps.daemon import DaemonClient
+
+            # the lock data is loaded anyway when it's rewritten, the other commands only need a summary of it
+            if RewriteStage.LOCK_DATA in stages:
+                locked = load_locked_packages(config, poetry, use_lock_data=True)
+            else:
+                locked = load_locked_packages(config, poetry, DaemonClient.from_environment())
+        pin_artifacts = RewriteStage.PYPROJECT in stages and config.rewrite_mode == REWRITE_MODE_ARTIFACTS
+        if pin_artifacts:
+            with metrics.time("artifact_pinning"):
+                pinning = create_artifact_pinning(config, poetry.package, locked)
+            self._artifact_pinning = (pinning, poetry.pyproject.path.parent / get_build_output(io))
+        # for build & export, unless the artifacts are pinned afterwards, thus built from the original package
+        if RewriteStage.PACKAGE in stages and not pin_artifacts:
+            with metrics.time("update_locked_repository"):
+                self.update_locked_repository(io, config, locked)
+        # before the project might be staged, as the key is derived from the sources of the project itself
+        if config.artifact_cache and command.name == "build":
+            with metrics.time("artifact_cache"):
+                self.install_artifact_cache(io, config)
+        # for build, unless its artifacts are pinned afterwards
+        if RewriteStage.PYPROJECT in stages and not pin_artifacts:
+            with metrics.time("update_pyproject_toml"):
+                self.update_pyproject_toml(io, config, locked)
         # for export
-        self.update_lock_data(config)
+        if RewriteStage.LOCK_DATA in stages:
+            with metrics.time("update_lock_data"):
+                self.update_lock_data(config, locked)
+        if config.export_mode == EXPORT_MODE_SPLIT and command.name == "export":
+            self.prepare_export_split(io, config, locked)
         return None
 
-    def update_locked_repository(self, io: IO, config: Config) -> None:
-        """Updates the lockers locked repository, necessary for commands like `build`"""
+    def update_locked_repository(self, io: IO, config: Config, locked: LockedPackageIndex) -> None:
+        """Updates the dependency groups of the root package, necessary for commands like `build` and `export`"""
         constraint = config.constraint
         poetry = self._application.poetry
-        locked_repository = poetry._locker.locked_repository()
-        for name in poetry.package.dependency_group_names():
-            group = poetry.package.dependency_group(name)
-            for dep in group.dependencies:
+        self._named_dependencies = []
+        for group_name in poetry.package.dependency_group_names():
+            group = poetry.package.dependency_group(group_name)
+            replacements: dict[str, Dependency] = {}
+            dependencies = group.dependencies
+            self._metrics.count("dependencies_scanned", len(dependencies))
+            for dep in dependencies:
                 if is_to_be_replaced_dependency(config, dep):
                     name = dep.name
                     # get the locked package to retrieve the current version
-                    package = find_package(locked_repository, name)
+                    package = find_package(locked, name)
                     if package is not None:
                         new = create_named_dependency(constraint, dep, package)
-                        # new = Dependency(name, version or "*", extras=dep.extras)
                         io.write_line(
                             f"# Replacing path dependency {dep.to_pep_508()} in group "
                             f"{group.name} with {new.to_pep_508()}"
                         )
-                        group.remove_dependency(name)
-                        group.add_dependency(new)
+                        replacements[name] = new
+                        self._named_dependencies.append(f"{group.name}: {new.to_pep_508()}")
                     else:  # pragma: no cover
                         io.write_error_line(f"Failed to find version for path dependency {name}")
+            if replacements:
+                self._metrics.count("dependencies_replaced", len(replacements))
+                replace_group_dependencies(group, replacements)
+
+    def install_artifact_cache(self, io: IO, config: Config) -> None:
+        """
+        Makes the builders reuse the cached artifacts of the project, necessary for commands like `build`
 
-    def update_lock_data(self, config: Config) -> None:
+        The artifacts are cached by the hash of the sources of the project, and the named dependencies that replaced
+        its path dependencies (as these pin the versions of the internal packages the artifacts depend on). Packages
+        with sources outside the project directory aren't cached, as these sources aren't part of the hash.
+        """
+        from poetry.core import __version__ as poetry_core_version
+
+        from poetry_plugin_mono_repo_deps.cache import (
+            ArtifactCache,
+            CachedBuilds,
+            external_sources,
+            hash_values,
+            tree_hash,
+        )
+        from poetry_plugin_mono_repo_deps.staging import IGNORED_NAMES, STAGING_DIRECTORY
+
+        poetry = self._application.poetry
+        external = external_sources(poetry.pyproject.path.parent, poetry.pyproject.data)
+        if external:
+            io.write_error_line(
+                f"<warning>Not caching the artifacts, as the sources {', '.join(external)} are outside the project."
+                "</warning>"
+            )
+            return
+        output = Path(get_build_output(io))
+        ignore_paths = [Path(STAGING_DIRECTORY)] + ([] if output.is_absolute() else [output])
+        sources_hash = tree_hash(poetry.pyproject.path.parent, IGNORED_NAMES, ignore_paths)
+        package = poetry.package
+        package_key = hash_values(
+            package.name, package.version.text, poetry_core_version, sources_hash, sorted(self._named_dependencies)
+        )
+        cache = ArtifactCache(
+            Path(poetry.config.get("cache-dir")) / "monorepo-deps" / "artifacts", config.artifact_cache_size * 2**20
+        )
+        self._cached_builds = CachedBuilds(io, cache, package_key)
+        self._cached_builds.install()
+
+    def update_lock_data(self, config: Config, locked: LockedPackageIndex) -> None:
         """Updates the lockers internal lock data, necessary for commands like `export`"""
         poetry = self._application.poetry
         locked_packages = cast(List[Dict[str, Any]], poetry._locker.lock_data["package"])
+        self._metrics.count("lock_entries_touched", update_locked_packages(config, locked_packages, locked))
 
-        for info in locked_packages:
-            if is_to_be_replaced_package_lock(config, info):
-                modify_locked_package_to_named(config, info, locked_packages)
-
-    def update_pyproject_toml(self, config: Config) -> None:
+    def update_pyproject_toml(self, io: IO, config: Config, locked: LockedPackageIndex) -> None:
         """Updates the pyproject.toml file, necessary for commands like `build`"""
+        pyproject = self._application.poetry.pyproject
+        journal = UndoJournal()
+        update_poetry_dependencies(config, pyproject.poetry_config, locked, journal)
+        if len(journal) == 0:
+            # nothing to save, nor to restore afterwards
+            return
+        self._pyproject_journal = journal
+        self._metrics.count("pyproject_dependencies_replaced", len(journal))
+        # don't need to assign it back to pyproject.data, as we've modified the data structure in place
+        with self._metrics.time("save"):
+            self.save_pyproject_toml(io, config)
+
+    def save_pyproject_toml(self, io: IO, config: Config) -> None:
+        """
+        Saves the modified pyproject.toml
+
+        Depending on the rewrite mode, the modified pyproject is written to disk, only provided to the sdist builder
+        from memory, or written to a staged copy of the project from which the command is run.
+        """
         poetry = self._application.poetry
         pyproject = poetry.pyproject
+        if config.rewrite_mode == REWRITE_MODE_MEMORY:
+            from poetry_plugin_mono_repo_deps.sdist import InMemoryPyproject
 
-        toml_data: TOMLDocument = pyproject.data
-        self._original_toml_data = deepcopy(toml_data)
-        poetry_config = pyproject.poetry_config
-        # used to retrieve the current version of the package
-        locked_packages = cast(List[Dict[str, Any]], poetry._locker.lock_data["package"])
-        # update all possible dependency sections in the pyproject.toml
-        update_locked_dependencies(config, poetry_config.get("dependencies", {}), locked_packages)
-        update_locked_dependencies(config, poetry_config.get("dev-dependencies", {}), locked_packages)
-        if "group" in poetry_config:
-            for group_config in poetry_config["group"].values():
-                update_locked_dependencies(config, group_config.get("dependencies", {}), locked_packages)
-        # don't need to assign it back to pyproject.data, as we've modified the data structure in place
-        # writes the modified pyproject to disk, will be restored after the command by `restore_pyproject_toml`
-        pyproject.save()
+            # the builder reads the pyproject.toml for the sdist from disk, let it read the modified one from memory
+            self._in_memory_pyproject = InMemoryPyproject(pyproject.path, pyproject.data.as_string().encode("utf-8"))
+            self._in_memory_pyproject.install()
+        elif config.rewrite_mode == REWRITE_MODE_STAGING:
+            from poetry_plugin_mono_repo_deps.staging import StagingDirectory
+
+            # the command writes its artifacts to its output directory within the staged project
+            self._staging_directory = StagingDirectory(pyproject.path.parent, get_build_output(io))
+            self._staging_directory.install(poetry)
+        else:
+            # writes the modified pyproject to disk, will be restored after the command by `restore_pyproject_toml`
+            self._original_pyproject_content = pyproject.path.read_bytes()
+            pyproject.save()
+            self._metrics.count("bytes_written", pyproject.path.stat().st_size)
 
     def restore_pyproject_toml(self) -> None:
         """Restores the pyproject.toml file, necessary for commands like `build`"""
-        toml_data = self._original_toml_data
-        if toml_data is None:
-            # we apparently didn't save it
+        journal = self._pyproject_journal
+        if journal is None:
+            # we apparently didn't modify it
             return
-        pyproject = self._application.poetry.pyproject
-        pyproject._toml_document = toml_data
-        pyproject.save()
-        self._original_toml_data = None
+        if self._staging_directory is not None:
+            # the file on disk was never modified, the command ran on the staged copy
+            self._staging_directory.uninstall(self._application.poetry)
+            self._staging_directory = None
+        elif self._in_memory_pyproject is not None:
+            # the file on disk was never modified
+            self._in_memory_pyproject.uninstall()
+            self._in_memory_pyproject = None
+        else:
+            # writing back the original bytes avoids serializing the document again
+            assert self._original_pyproject_content is not None, "the original pyproject.toml should be recorded"
+            self._application.poetry.pyproject.path.write_bytes(self._original_pyproject_content)
+            self._metrics.count("bytes_written", len(self._original_pyproject_content))
+            self._original_pyproject_content = None
+        # the in-memory document should reflect the file again
+        journal.restore()
+        self._pyproject_journal = None
 
-    def handle_terminate(self, event: Event, _event_name: str, _dispatcher: EventDispatcher) -> None:
-        try:
-            poetry = self._application.poetry
-        except RuntimeError:
-            # should only happen if poetry runs outside poetry folder structure
-            # as we modify poetry lock files, the plugin can only work in poetry folders
-            # and is only relevant for commands that work in poetry folders
-            # thus, either the command is not relevant
-            # or, the command would fail itself
+    def pin_artifacts(self, event: ConsoleTerminateEvent) -> None:
+        """Pins the path dependencies in the artifacts the command built, necessary for `build` in artifacts mode"""
+        assert self._artifact_pinning is not None, "the artifact pinning should be prepared"
+        pinning, output = self._artifact_pinning
+        self._artifact_pinning = None
+        if event.exit_code != 0 or not output.is_dir():
             return
+        for path in pinning.pin_all(pinning.find_artifacts(output), os.cpu_count() or 1):
+            self._metrics.count("artifacts_pinned")
+            event.io.write_line(f"  - Pinned the path dependencies of <c2>{path.name}</c2>")
 
-        config = load_config(poetry)
-        if config is None:  # pragma: no cover
+    def prepare_export_split(self, io: IO, config: Config, locked: LockedPackageIndex) -> None:
+        """Prepares moving the requirements of the internal packages to their own file, for `export` in split mode"""
+        output = io.input.option("output") if io.input.has_option("output") else None
+        if not output:
+            io.write_error_line(
+                "<warning>The split export mode needs an output file, exporting all requirements together.</warning>"
+            )
             return
+        # relative to the current directory, like the exporter itself
+        self._export_split = (Path(output).absolute(), locked.replaced_names(config))
 
-        event = cast(ConsoleTerminateEvent, event)  # because we listen to TERMINATEs
-        command = event.command
-        if command.name not in config.commands:
-            # Skipped for export, but that's handled by restoration
-            # which only restores if we modified the pyproject.toml file
+    def split_export(self, event: ConsoleTerminateEvent) -> None:
+        """Moves the requirements of the internal packages out of the exported requirements file"""
+        from poetry_plugin_mono_repo_deps.export import split_requirements_file
+
+        assert self._export_split is not None, "the export split should be prepared"
+        output, internal = self._export_split
+        self._export_split = None
+        if event.exit_code != 0 or not output.is_file():
             return
-        # for build
-        self.restore_pyproject_toml()
+        internal_output, moved = split_requirements_file(output, internal)
+        self._metrics.count("internal_requirements", moved)
+        event.io.write_line(f"Exported the requirements of the internal packages to <c1>{internal_output}</c1>")
+
+    def handle_terminate(self, event: Event, _event_name: str, _dispatcher: EventDispatcher) -> None:
+        # for build, only restores if we modified the pyproject.toml file
+        # (thus the configuration and the Poetry project don't need to be loaded for ignored commands)
+        event = cast("ConsoleTerminateEvent", event)  # because we listen to TERMINATEs
+        with self._metrics.time("restore"):
+            self.restore_pyproject_toml()
+        if self._artifact_pinning is not None:
+            with self._metrics.time("pin_artifacts"):
+                self.pin_artifacts(event)
+        if self._export_split is not None:
+            with self._metrics.time("split_export"):
+                self.split_export(event)
+        if self._cached_builds is not None:
+            self._cached_builds.uninstall()
+            self._cached_builds = None
+        metrics_destination = os.environ.get(METRICS_ENV)
+        if metrics_destination:
+            self._metrics.report(event.io, str(event.command.name), metrics_destination)
         return None
 
 
 def is_to_be_replaced_package_lock(config: Config, locked_package_data: dict[str, Any]) -> bool:
     source = locked_package_data.get("source", {})
-    source_type = source.get("type")
+    return is_to_be_replaced_locked_source(config, source.get("type"), locked_package_data.get("develop", False))
+
+
+def is_to_be_replaced_locked_source(config: Config, source_type: str | None, develop: bool) -> bool:
     can_be_develop = source_type == "directory"
-    is_develop = can_be_develop and locked_package_data.get("develop", False)
+    is_develop = can_be_develop and develop
     must_be_develop = config.only_develop
-    return (source_type in config.source_types) and not (must_be_develop and can_be_develop and not is_develop)
+    return config.replaces_source_type(source_type) and not (must_be_develop and can_be_develop and not is_develop)
 
 
 def is_to_be_replaced_dependency_lock(config: Config, locked_dependency_data: str | dict[str, Any]) -> bool:
@@ -254,7 +857,7 @@ def is_to_be_replaced_dependency_lock(config: Config, locked_dependency_data: st
         + (["url"] if "url" in locked_dependency_data else [])
         + (["git"] if "git" in locked_dependency_data else [])
     )
-    matches_source_type = any((source_type in config.source_types) for source_type in source_types)  # pragma: no cover
+    matches_source_type = config.replaces_source_type(*source_types)
     can_be_develop = "path" in locked_dependency_data
     is_develop = can_be_develop and locked_dependency_data.get("develop", False)
     must_be_develop = config.only_develop
@@ -265,22 +868,134 @@ def is_to_be_replaced_dependency(config: Config, dep: Dependency) -> bool:
     can_be_develop = hasattr(dep, "_develop")
     is_develop = can_be_develop and dep._develop  # type: ignore[attr-defined]
     must_be_develop = config.only_develop
-    is_to_be_replaced = (dep._source_type in config.source_types) and not (
+    is_to_be_replaced = config.replaces_source_type(dep._source_type) and not (
         must_be_develop and can_be_develop and not is_develop
     )
     return is_to_be_replaced
 
 
-def find_package(locked_repository: LockfileRepository, name: str) -> Package | None:
-    package: Package | None = None
-    for locked in locked_repository.packages:  # pragma: no cover
-        if locked.name == name:
-            package = locked
-            break
-    return package
+def load_locked_packages(
+    config: Config, poetry: Poetry, daemon: DaemonClient | None = None, use_lock_data: bool = False
+) -> LockedPackageIndex:
+    """
+    Returns the locked packages of the project, with the versions of the path dependencies if configured so.
+
+    With `use_lock_data`, the packages are indexed from the lock data of the locker, for commands (like `export`) that
+    load the lock data anyway, such that the lock file is parsed only once. Otherwise, if a daemon is given, it provides
+    the locked packages, unless it can't be reached (or fails, or responds unexpectedly).
+    """
+    locked = None
+    if use_lock_data:
+        locked = LockedPackageIndex.from_locker(poetry._locker, use_lock_data=True)
+    elif daemon is not None:
+        from poetry_plugin_mono_repo_deps.daemon import DAEMON_ERRORS
+
+        try:
+            locked = LockedPackageIndex.from_summary(daemon.lock_summary(poetry._locker.lock))
+        except DAEMON_ERRORS:
+            # the lock file is read below instead, which reports why it can't be read (if that's the cause)
+            pass
+    if locked is None:
+        cache = None
+        if config.lock_cache:
+            from poetry_plugin_mono_repo_deps.cache import LockSummaryCache
+
+            cache = LockSummaryCache(Path(poetry.config.get("cache-dir")) / "monorepo-deps" / "locks")
+        locked = LockedPackageIndex.from_locker(poetry._locker, cache)
+    if config.version_source == VERSION_SOURCE_PATH:
+        resolve_path_versions(config, poetry.package, locked, poetry._locker.lock.parent)
+    return locked
+
+
+def named_requirements(config: Config, package: ProjectPackage, locked: LockedPackageIndex) -> dict[str, str]:
+    """Returns the named requirements (PEP 508) that replace the path dependencies of the package, by name."""
+    requirements: dict[str, str] = {}
+    for dep in package.all_requires:
+        locked_package = find_package(locked, dep.name) if is_to_be_replaced_dependency(config, dep) else None
+        if locked_package is not None:
+            requirements[dep.name] = create_named_dependency(config.constraint, dep, locked_package).base_pep_508_name
+    return requirements
+
+
+def pin_pyproject_content(config: Config, locked: LockedPackageIndex, content: bytes) -> bytes:
+    """Returns the content of the pyproject.toml with its path dependencies replaced by named dependencies."""
+    import tomlkit
+
+    toml_data = tomlkit.parse(content.decode("utf-8"))
+    update_poetry_dependencies(config, toml_data.get("tool", {}).get("poetry", {}), locked)
+    return toml_data.as_string().encode("utf-8")
+
+
+def create_artifact_pinning(config: Config, package: ProjectPackage, locked: LockedPackageIndex) -> ArtifactPinning:
+    """Returns the pinning of the path dependencies of the package in its built artifacts."""
+    from functools import partial
+
+    from poetry_plugin_mono_repo_deps.artifacts import ArtifactPinning
+
+    return ArtifactPinning(
+        package.name,
+        package.version.text,
+        named_requirements(config, package, locked),
+        partial(pin_pyproject_content, config, locked),
+    )
+
+
+def resolve_path_versions(
+    config: Config, package: ProjectPackage, locked: LockedPackageIndex, lock_dir: Path | None = None
+) -> None:
+    """
+    Overrides the locked versions of the path dependencies by the versions of their targets.
+
+    Next to the path dependencies of the package itself, these are the locked path packages (relative to the directory
+    of the lock file, if given), like the internal packages the path dependencies depend on.
+    """
+    if lock_dir is not None:
+        for entry in locked.path_entries(config):
+            version = read_path_version(lock_dir / cast(str, entry.source_url))
+            if version is not None:
+                locked.set_version(entry.name, version)
+    for group_name in package.dependency_group_names():
+        for dep in package.dependency_group(group_name).dependencies:
+            if is_to_be_replaced_dependency(config, dep) and (dep.is_directory() or dep.is_file()):
+                version = read_path_version(cast("PathDependency", dep).full_path)
+                if version is not None:
+                    locked.set_version(dep.name, version)
+
+
+def replace_group_dependencies(group: DependencyGroup, replacements: dict[str, Dependency]) -> None:
+    """
+    Replaces the dependencies of the group with the given (canonical) names, keeping their order.
+
+    Equivalent to removing and adding each dependency, but the new dependency list is built in a single pass. Like
+    `DependencyGroup.remove_dependency`, all dependencies with a replaced name are removed (the first one is replaced).
+    """
+    group._dependencies = replaced_dependencies(group.dependencies, replacements)
+    # since poetry-core==2.0.0, the dependencies of the tool.poetry section are kept separately
+    poetry_dependencies: list[Dependency] | None = getattr(group, "_poetry_dependencies", None)
+    if poetry_dependencies:  # pragma: no cover (only with poetry-core>=2.0.0)
+        setattr(group, "_poetry_dependencies", [dep for dep in poetry_dependencies if dep.name not in replacements])
+
+
+def replaced_dependencies(dependencies: list[Dependency], replacements: dict[str, Dependency]) -> list[Dependency]:
+    """Returns the dependencies with the given (canonical) names replaced, see `replace_group_dependencies`."""
+    result: list[Dependency] = []
+    replaced: set[str] = set()
+    for dep in dependencies:
+        if dep.name not in replacements:
+            result.append(dep)
+        elif dep.name not in replaced:
+            replaced.add(dep.name)
+            result.append(replacements[dep.name])
+    return result
+
+
+def find_package(locked: LockedPackageIndex, name: str) -> Package | None:
+    return locked.get_package(name)
 
 
 def create_named_dependency(constraint: str, dep: Dependency, package: Package) -> Dependency:
+    from poetry.core.packages.dependency import Dependency
+
     name = package.name
     version = package.version
     dep_str = constraint + version.text
@@ -297,29 +1012,49 @@ def create_named_dependency(constraint: str, dep: Dependency, package: Package)
     return new_dep
 
 
-def modify_locked_package_to_named(
-    config: Config, info: dict[str, Any], all_locked_packages: list[dict[str, Any]]
-) -> None:
+def update_locked_packages(config: Config, locked_packages: list[dict[str, Any]], locked: LockedPackageIndex) -> int:
+    """Rewrites the locked path packages (of the lock data) to named packages, returns the number rewritten."""
+    rewritten = 0
+    for info in locked_packages:
+        if is_to_be_replaced_package_lock(config, info):
+            modify_locked_package_to_named(config, info, locked)
+            rewritten += 1
+    return rewritten
+
+
+def modify_locked_package_to_named(config: Config, info: dict[str, Any], locked: LockedPackageIndex) -> None:
     if is_to_be_replaced_package_lock(config, info):
         _modify_locked_package_to_named(info)
+        # the version of the named dependency, which differs from the locked one with a stale lock and path versions
+        info["version"] = locked.get_version(info["name"], info["version"])
         # remove path and develop from dependencies of dependencies
-        update_locked_dependencies(config, info.get("dependencies", {}), all_locked_packages)
+        update_locked_dependencies(config, info.get("dependencies", {}), locked)
+
+
+def update_poetry_dependencies(
+    config: Config, poetry_config: dict[str, Any], locked: LockedPackageIndex, journal: UndoJournal | None = None
+) -> None:
+    """Updates all dependency sections of the Poetry configuration (of a pyproject.toml), in place."""
+    # the locked packages are used to retrieve the current version of the package
+    update_locked_dependencies(config, poetry_config.get("dependencies", {}), locked, journal)
+    update_locked_dependencies(config, poetry_config.get("dev-dependencies", {}), locked, journal)
+    for group_config in poetry_config.get("group", {}).values():
+        update_locked_dependencies(config, group_config.get("dependencies", {}), locked, journal)
 
 
 def update_locked_dependencies(
-    config: Config, dependencies: dict[str, Any], all_locked_packages: list[dict[str, Any]]
+    config: Config, dependencies: dict[str, Any], locked: LockedPackageIndex, journal: UndoJournal | None = None
 ) -> None:
     for dep_name, dep in dependencies.items():
         if is_to_be_replaced_dependency_lock(config, dep):
-            dep_version = get_current_locked_version(all_locked_packages, dep_name, "*")
+            dep_version = get_current_locked_version(locked, dep_name, "*")
+            if journal is not None:
+                journal.record(dependencies, dep_name)
             _modify_locked_dependency_to_named(dep, dep_version)
 
 
-def get_current_locked_version(locked_packaged: list[dict[str, Any]], name: str, default: str) -> str:
-    for package in locked_packaged:
-        if package.get("name", "").lower() == name.lower():
-            return cast(str, package.get("version", default))
-    return default
+def get_current_locked_version(locked: LockedPackageIndex, name: str, default: str) -> str:
+    return locked.get_version(name, default)
 
 
 def _modify_locked_package_to_named(info: dict[str, Any]) -> None:
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import itertools
+import os
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    import tracemalloc
+
+    from cleo.events.event import Event
+    from cleo.events.event_dispatcher import EventDispatcher
+
+    Handler = Callable[[Event, str, EventDispatcher], None]
+
+PROFILE_ENV = "POETRY_MONOREPO_DEPS_PROFILE"
+"""Enables profiling the event handlers of the plugin: the directory to write the profiles to."""
+
+PROFILE_MODES_ENV = "POETRY_MONOREPO_DEPS_PROFILE_MODES"
+"""The profilers to run, comma separated, all of them by default."""
+
+PROFILE_MODE_CPU = "cpu"
+PROFILE_MODE_MEMORY = "memory"
+PROFILE_MODES = [PROFILE_MODE_CPU, PROFILE_MODE_MEMORY]
+
+TOP_ALLOCATIONS = 25
+"""The number of source lines with the largest allocations that are listed."""
+
+
+class HandlerProfiler:
+    """
+    Runs the event handlers of the plugin under cProfile (`cpu`) and/or tracemalloc (`memory`).
+
+    For each handled event, the profiles are written to the directory, named after the command and the handler: the
+    pstats of cProfile, and the tracemalloc snapshot with a summary of its top allocations.
+    """
+
+    def __init__(self, directory: Path, modes: list[str]) -> None:
+        self.directory = directory
+        self.modes = modes
+        self._sequence = itertools.count()
+
+    @staticmethod
+    def from_environment(directory: Path) -> HandlerProfiler:
+        value = os.environ.get(PROFILE_MODES_ENV, ",".join(PROFILE_MODES))
+        modes = [mode.strip() for mode in value.split(",") if mode.strip()]
+        if not modes or any(mode not in PROFILE_MODES for mode in modes):
+            raise ValueError(f"{PROFILE_MODES_ENV} should be a comma separated list of {PROFILE_MODES}")
+        return HandlerProfiler(directory, modes)
+
+    def wrap(self, handler: Handler) -> Handler:
+        """Returns the handler, which profiles each call."""
+        from functools import wraps
+
+        @wraps(handler)
+        def profiled(event: Event, event_name: str, dispatcher: EventDispatcher) -> None:
+            command = getattr(getattr(event, "command", None), "name", None) or "unknown"
+            name = "-".join(
+                [re.sub(r"[^\w.]+", "-", command), handler.__name__, str(os.getpid()), str(next(self._sequence))]
+            )
+            self.profile(name, lambda: handler(event, event_name, dispatcher))
+
+        return profiled
+
+    def profile(self, name: str, call: Callable[[], None]) -> None:
+        """Calls the function, and writes its profiles named after the given name, also when it fails."""
+        import cProfile
+        import tracemalloc
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile = cProfile.Profile() if PROFILE_MODE_CPU in self.modes else None
+        trace = PROFILE_MODE_MEMORY in self.modes
+        # leave tracing running afterwards, if it was already started by someone else
+        stop_tracing = trace and not tracemalloc.is_tracing()
+        if stop_tracing:
+            tracemalloc.start()
+        if profile is not None:
+            profile.enable()
+        try:
+            call()
+        finally:
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(str(self.directory / f"{name}.pstats"))
+            if trace:
+                snapshot = tracemalloc.take_snapshot()
+                if stop_tracing:
+                    tracemalloc.stop()
+                self.write_snapshot(name, snapshot)
+
+    def write_snapshot(self, name: str, snapshot: tracemalloc.Snapshot) -> None:
+        import tracemalloc
+
+        snapshot = snapshot.filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            ]
+        )
+        snapshot.dump(str(self.directory / f"{name}.tracemalloc"))
+        statistics = snapshot.statistics("lineno")
+        lines = [f"Top {TOP_ALLOCATIONS} of {len(statistics)} allocating lines"]
+        lines.extend(str(statistic) for statistic in statistics[:TOP_ALLOCATIONS])
+        (self.directory / f"{name}-allocations.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from poetry.core.packages.package import Package
+
+INTERNAL_SOURCE_TYPES = ["directory", "file"]
+"""The source types of the locked packages of which the lock entries are patched, instead of resolved again."""
+
+
+def read_path_package(path: Path) -> Package | None:
+    """Returns the package in the directory or (wheel / sdist) file, like Poetry would lock it, if it can be read."""
+    from poetry.inspection.info import PackageInfo, PackageInfoError
+
+    if not path.exists():
+        return None
+    try:
+        # for a directory, the requirements are read from its pyproject.toml itself (including its groups and extras)
+        return PackageInfo.from_path(path).to_package(root_dir=path if path.is_dir() else None)
+    except (PackageInfoError, RuntimeError):
+        return None
+
+
+def locked_requirements(entry: dict[str, Any], root_dir: Path) -> set[str]:
+    """Returns the (PEP 508) required dependencies of the locked package, ignoring its optional dependencies."""
+    from poetry.core.factory import Factory
+
+    requirements = set()
+    for name, constraints in entry.get("dependencies", {}).items():
+        # a dependency with multiple constraints (for different markers) is locked as a list
+        for constraint in constraints if isinstance(constraints, list) else [constraints]:
+            dependency = Factory.create_dependency(name, constraint, root_dir=root_dir)
+            if not dependency.is_optional():
+                requirements.add(dependency.to_pep_508())
+    return requirements
+
+
+def package_requirements(package: Package) -> set[str]:
+    """Returns the (PEP 508) required dependencies of the package, ignoring its optional dependencies."""
+    return {dependency.to_pep_508() for dependency in package.requires if not dependency.is_optional()}
+
+
+def package_extras(package: Package) -> dict[str, list[str]]:
+    """Returns the extras of the package, as Poetry locks them."""
+    return {str(name): sorted(dep.base_pep_508_name for dep in deps) for name, deps in package.extras.items()}
+
+
+def file_hashes(path: Path) -> list[dict[str, str]]:
+    """Returns the files of the locked package: a file dependency is locked with its hash, a directory without."""
+    if path.is_dir():
+        return []
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return [{"file": path.name, "hash": f"sha256:{digest.hexdigest()}"}]
+
+
+def is_compatible(entry: dict[str, Any], path: Path, package: Package) -> bool:
+    """
+    Whether the locked package only differs in version (or file hash) from the package at its path.
+
+    Otherwise, its requirements changed, which need to be resolved again.
+    """
+    from packaging.utils import canonicalize_name
+
+    return (
+        canonicalize_name(entry["name"]) == package.name
+        and entry.get("python-versions") == package.python_versions
+        and locked_requirements(entry, path) == package_requirements(package)
+        and {str(name): list(deps) for name, deps in entry.get("extras", {}).items()} == package_extras(package)
+    )
+
+
+def patch_lock_file(project_dir: Path) -> list[str] | None:
+    """
+    Updates the versions (and file hashes) of the directory and file dependencies in the lock file of the project.
+
+    Only the entries of these packages are patched, in place, thus without resolving the dependencies. Returns the
+    patched packages, or None when the lock file needs to be resolved again (by `poetry lock`): when the project isn't
+    locked, its own dependencies changed since, or the requirements of one of its path dependencies changed.
+    """
+    import tomlkit
+    from poetry.factory import Factory
+
+    locker = Factory().create_poetry(project_dir, disable_plugins=True).locker
+    if not locker.is_locked() or not locker.is_fresh():
+        return None
+
+    document = tomlkit.parse(locker.lock.read_text(encoding="utf-8"))
+    entries = [
+        entry for entry in document.get("package", []) if entry.get("source", {}).get("type") in INTERNAL_SOURCE_TYPES
+    ]
+    patched = []
+    for entry in entries:
+        path = project_dir / entry["source"]["url"]
+        package = read_path_package(path)
+        if package is None or not is_compatible(entry, path, package):
+            return None
+        files = file_hashes(path)
+        if entry["version"] != package.pretty_version or entry.get("files") != files:
+            patched.append(f"{entry['name']} ({entry['version']} -> {package.pretty_version})")
+            entry["version"] = package.pretty_version
+            entry["files"] = tomlkit.array().multiline(bool(files))
+            entry["files"].extend(tomlkit.inline_table().add("file", f["file"]).add("hash", f["hash"]) for f in files)
+
+    if patched:
+        locker.lock.write_text(tomlkit.dumps(document), encoding="utf-8")
+    return patched
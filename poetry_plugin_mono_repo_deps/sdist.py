@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from io import BytesIO
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING, Any, BinaryIO
+
+if TYPE_CHECKING:
+    from tarfile import TarInfo
+
+    from poetry.core.masonry.builders.builder import BuildIncludeFile
+
+
+class InMemoryFile:
+    """Stands in for the path of a file that poetry-core adds to an sdist, providing its content from memory."""
+
+    def __init__(self, path: Path, content: bytes) -> None:
+        self._path = path
+        self.content = content
+
+    def open(self, mode: str = "rb") -> BinaryIO:
+        return BytesIO(self.content)
+
+    def relative_to(self, *other: Any) -> Path:
+        return self._path.relative_to(*other)
+
+    def __str__(self) -> str:
+        return str(self._path)
+
+
+class InMemoryPyproject:
+    """
+    Makes poetry-core's sdist builder add the given pyproject.toml content, instead of reading the file from disk.
+
+    All other metadata of the artifacts is derived from the in-memory Poetry package, the pyproject.toml file is the
+    only part of a build that is read from disk. Patching the builder (until `uninstall`) avoids writing the rewritten
+    pyproject.toml to disk.
+    """
+
+    def __init__(self, pyproject_path: Path, content: bytes) -> None:
+        self._pyproject_path = pyproject_path.resolve()
+        self._content = content
+        # the patched attributes of the sdist builder, as found in its class dict
+        self._originals: dict[str, Any] | None = None
+
+    def install(self) -> None:
+        from poetry.core.masonry.builders.sdist import SdistBuilder
+
+        if self._originals is not None:  # pragma: no cover
+            return
+        original_find_files_to_add = SdistBuilder.find_files_to_add
+        # a classmethod before poetry-core 2.0.0, thus bound through its descriptor
+        original_clean_tarinfo = vars(SdistBuilder)["clean_tarinfo"]
+        pyproject_path = self._pyproject_path
+        content = self._content
+
+        def find_files_to_add(builder: SdistBuilder, exclude_build: bool = False) -> set[BuildIncludeFile]:
+            files = original_find_files_to_add(builder, exclude_build)
+            for file in files:
+                if file.path == pyproject_path:
+                    file.path = InMemoryFile(pyproject_path, content)  # type: ignore[assignment]
+            return files
+
+        def clean_tarinfo(builder: SdistBuilder, tar_info: TarInfo) -> TarInfo:
+            tar_info = original_clean_tarinfo.__get__(builder, SdistBuilder)(tar_info)
+            # the tar info is derived from the file on disk, but should describe the content in memory
+            if PurePosixPath(tar_info.name).parts[1:] == ("pyproject.toml",):
+                tar_info.size = len(content)
+            return tar_info
+
+        self._originals = {name: vars(SdistBuilder)[name] for name in ["find_files_to_add", "clean_tarinfo"]}
+        setattr(SdistBuilder, "find_files_to_add", find_files_to_add)
+        setattr(SdistBuilder, "clean_tarinfo", clean_tarinfo)
+
+    def uninstall(self) -> None:
+        from poetry.core.masonry.builders.sdist import SdistBuilder
+
+        if self._originals is None:  # pragma: no cover
+            return
+        for name, original in self._originals.items():
+            setattr(SdistBuilder, name, original)
+        self._originals = None
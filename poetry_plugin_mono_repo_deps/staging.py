@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from poetry.pyproject.toml import PyProjectTOML
+
+if TYPE_CHECKING:
+    from poetry.poetry import Poetry
+
+STAGING_DIRECTORY = ".monorepo-deps-staging"
+"""The directory within the project that contains the staging directories of the running commands."""
+
+IGNORED_NAMES = [".git", ".venv", "__pycache__"]
+"""Directories that aren't part of the sources of a package, thus don't need to be staged."""
+
+
+def is_outside(path: str, directory: Path) -> bool:
+    """Returns whether the (relative or absolute) path lies outside the directory, without resolving symlinks."""
+    return os.path.relpath(directory / path, directory).split(os.sep)[0] == os.pardir
+
+
+def symlink_target(link: Path, source: Path) -> str:
+    """
+    Returns the target of the symlink within the source, to recreate it with elsewhere.
+
+    A relative target outside the source is made absolute, as it would dangle from the (deeper) destination otherwise.
+    """
+    target = os.readlink(link)
+    absolute_target = os.path.normpath(link.parent.absolute() / target)
+    if not os.path.isabs(target) and is_outside(absolute_target, source.absolute()):
+        return absolute_target
+    return target
+
+
+def link_tree(source: Path, destination: Path, ignore_names: list[str], ignore_paths: list[Path]) -> None:
+    """
+    Recreates the directory tree of the source in the destination, by hardlinking all files.
+
+    Falls back to copying the files when the file system doesn't support hardlinks. Symlinks are recreated as symlinks,
+    with an absolute target if their relative target lies outside the source, except for symlinks to files outside the
+    source: the files themselves are linked, as the builders don't add files (like a license) outside the project. Files
+    and directories with an ignored name (anywhere in the tree) or an ignored path (relative to the source) are not
+    staged.
+    """
+    for root, dirs, files in os.walk(source):
+        root_path = Path(root)
+        relative_root = root_path.relative_to(source)
+        target_root = destination / relative_root
+        target_root.mkdir(exist_ok=True)
+        for name in list(dirs):
+            if name in ignore_names or relative_root / name in ignore_paths:
+                dirs.remove(name)
+            elif (root_path / name).is_symlink():
+                # not walked into by os.walk, thus recreated as symlink
+                os.symlink(symlink_target(root_path / name, source), target_root / name)
+        for name in files:
+            source_path = root_path / name
+            if name in ignore_names or relative_root / name in ignore_paths:
+                continue
+            if source_path.is_symlink():
+                target = symlink_target(source_path, source)
+                if not (is_outside(target, source.absolute()) and os.path.isfile(target)):
+                    os.symlink(target, target_root / name)
+                    continue
+                source_path = Path(target)
+            try:
+                os.link(source_path, target_root / name)
+            except OSError:  # pragma: no cover (file systems without hardlinks)
+                shutil.copy2(source_path, target_root / name)
+
+
+class StagingDirectory:
+    """
+    A shadow copy of the project directory, containing the rewritten pyproject.toml, from which a command is run.
+
+    Files are hardlinked, such that staging is cheap, while the project directory itself is never modified. Multiple
+    commands (like concurrent builds and exports) on the same project can therefore run at the same time. Artifacts
+    written to the output directory of the command are moved to the output directory of the project.
+
+    The sources of the package outside the project directory (like `readme = "../README.md"`) are symlinked at the same
+    relative location, thus the staged project is nested as deep as these sources require.
+    """
+
+    def __init__(self, project_dir: Path, output: str = "dist") -> None:
+        self._project_dir = project_dir
+        self._output = Path(output)
+        self._original_pyproject: PyProjectTOML | None = None
+        staging_root = project_dir / STAGING_DIRECTORY
+        staging_root.mkdir(exist_ok=True)
+        self._root = Path(tempfile.mkdtemp(dir=staging_root))
+        self.path = self._root
+
+    def install(self, poetry: Poetry) -> None:
+        """Stages the project, and points the Poetry project to the staged pyproject.toml with the in-memory data."""
+        from poetry_plugin_mono_repo_deps.cache import external_sources
+
+        external = [
+            os.path.normpath(path)
+            for path in external_sources(self._project_dir, poetry.pyproject.data)
+            if not os.path.isabs(path)
+        ]
+        depth = max((Path(path).parts.count(os.pardir) for path in external), default=0)
+        if depth:
+            self.path = self._root.joinpath(*self._project_dir.absolute().parts[-depth:])
+        self.path.mkdir(parents=True, exist_ok=True)
+        for path in external:
+            # the first entry next to (or above) the project, like a directory containing the included files
+            parts = Path(path).parts
+            entry = os.path.join(*parts[: parts.count(os.pardir) + 1])
+            staged_entry = Path(os.path.normpath(self.path / entry))
+            if not os.path.lexists(staged_entry):
+                staged_entry.parent.mkdir(parents=True, exist_ok=True)
+                os.symlink(os.path.normpath(self._project_dir.absolute() / entry), staged_entry)
+
+        ignore_paths = [Path(STAGING_DIRECTORY), Path("pyproject.toml")]
+        if not self._output.is_absolute():
+            # the artifacts of the command will be written to the staging directory
+            ignore_paths.append(self._output)
+        link_tree(self._project_dir, self.path, IGNORED_NAMES, ignore_paths)
+
+        pyproject = poetry.pyproject
+        staged_pyproject = PyProjectTOML(self.path / "pyproject.toml")
+        staged_pyproject._toml_document = pyproject.data
+        # a new file, thus not linked to the pyproject.toml of the project
+        staged_pyproject.save()
+        self._original_pyproject = pyproject
+        poetry._pyproject = staged_pyproject
+
+    def uninstall(self, poetry: Poetry) -> None:
+        """Points the Poetry project back to the project, collects the artifacts, and removes the staged files."""
+        assert self._original_pyproject is not None, "the project should be staged first"
+        poetry._pyproject = self._original_pyproject
+        self._original_pyproject = None
+        staged_output = self.path / self._output
+        if not self._output.is_absolute() and staged_output.is_dir():
+            output = self._project_dir / self._output
+            output.mkdir(parents=True, exist_ok=True)
+            for artifact in staged_output.iterdir():
+                os.replace(artifact, output / artifact.name)
+        shutil.rmtree(self._root, ignore_errors=True)
+        try:
+            # only succeeds if no other command is staged
+            self._root.parent.rmdir()
+        except OSError:  # pragma: no cover
+            pass
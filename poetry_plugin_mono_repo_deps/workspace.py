@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import subprocess
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from poetry.utils._compat import tomllib
+
+from poetry_plugin_mono_repo_deps.plugin import (
+    Config,
+    _config_from_toml,
+    canonicalize_name,
+    is_to_be_replaced_dependency_lock,
+)
+
+WORKSPACE_INDEX = ".monorepo-deps-index.json"
+"""The file within the workspace root that contains the index of the workspace."""
+
+INDEX_VERSION = 1
+"""The version of the index format, indices of other versions are rebuilt."""
+
+IGNORED_DIRECTORIES = ["build", "dist", "node_modules", "__pycache__"]
+"""Directories that don't contain projects, next to hidden directories (like `.git` and `.venv`) and virtualenvs."""
+
+
+@dataclass(frozen=True)
+class WorkspacePackage:
+    """A project within the workspace, and the (canonical) names of the internal packages it depends on."""
+
+    name: str
+    version: str
+    path: str
+    """The directory of the project, relative to the workspace root (in POSIX notation)"""
+    dependencies: tuple[str, ...]
+
+    @staticmethod
+    def from_dict(values: dict[str, Any]) -> WorkspacePackage:
+        return WorkspacePackage(
+            name=values["name"],
+            version=values["version"],
+            path=values["path"],
+            dependencies=tuple(values["dependencies"]),
+        )
+
+
+class Workspace:
+    """The graph of the internal packages of a monorepo, connected by their path dependencies."""
+
+    def __init__(self, root: Path, packages: list[WorkspacePackage]) -> None:
+        """:raises ValueError: when multiple projects have the same (canonical) name"""
+        self.root = root
+        self.packages: dict[str, WorkspacePackage] = {}
+        for package in packages:
+            duplicate = self.packages.setdefault(package.name, package)
+            if duplicate is not package:
+                raise ValueError(
+                    f"Both the projects at {root / duplicate.path} and {root / package.path} are named {package.name}"
+                )
+        self._dependents: dict[str, list[str]] = {name: [] for name in self.packages}
+        for package in packages:
+            for dependency in package.dependencies:
+                self._dependents[dependency].append(package.name)
+        self._directories = {package.path: package.name for package in packages}
+
+    def get_package(self, name: str) -> WorkspacePackage | None:
+        return self.packages.get(canonicalize_name(name))
+
+    def dependencies(self, name: str) -> list[WorkspacePackage]:
+        """Returns the internal packages the package with the given name directly depends on."""
+        package = self.packages[canonicalize_name(name)]
+        return [self.packages[dependency] for dependency in package.dependencies]
+
+    def dependents(self, name: str) -> list[WorkspacePackage]:
+        """Returns the internal packages that directly depend on the package with the given name."""
+        return [self.packages[dependent] for dependent in self._dependents[canonicalize_name(name)]]
+
+    def packages_for_paths(self, paths: Iterable[Path]) -> set[str]:
+        """
+        Returns the names of the packages that contain the given files or directories.
+
+        Relative paths are relative to the workspace root. A path within a nested project belongs to the innermost
+        project, paths outside all projects are ignored.
+        """
+        names: set[str] = set()
+        for path in paths:
+            path = Path(os.path.relpath(self.root / path, self.root))
+            for directory in [path, *path.parents]:
+                name = self._directories.get(directory.as_posix())
+                if name is not None:
+                    names.add(name)
+                    break
+        return names
+
+    def affected(self, names: Iterable[str]) -> list[WorkspacePackage]:
+        """Returns the packages with the given names, and all packages that (transitively) depend on them, in order."""
+        affected: set[str] = set()
+        pending = [canonicalize_name(name) for name in names]
+        while pending:
+            name = pending.pop()
+            if name not in affected:
+                affected.add(name)
+                pending.extend(self._dependents[name])
+        return [package for package in self.topological_order() if package.name in affected]
+
+    def topological_order(self) -> list[WorkspacePackage]:
+        """
+        Returns all packages, such that each package comes after the internal packages it depends on.
+
+        :raises ValueError: when the path dependencies contain a cycle
+        """
+        ordered: list[WorkspacePackage] = []
+        # the packages currently being visited (False) or already ordered (True)
+        visited: dict[str, bool] = {}
+
+        def visit(package: WorkspacePackage) -> None:
+            state = visited.get(package.name)
+            if state is False:
+                raise ValueError(f"Cyclic path dependencies involving {package.name}")
+            if state is None:
+                visited[package.name] = False
+                for dependency in self.dependencies(package.name):
+                    visit(dependency)
+                visited[package.name] = True
+                ordered.append(package)
+
+        for name in sorted(self.packages):
+            visit(self.packages[name])
+        return ordered
+
+
+def find_pyprojects(root: Path) -> Iterator[Path]:
+    """
+    Yields the pyproject.toml files of all projects under the root, without descending into hidden directories.
+
+    Virtualenvs (directories with a `pyvenv.cfg`, like `venv` or `env`) are skipped, as their installed packages can
+    ship a pyproject.toml.
+    """
+    for directory, dirs, files in os.walk(root):
+        if "pyvenv.cfg" in files:
+            dirs[:] = []
+            continue
+        dirs[:] = sorted(name for name in dirs if not name.startswith(".") and name not in IGNORED_DIRECTORIES)
+        if "pyproject.toml" in files:
+            yield Path(directory) / "pyproject.toml"
+
+
+def parse_pyproject(root: Path, pyproject_path: Path, toml_data: dict[str, Any]) -> WorkspacePackage | None:
+    """
+    Returns the package of the pyproject.toml, or None if it doesn't describe a named project.
+
+    Only the path dependencies that the plugin would replace (given the configuration of the project, or the default
+    configuration) are followed, the dependencies still need to be resolved against the other projects.
+
+    :raises ValueError: when the configuration of the plugin in the pyproject.toml is invalid
+    """
+    poetry_config: dict[str, Any] = toml_data.get("tool", {}).get("poetry", {})
+    project_config: dict[str, Any] = toml_data.get("project", {})
+    name = project_config.get("name", poetry_config.get("name"))
+    if name is None:
+        return None
+    try:
+        config = _config_from_toml(toml_data) or Config.from_dict({})
+    except ValueError as e:
+        raise ValueError(f"Invalid configuration in {pyproject_path}: {e}") from e
+    sections = [poetry_config.get("dependencies", {}), poetry_config.get("dev-dependencies", {})]
+    sections += [group.get("dependencies", {}) for group in poetry_config.get("group", {}).values()]
+    project_dir = pyproject_path.parent
+    paths: list[str] = []
+    for dependencies in sections:
+        for dependency in dependencies.values():
+            if isinstance(dependency, dict) and "path" in dependency:
+                if is_to_be_replaced_dependency_lock(config, dependency):
+                    # directories outside the workspace start with `..`, thus never match a project
+                    paths.append(Path(os.path.relpath(project_dir / dependency["path"], root)).as_posix())
+    return WorkspacePackage(
+        name=canonicalize_name(name),
+        version=str(project_config.get("version", poetry_config.get("version", ""))),
+        path=project_dir.relative_to(root).as_posix(),
+        # resolved to the names of the packages once all projects are known
+        dependencies=tuple(dict.fromkeys(paths)),
+    )
+
+
+class WorkspaceIndex:
+    """
+    The parsed projects of a workspace, persisted in the workspace root.
+
+    A project is only parsed again when its pyproject.toml changed: the entry is reused as long as the modification
+    time and size of the file are unchanged, or, if these changed, the hash of its content is unchanged.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.path = root / WORKSPACE_INDEX
+        self._entries: dict[str, dict[str, Any]] = {}
+        self._modified = False
+
+    def load(self) -> None:
+        """Loads the index from disk, a missing or incompatible index is silently discarded."""
+        try:
+            index = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return
+        if isinstance(index, dict) and index.get("version") == INDEX_VERSION:
+            self._entries = index["entries"]
+
+    def save(self) -> None:
+        """Saves the index to disk, if it was modified."""
+        if not self._modified:
+            return
+        temporary_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        temporary_path.write_text(json.dumps({"version": INDEX_VERSION, "entries": self._entries}, sort_keys=True))
+        # concurrent readers either see the previous or the new index
+        os.replace(temporary_path, self.path)
+        self._modified = False
+
+    def get_package(self, pyproject_path: Path) -> WorkspacePackage | None:
+        """Returns the package of the pyproject.toml, parsing it only if it changed since it was indexed."""
+        key = pyproject_path.parent.relative_to(self.root).as_posix()
+        stat = pyproject_path.stat()
+        entry = self._entries.get(key)
+        if entry is not None and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return self._get_entry_package(entry)
+        content = pyproject_path.read_bytes()
+        digest = hashlib.sha256(content).hexdigest()
+        if entry is None or entry["sha256"] != digest:
+            package = parse_pyproject(self.root, pyproject_path, tomllib.loads(content.decode("utf-8")))
+            entry = {"package": None if package is None else asdict(package), "sha256": digest}
+        entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        self._entries[key] = entry
+        self._modified = True
+        return self._get_entry_package(entry)
+
+    def prune(self, keys: set[str]) -> None:
+        """Removes the entries of the projects that no longer exist."""
+        for key in set(self._entries) - keys:
+            del self._entries[key]
+            self._modified = True
+
+    @staticmethod
+    def _get_entry_package(entry: dict[str, Any]) -> WorkspacePackage | None:
+        return None if entry["package"] is None else WorkspacePackage.from_dict(entry["package"])
+
+
+def changed_paths(root: Path, revision_range: str) -> list[Path]:
+    """
+    Returns the files under the root that changed in the git revision range (like `main...HEAD`), relative to the root.
+
+    :raises RuntimeError: when git fails to determine the changes
+    """
+    command = ["git", "diff", "--name-only", "--relative", revision_range]
+    try:
+        result = subprocess.run(command, cwd=root, check=True, capture_output=True, text=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        stderr = getattr(e, "stderr", None) or str(e)
+        raise RuntimeError(f"Failed to determine the changes in {revision_range}: {stderr.strip()}") from e
+    return [Path(line) for line in result.stdout.splitlines() if line]
+
+
+def load_workspace(root: Path, index: WorkspaceIndex | None = None) -> Workspace:
+    """
+    Returns the workspace of all projects under the root, using (and updating) the index in the root.
+
+    Path dependencies on directories outside the workspace, or without a project, are not part of the graph. An index
+    that is kept in memory (of the same root) can be given, to skip loading it from disk.
+
+    :raises ValueError: when a project has an invalid configuration, or multiple projects have the same name
+    """
+    root = root.resolve()
+    if index is None:
+        index = WorkspaceIndex(root)
+        index.load()
+    pyproject_paths = list(find_pyprojects(root))
+    packages: dict[str, WorkspacePackage] = {}
+    for pyproject_path in pyproject_paths:
+        package = index.get_package(pyproject_path)
+        if package is not None:
+            packages[package.path] = package
+    index.prune({pyproject_path.parent.relative_to(root).as_posix() for pyproject_path in pyproject_paths})
+    index.save()
+    names = {path: package.name for path, package in packages.items()}
+    return Workspace(
+        root,
+        [
+            WorkspacePackage(
+                name=package.name,
+                version=package.version,
+                path=package.path,
+                dependencies=tuple(names[path] for path in package.dependencies if path in names),
+            )
+            for package in packages.values()
+        ],
+    )
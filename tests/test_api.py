@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from poetry.factory import Factory
+
+from poetry_plugin_mono_repo_deps.api import RewrittenProject, rewrite_project
+from poetry_plugin_mono_repo_deps.plugin import Config
+
+
+def dependency_lines(result: RewrittenProject) -> dict[str, list[str]]:
+    return {group: [dep.to_pep_508() for dep in deps] for group, deps in result.dependencies.items()}
+
+
+def test_rewrite_project(fixture_simple_a: Path) -> None:
+    project_dir = fixture_simple_a / "lib-enabled"
+    pyproject = (project_dir / "pyproject.toml").read_text()
+    lock = (project_dir / "poetry.lock").read_text()
+
+    result = rewrite_project(project_dir)
+    assert result.named_requirements == {"lib-a": "lib-a (>=0.0.1,<0.1.0)"}
+    assert dependency_lines(result)["main"] == ["lib-a (>=0.0.1,<0.1.0)"]
+    assert dependency_lines(result)["dev"] == ["pytest (>=8.0.2,<9.0.0)"]
+    assert result.lock_data is not None
+    lib_a = next(info for info in result.lock_data["package"] if info["name"] == "lib-a")
+    assert "source" not in lib_a
+    assert "develop" not in lib_a
+    assert 'lib-a = { version = "0.0.1"}' in result.pyproject
+    assert "path =" not in result.pyproject
+    # the project itself is left as is
+    assert (project_dir / "pyproject.toml").read_text() == pyproject
+    assert (project_dir / "poetry.lock").read_text() == lock
+    # the pyproject.toml itself can be given as well
+    assert rewrite_project(str(project_dir / "pyproject.toml")) == result
+
+
+def test_rewrite_project_poetry(fixture_simple_a: Path) -> None:
+    poetry = Factory().create_poetry(fixture_simple_a / "lib-enabled", disable_plugins=True)
+    before = [dep.to_pep_508() for dep in poetry.package.all_requires]
+
+    result = rewrite_project(poetry, Config.from_dict({"constraint": ">="}))
+    assert dependency_lines(result)["main"] == ["lib-a (>=0.0.1)"]
+    assert result.named_requirements == {"lib-a": "lib-a (>=0.0.1)"}
+    # the given project is not modified
+    assert [dep.to_pep_508() for dep in poetry.package.all_requires] == before
+    lib_a = next(info for info in poetry.locker.lock_data["package"] if info["name"] == "lib-a")
+    assert lib_a["source"]["type"] == "directory"
+
+
+def test_rewrite_project_not_configured(fixture_simple_a: Path) -> None:
+    for name in ["lib-disabled", "lib-b"]:
+        project_dir = fixture_simple_a / name
+        result = rewrite_project(project_dir)
+        assert result.named_requirements == {}
+        assert any(line.startswith("lib-a @ ") for line in dependency_lines(result)["main"])
+        assert result.lock_data is not None
+        lib_a = next(info for info in result.lock_data["package"] if info["name"] == "lib-a")
+        assert lib_a["source"]["type"] == "directory"
+        assert result.pyproject == (project_dir / "pyproject.toml").read_text()
+    # unless a configuration is given
+    result = rewrite_project(fixture_simple_a / "lib-disabled", Config.from_dict({}))
+    assert result.named_requirements == {"lib-a": "lib-a (>=0.0.1,<0.1.0)"}
+
+
+def test_rewrite_project_loaded_pyproject(fixture_simple_a: Path) -> None:
+    poetry = Factory().create_poetry(fixture_simple_a / "lib-enabled", disable_plugins=True)
+    poetry.pyproject.data["tool"]["poetry"]["description"] = "Changed in memory"
+
+    result = rewrite_project(poetry)
+    assert 'description = "Changed in memory"' in result.pyproject
+    assert 'lib-a = { version = "0.0.1"}' in result.pyproject
+    # the loaded document is not modified
+    assert "path" in poetry.pyproject.data["tool"]["poetry"]["dependencies"]["lib-a"]
+
+
+def test_rewrite_project_unlocked(fixture_simple_a: Path) -> None:
+    project_dir = fixture_simple_a / "lib-enabled"
+    (project_dir / "poetry.lock").unlink()
+
+    result = rewrite_project(project_dir)
+    assert result.lock_data is None
+    assert result.named_requirements == {}
+    assert dependency_lines(result)["main"][0].startswith("lib-a @ ")
+
+
+def test_rewrite_project_concurrently(fixture_simple_a: Path) -> None:
+    projects = [fixture_simple_a / name for name in ["lib-enabled", "lib-b", "lib-enabled-extras"]] * 4
+    expected = [rewrite_project(project) for project in projects]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(rewrite_project, projects))
+    assert results == expected
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import io
+import os
+import tarfile
+import zipfile
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from poetry_plugin_mono_repo_deps.artifacts import (
+    ArtifactPinning,
+    artifact_name_version,
+    record_hash,
+    replace_file,
+    rewrite_metadata,
+    rewrite_sdist,
+    rewrite_wheel,
+)
+from tests.helpers import run_test_app
+
+METADATA = b"""Metadata-Version: 2.1
+Name: app
+Version: 1.0.0
+Requires-Dist: lib-a @ file:///repo/lib-a
+Requires-Dist: Lib_B[extra] @ file:///repo/lib-b ; python_version >= "3.9"
+Requires-Dist: lib-c @ file:///repo/lib-c
+Requires-Dist: requests (>=2.0,<3.0)
+
+Requires-Dist: lib-a @ file:///repo/lib-a
+"""
+REQUIREMENTS = {"lib-a": "lib-a (>=1.0.0,<1.1.0)", "lib-b": "lib-b[extra] (>=2.0.0,<2.1.0)"}
+
+
+def pin_pyproject(content: bytes) -> bytes:
+    return content.replace(b'{path = "../lib-a"}', b'"~=1.0.0"')
+
+
+def write_wheel(path: Path, metadata: bytes) -> None:
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as whl:
+        whl.writestr("app/__init__.py", "print('app')\n")
+        whl.writestr("app-1.0.0.dist-info/METADATA", metadata)
+        whl.writestr(
+            "app-1.0.0.dist-info/RECORD",
+            f"app/__init__.py,sha256=x,13\napp-1.0.0.dist-info/METADATA,{record_hash(metadata)},{len(metadata)}\n"
+            "app-1.0.0.dist-info/RECORD,,\n",
+        )
+
+
+def write_sdist(path: Path, files: dict[str, bytes]) -> None:
+    with tarfile.open(path, "w:gz") as tar:
+        directory = tarfile.TarInfo("app-1.0.0")
+        directory.type = tarfile.DIRTYPE
+        tar.addfile(directory)
+        for name, content in files.items():
+            info = tarfile.TarInfo(f"app-1.0.0/{name}")
+            info.size = len(content)
+            info.mtime = 1
+            tar.addfile(info, io.BytesIO(content))
+
+
+def read_sdist(path: Path) -> dict[str, bytes]:
+    with tarfile.open(path, "r:gz") as tar:
+        files = {}
+        for member in tar.getmembers():
+            extracted = tar.extractfile(member)
+            files[member.name] = b"<dir>" if extracted is None else extracted.read()
+        return files
+
+
+def test_rewrite_metadata() -> None:
+    assert rewrite_metadata(METADATA, REQUIREMENTS).decode("utf-8").splitlines() == [
+        "Metadata-Version: 2.1",
+        "Name: app",
+        "Version: 1.0.0",
+        "Requires-Dist: lib-a (>=1.0.0,<1.1.0)",
+        'Requires-Dist: lib-b[extra] (>=2.0.0,<2.1.0) ; python_version >= "3.9"',
+        # only the requirements of the replaced path dependencies are pinned
+        "Requires-Dist: lib-c @ file:///repo/lib-c",
+        "Requires-Dist: requests (>=2.0,<3.0)",
+        "",
+        # the description is left untouched
+        "Requires-Dist: lib-a @ file:///repo/lib-a",
+    ]
+    assert rewrite_metadata(b"Requires-Dist: lib-a @ file:///repo/lib-a", REQUIREMENTS) == (
+        b"Requires-Dist: lib-a (>=1.0.0,<1.1.0)"
+    )
+
+
+@pytest.fixture
+def dist(tmp_path: Path) -> Path:
+    path = tmp_path / "dist"
+    path.mkdir()
+    return path
+
+
+def test_rewrite_wheel(dist: Path) -> None:
+    wheel_path = dist / "app-1.0.0-py3-none-any.whl"
+    write_wheel(wheel_path, METADATA)
+
+    assert rewrite_wheel(wheel_path, REQUIREMENTS)
+    with zipfile.ZipFile(wheel_path) as whl:
+        metadata = whl.read("app-1.0.0.dist-info/METADATA")
+        assert metadata == rewrite_metadata(METADATA, REQUIREMENTS)
+        assert whl.read("app-1.0.0.dist-info/RECORD").decode("utf-8").splitlines() == [
+            "app/__init__.py,sha256=x,13",
+            f"app-1.0.0.dist-info/METADATA,{record_hash(metadata)},{len(metadata)}",
+            "app-1.0.0.dist-info/RECORD,,",
+        ]
+        assert whl.read("app/__init__.py") == b"print('app')\n"
+    assert [path.name for path in dist.iterdir()] == [wheel_path.name]
+
+    # an already pinned wheel isn't written again
+    mtime = wheel_path.stat().st_mtime_ns
+    assert not rewrite_wheel(wheel_path, REQUIREMENTS)
+    assert wheel_path.stat().st_mtime_ns == mtime
+    # nor is a wheel without metadata
+    with zipfile.ZipFile(wheel_path, "w") as whl:
+        whl.writestr("app/__init__.py", "")
+    assert not rewrite_wheel(wheel_path, REQUIREMENTS)
+
+
+def test_rewrite_sdist(dist: Path) -> None:
+    sdist_path = dist / "app-1.0.0.tar.gz"
+    pyproject = b'[tool.poetry.dependencies]\nlib-a = {path = "../lib-a"}\n'
+    write_sdist(sdist_path, {"app/__init__.py": b"print('app')\n", "pyproject.toml": pyproject, "PKG-INFO": METADATA})
+
+    assert rewrite_sdist(sdist_path, REQUIREMENTS, pin_pyproject)
+    assert read_sdist(sdist_path) == {
+        "app-1.0.0": b"<dir>",
+        "app-1.0.0/app/__init__.py": b"print('app')\n",
+        "app-1.0.0/pyproject.toml": pin_pyproject(pyproject),
+        "app-1.0.0/PKG-INFO": rewrite_metadata(METADATA, REQUIREMENTS),
+    }
+    # the rewritten sdist is reproducible
+    content = sdist_path.read_bytes()
+    write_sdist(sdist_path, {"app/__init__.py": b"print('app')\n", "pyproject.toml": pyproject, "PKG-INFO": METADATA})
+    assert rewrite_sdist(sdist_path, REQUIREMENTS, pin_pyproject)
+    assert sdist_path.read_bytes() == content
+
+    assert not rewrite_sdist(sdist_path, REQUIREMENTS, pin_pyproject)
+    write_sdist(sdist_path, {})
+    assert not rewrite_sdist(sdist_path, REQUIREMENTS, pin_pyproject)
+
+
+def test_replace_file_keeps_original_on_failure(dist: Path) -> None:
+    path = dist / "app-1.0.0.tar.gz"
+    path.write_bytes(b"original")
+
+    def write(f: io.BufferedWriter) -> None:
+        f.write(b"partial")
+        raise OSError("disk full")
+
+    with pytest.raises(OSError, match="disk full"):
+        replace_file(path, write)
+    assert path.read_bytes() == b"original"
+    assert [path.name for path in dist.iterdir()] == [path.name]
+
+
+def test_artifact_pinning(dist: Path) -> None:
+    write_wheel(dist / "App-1.0.0-py3-none-any.whl", METADATA)
+    write_wheel(dist / "app-0.9.0-py3-none-any.whl", METADATA)
+    write_wheel(dist / "other-1.0.0-py3-none-any.whl", METADATA)
+    write_sdist(dist / "app-1.0.tar.gz", {"PKG-INFO": METADATA})
+    (dist / "app-1.0.0.zip").write_bytes(b"")
+    assert artifact_name_version(dist / "app-1.0.tar.gz") == ("app", "1")
+    assert artifact_name_version(dist / "app-1.0.0.zip") is None
+
+    pinning = ArtifactPinning("app", "1.0.0", REQUIREMENTS, pin_pyproject)
+    artifacts = pinning.find_artifacts(dist)
+    assert [path.name for path in artifacts] == ["App-1.0.0-py3-none-any.whl", "app-1.0.tar.gz"]
+    assert pinning.pin_all(artifacts + [dist / "app-1.0.0.zip"], jobs=2) == artifacts
+    assert pinning.pin_all(artifacts, jobs=0) == []
+
+
+def build_project(project_dir: Path, rewrite: Callable[[str], str]) -> None:
+    """Builds the project, without the plugin replacing its path dependencies."""
+    pyproject_path = project_dir / "pyproject.toml"
+    content = pyproject_path.read_text()
+    pyproject_path.write_text(rewrite(content))
+    _out, err = run_test_app(["poetry", "build"])
+    assert err == ""
+    pyproject_path.write_text(content)
+
+
+def test_monorepo_pin_artifacts(fixture_simple_a: Path) -> None:
+    project_dir = fixture_simple_a / "lib-enabled"
+    os.chdir(project_dir)
+    build_project(project_dir, lambda content: content + "commands = []\n")
+    wheel_path = project_dir / "dist" / "lib_enabled-0.0.1-py3-none-any.whl"
+
+    out, err = run_test_app(["poetry", "monorepo", "pin-artifacts", "--jobs", "2"])
+    assert err == ""
+    assert "Pinned 2 of 2 artifacts" in out
+    with zipfile.ZipFile(wheel_path) as whl:
+        metadata = whl.read("lib_enabled-0.0.1.dist-info/METADATA").decode("utf-8").splitlines()
+        assert "Requires-Dist: lib-a (>=0.0.1,<0.1.0)" in metadata
+    sdist_files = read_sdist(project_dir / "dist" / "lib_enabled-0.0.1.tar.gz")
+    assert b'lib-a = { version = "0.0.1"}' in sdist_files["lib_enabled-0.0.1/pyproject.toml"]
+
+    out, err = run_test_app(["poetry", "monorepo", "pin-artifacts", str(wheel_path)])
+    assert err == ""
+    assert "Pinned 0 of 1 artifacts" in out
+    _out, err = run_test_app(["poetry", "monorepo", "pin-artifacts", "unknown.whl"])
+    assert "Artifact unknown.whl does not exist" in err
+
+
+def test_monorepo_pin_artifacts_without_configuration(fixture_simple_a: Path) -> None:
+    project_dir = fixture_simple_a / "lib-b"
+    os.chdir(project_dir)
+    build_project(project_dir, lambda content: content)
+
+    out, err = run_test_app(["poetry", "monorepo", "pin-artifacts"])
+    assert err == ""
+    assert "Pinned 2 of 2 artifacts" in out
+    with zipfile.ZipFile(project_dir / "dist" / "lib_b-0.0.1-py3-none-any.whl") as whl:
+        assert b"Requires-Dist: lib-a (>=0.0.1,<0.1.0)" in whl.read("lib_b-0.0.1.dist-info/METADATA")
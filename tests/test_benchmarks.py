@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pytest
+from poetry.factory import Factory
+
+from benchmarks.monorepo import MonorepoShape, generate_monorepo, locked_packages, path_dependencies
+from benchmarks.run import overheads, print_report
+from tests.helpers import run_test_app
+
+
+def test_path_dependencies() -> None:
+    shape = MonorepoShape(packages=5, fanout=3, groups=2, lock_size=0)
+    assert path_dependencies(shape, 0) == {}
+    assert path_dependencies(shape, 4) == {"main": [3, 1], "group-1": [2]}
+    assert locked_packages(shape) == [0, 1, 2, 3]
+    assert locked_packages(MonorepoShape(packages=1, fanout=1, groups=1, lock_size=0)) == []
+
+
+def test_generate_monorepo(tmp_path: Path) -> None:
+    project_dir, lock_size = generate_monorepo(tmp_path, MonorepoShape(packages=4, fanout=2, groups=2, lock_size=10))
+    assert project_dir == tmp_path / "lib-0003"
+    assert lock_size == 3 + 10
+    locker = Factory().create_poetry(project_dir).locker
+    assert locker.is_fresh()
+    assert len(locker.lock_data["package"]) == lock_size
+
+    os.chdir(project_dir)
+    _out, err = run_test_app(["poetry", "export", "--without-hashes", "--output", "requirements.txt"])
+    assert err == ""
+    requirements = (project_dir / "requirements.txt").read_text()
+    assert "lib-0002==0.1.0" in requirements
+    assert "ext-0009==1.0.0" in requirements
+
+    with pytest.raises(ValueError, match="at least one package"):
+        generate_monorepo(tmp_path, MonorepoShape(packages=0, fanout=2, groups=2, lock_size=10))
+
+
+def test_print_report(capsys: pytest.CaptureFixture[str]) -> None:
+    results = [
+        {"scenario": "a", "command": "build", "variant": variant, "median": median, "peak_rss_kib": rss}
+        for variant, median, rss in [("baseline", 1.0, 1024), ("plugin", 1.5, 3072)]
+    ]
+    assert set(overheads(results)) == {("a", "build")}
+    print_report(results, [{**results[1], "median": 1.0}])
+    assert "+0.500s" in capsys.readouterr().out.splitlines()[1]
+    print_report(results, None)
+    assert "+2.0M" in capsys.readouterr().out
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Iterator
+
+from pytest_mock import MockerFixture
+
+from poetry_plugin_mono_repo_deps.cache import (
+    ArtifactCache,
+    CachedBuilds,
+    LockSummaryCache,
+    external_sources,
+    tree_hash,
+)
+
+
+def test_tree_hash(tmp_path: Path) -> None:
+    (tmp_path / "pkg" / "__pycache__").mkdir(parents=True)
+    (tmp_path / "pkg" / "__init__.py").write_text("")
+    (tmp_path / "dist").mkdir()
+    original = tree_hash(tmp_path, ["__pycache__"], [Path("dist")])
+
+    # ignored files don't change the hash
+    (tmp_path / "pkg" / "__pycache__" / "__init__.pyc").write_text("")
+    (tmp_path / "pkg" / "__pycache__.txt").write_text("")
+    (tmp_path / "dist" / "pkg.whl").write_text("")
+    assert tree_hash(tmp_path, ["__pycache__", "__pycache__.txt"], [Path("dist")]) == original
+
+    # both the names and the content of the files do
+    (tmp_path / "pkg" / "__init__.py").write_text("changed = True\n")
+    changed = tree_hash(tmp_path, ["__pycache__"], [Path("dist")])
+    assert changed != original
+    (tmp_path / "pkg" / "__init__.py").rename(tmp_path / "pkg" / "main.py")
+    assert tree_hash(tmp_path, ["__pycache__"], [Path("dist")]) not in [original, changed]
+
+
+def test_tree_hash_follows_symlinks(tmp_path: Path) -> None:
+    (tmp_path / "shared").mkdir()
+    (tmp_path / "shared" / "util.py").write_text("")
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "shared").symlink_to("../shared")
+    # a cycle is only hashed once
+    (tmp_path / "shared" / "project").symlink_to("../project")
+    original = tree_hash(project, [], [])
+
+    (tmp_path / "shared" / "util.py").write_text("changed = True\n")
+    assert tree_hash(project, [], []) != original
+
+
+def test_external_sources(tmp_path: Path) -> None:
+    pyproject_data = {
+        "project": {"readme": {"file": "../README.md"}},
+        "tool": {
+            "poetry": {
+                "packages": [{"include": "pkg", "from": "src"}, {"include": "shared", "from": "../libs"}],
+                "include": ["CHANGELOG.md", {"path": "../LICENSE", "format": "sdist"}],
+                "readme": ["README.md", "../docs/usage.md"],
+            }
+        },
+    }
+    assert external_sources(tmp_path, pyproject_data) == [
+        os.path.join("../libs", "shared"),
+        "../LICENSE",
+        "../docs/usage.md",
+        "../README.md",
+    ]
+    assert external_sources(tmp_path, {"tool": {"poetry": {"readme": "README.md"}}}) == []
+    assert external_sources(tmp_path, {"project": {"readme": "/README.md"}}) == ["/README.md"]
+
+
+def test_artifact_cache(tmp_path: Path) -> None:
+    cache = ArtifactCache(tmp_path / "cache", max_size=25)
+    artifacts = []
+    for name in ["a", "b", "c"]:
+        artifact = tmp_path / f"{name}.whl"
+        artifact.write_bytes(b"0123456789")
+        artifacts.append(artifact)
+    assert cache.get("a") is None
+
+    cache.put("a", artifacts[0])
+    cache.put("b", artifacts[1])
+    # storing the same artifact concurrently keeps the first
+    cache.put("b", artifacts[0])
+    cached = cache.get("b")
+    assert cached is not None
+    assert cached.name == "b.whl"
+    assert cached.read_bytes() == b"0123456789"
+
+    # the least recently used artifact is evicted, once the cache is full
+    os.utime(cache.directory / "a", ns=(0, 0))
+    assert cache.get("a") is not None
+    os.utime(cache.directory / "b", ns=(0, 0))
+    cache.put("c", artifacts[2])
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert sorted(path.name for path in cache.directory.iterdir()) == ["a", "c"]
+
+    # artifacts that are being stored are never evicted
+    (cache.directory / ".tmp-d").mkdir()
+    cache.max_size = 0
+    cache.evict()
+    assert [path.name for path in cache.directory.iterdir()] == [".tmp-d"]
+
+
+def test_lock_summary_cache(tmp_path: Path) -> None:
+    cache = LockSummaryCache(tmp_path / "cache", max_entries=2)
+    key_a, key_b, key_c = (LockSummaryCache.key(content) for content in [b"a", b"b", b"c"])
+    assert key_a == LockSummaryCache.key(b"a")
+    assert cache.get(key_a) is None
+
+    cache.put(key_a, [["lib-a", "1.0.0", "directory", True]])
+    assert cache.get(key_a) == [["lib-a", "1.0.0", "directory", True]]
+    cache.put(key_b, [])
+    os.utime(cache.directory / f"{key_a}.json", ns=(1, 1))
+    os.utime(cache.directory / f"{key_b}.json", ns=(2, 2))
+    # using an entry makes it the most recently used one
+    assert cache.get(key_a) is not None
+    cache.put(key_c, [])
+    assert sorted(path.name for path in cache.directory.iterdir()) == sorted([f"{key_a}.json", f"{key_c}.json"])
+
+    # invalid entries are ignored
+    (cache.directory / f"{key_b}.json").write_text("[")
+    assert cache.get(key_b) is None
+    (cache.directory / f"{key_b}.json").write_text("{}")
+    assert cache.get(key_b) is None
+
+
+def test_concurrent_eviction(tmp_path: Path, mocker: MockerFixture) -> None:
+    """Entries that are listed, but removed (by a concurrent command) before they are inspected, are skipped."""
+    artifact = tmp_path / "a.whl"
+    artifact.write_bytes(b"0123456789")
+    artifact_cache = ArtifactCache(tmp_path / "artifacts", max_size=10)
+    artifact_cache.put("a", artifact)
+    summary_cache = LockSummaryCache(tmp_path / "locks", max_entries=1)
+    summary_cache.put(LockSummaryCache.key(b"a"), [])
+    iterdir, glob = Path.iterdir, Path.glob
+
+    def iterdir_evicted(path: Path) -> Iterator[Path]:
+        yield from iterdir(path)
+        if path == artifact_cache.directory:
+            yield path / "evicted"
+
+    def glob_evicted(path: Path, pattern: str) -> Iterator[Path]:
+        yield from glob(path, pattern)
+        yield path / "evicted.json"
+
+    mocker.patch.object(Path, "iterdir", iterdir_evicted)
+    mocker.patch.object(Path, "glob", glob_evicted)
+    artifact_cache.evict()
+    summary_cache.evict()
+    assert os.listdir(artifact_cache.directory) == ["a"]
+    assert summary_cache.get(LockSummaryCache.key(b"a")) == []
+
+
+def test_cached_build_concurrent_eviction(tmp_path: Path, mocker: MockerFixture) -> None:
+    """An artifact that is evicted (by a concurrent build) before it is copied, is built instead."""
+    cache = ArtifactCache(tmp_path / "cache", max_size=100)
+    # neither an empty directory nor a file is an entry
+    (cache.directory / "empty").mkdir(parents=True)
+    (cache.directory / "file").write_text("")
+    assert cache.get("empty") is None
+    assert cache.get("file") is None
+    (cache.directory / "empty").rmdir()
+    (cache.directory / "file").unlink()
+    mocker.patch.object(cache, "get", return_value=tmp_path / "cache" / "evicted" / "a.tar.gz")
+    builder = SimpleNamespace(default_target_dir=tmp_path / "dist")
+
+    def original_build(builder: Any, target_dir: Path | None) -> Path:
+        artifact: Path = builder.default_target_dir / "a.tar.gz"
+        artifact.write_text("built")
+        return artifact
+
+    io = mocker.Mock()
+    build = CachedBuilds(io, cache, "package")._cached_build("sdist", original_build)
+    assert build(builder) == tmp_path / "dist" / "a.tar.gz"
+    assert (tmp_path / "dist" / "a.tar.gz").read_text() == "built"
+    io.write_line.assert_not_called()
+    assert len(list(cache.directory.iterdir())) == 1
@@ -1,15 +1,27 @@
 from __future__ import annotations
 
+import json
 import logging
 import os
 import re
+import shutil
 import zipfile
 from pathlib import Path
 from tarfile import TarFile
 from zipfile import ZipFile
 
 import pytest
-
+from poetry.core.masonry.builders.sdist import SdistBuilder
+from poetry.core.masonry.builders.wheel import WheelBuilder
+from poetry.factory import Factory
+from poetry.packages.locker import Locker
+from poetry.pyproject.toml import PyProjectTOML
+from pytest_mock import MockerFixture
+
+from poetry_plugin_mono_repo_deps import artifacts
+from poetry_plugin_mono_repo_deps.plugin import LockedPackageIndex, MonoRepoDepsPlugin
+from poetry_plugin_mono_repo_deps.staging import STAGING_DIRECTORY
+from tests.conftest import Config
 from tests.fixtures import TestSetup, module_setups, package_name_of
 from tests.helpers import POETRY_VERSION, run_test_app
 
@@ -48,6 +60,32 @@ def test_export_locked(fixture_simple_a: Path, tmp_path: Path, module_dir: str)
             assert path_str in requirements_content or named_path_str in requirements_content
 
 
+def test_export_skips_pyproject_and_locked_repository(
+    fixture_simple_a: Path, tmp_path: Path, mocker: MockerFixture
+) -> None:
+    os.chdir(fixture_simple_a / "lib-enabled")
+    update_pyproject_toml = mocker.spy(MonoRepoDepsPlugin, "update_pyproject_toml")
+    update_lock_data = mocker.spy(MonoRepoDepsPlugin, "update_lock_data")
+    locked_repository = mocker.spy(Locker, "locked_repository")
+
+    _out, err = run_test_app(["poetry", "export", "--output", str(tmp_path / "reqs.txt")])
+    assert err == ""
+    assert update_lock_data.call_count == 1
+    update_pyproject_toml.assert_not_called()
+    # only the exporter itself loads the locked repository
+    assert locked_repository.call_count == 1
+
+
+def test_ignored_command_does_not_load_poetry(fixture_simple_a: Path, mocker: MockerFixture) -> None:
+    """Commands that aren't configured should not require the plugin to load the Poetry project."""
+    os.chdir(fixture_simple_a / "lib-enabled")
+    create_poetry = mocker.spy(Factory, "create_poetry")
+
+    _out, err = run_test_app(["poetry", "about"])
+    assert err == ""
+    create_poetry.assert_not_called()
+
+
 @pytest.mark.parametrize("module_dir", module_setups.keys())
 def test_ignored_command(fixture_simple_a: Path, tmp_path: Path, module_dir: str) -> None:
     """Running on a completely different command."""
@@ -117,6 +155,321 @@ def test_build_artifact(fixture_simple_a: Path, module_dir: str) -> None:
         validate_pyproject_content(setup_disabled, original_content)
 
 
+def test_build_without_path_dependencies_keeps_pyproject(fixture_simple_a: Path, mocker: MockerFixture) -> None:
+    """Without path dependencies to replace, the pyproject.toml should be neither saved nor restored."""
+    os.chdir(fixture_simple_a / "lib-independent")
+    save = mocker.spy(PyProjectTOML, "save")
+
+    _out, err = run_test_app(["poetry", "build"])
+    assert err == ""
+    save.assert_not_called()
+
+
+@pytest.mark.parametrize("rewrite_mode", ["memory", "staging", "artifacts"])
+def test_build_artifact_without_writing_pyproject(fixture_simple_a: Path, rewrite_mode: str) -> None:
+    """These rewrite modes should result in the same artifacts, without writing the project's pyproject.toml."""
+    module_dir = "lib-enabled"
+    setup = module_setups[module_dir]
+    package_name = package_name_of(module_dir)
+    os.chdir(fixture_simple_a / module_dir)
+    with open("pyproject.toml", "a") as f:
+        f.write(f'rewrite_mode = "{rewrite_mode}"\n')
+    original_content = Path("pyproject.toml").read_bytes()
+    original_mtime = Path("pyproject.toml").stat().st_mtime_ns
+
+    _out, err = run_test_app(["poetry", "build", "-vvv"])
+    assert err == ""
+    assert Path("pyproject.toml").read_bytes() == original_content
+    assert Path("pyproject.toml").stat().st_mtime_ns == original_mtime
+    assert not Path(STAGING_DIRECTORY).exists()
+
+    dist_path = Path(os.getcwd()) / "dist"
+    with ZipFile(dist_path / f"{package_name}-0.0.1-py3-none-any.whl") as whl:
+        metadata_path = zipfile.Path(whl) / f"{package_name}-0.0.1.dist-info" / "METADATA"
+        validate_package_metadata(setup, metadata_path.read_text().splitlines())
+
+    with TarFile.open(dist_path / f"{package_name}-0.0.1.tar.gz") as tar:
+        pyproject_stream = tar.extractfile(f"{package_name}-0.0.1/pyproject.toml")
+        assert pyproject_stream is not None
+        with pyproject_stream:
+            pyproject_content = pyproject_stream.read().decode("utf-8").splitlines()
+            validate_pyproject_content(setup, pyproject_content)
+            assert f'rewrite_mode = "{rewrite_mode}"' in pyproject_content
+
+    # the sdist builder is restored after the command
+    assert SdistBuilder.find_files_to_add.__module__ == SdistBuilder.__module__
+
+
+def test_build_artifact_pinned_afterwards(fixture_simple_a: Path, mocker: MockerFixture) -> None:
+    """In artifacts mode, the wheel is built with the path dependencies, which are pinned in its metadata afterwards."""
+    os.chdir(fixture_simple_a / "lib-enabled")
+    with open("pyproject.toml", "a") as f:
+        f.write('rewrite_mode = "artifacts"\n')
+    rewrite_wheel = mocker.spy(artifacts, "rewrite_wheel")
+
+    out, err = run_test_app(["poetry", "build", "--format", "wheel"])
+    assert err == ""
+    assert "Replacing path dependency" not in out
+    assert "Pinned the path dependencies of lib_enabled-0.0.1-py3-none-any.whl" in out
+    assert rewrite_wheel.spy_return is True
+    with ZipFile(Path("dist") / "lib_enabled-0.0.1-py3-none-any.whl") as whl:
+        metadata = (zipfile.Path(whl) / "lib_enabled-0.0.1.dist-info" / "METADATA").read_text().splitlines()
+    assert "Requires-Dist: lib-a (>=0.0.1,<0.1.0)" in metadata
+    assert not any(line.startswith("Requires-Dist: lib-a @ ") for line in metadata)
+
+
+def test_build_staged_sources_outside_project(fixture_simple_a: Path) -> None:
+    """The sources outside the project, by symlink or as readme, are part of the artifacts built from staging."""
+    os.chdir(fixture_simple_a / "lib-enabled")
+    (fixture_simple_a / "LICENSE").write_text("MIT\n")
+    os.symlink("../LICENSE", "LICENSE")
+    pyproject = Path("pyproject.toml")
+    pyproject.write_text(pyproject.read_text() + 'rewrite_mode = "staging"\n')
+
+    _out, err = run_test_app(["poetry", "build", "--format", "sdist"])
+    assert err == ""
+    with TarFile.open(Path("dist") / "lib_enabled-0.0.1.tar.gz") as tar:
+        license_stream = tar.extractfile("lib_enabled-0.0.1/LICENSE")
+        assert license_stream is not None
+        assert license_stream.read() == b"MIT\n"
+
+    (fixture_simple_a / "README.md").write_text("# Libraries\n")
+    pyproject.write_text(
+        pyproject.read_text().replace("[tool.poetry]\n", '[tool.poetry]\nreadme = "../README.md"\n', 1)
+    )
+    _out, err = run_test_app(["poetry", "build", "--format", "wheel"])
+    assert err == ""
+    with ZipFile(Path("dist") / "lib_enabled-0.0.1-py3-none-any.whl") as whl:
+        metadata = (zipfile.Path(whl) / "lib_enabled-0.0.1.dist-info" / "METADATA").read_text()
+    assert "# Libraries" in metadata
+    assert not Path(STAGING_DIRECTORY).exists()
+
+
+def test_build_artifact_failure_isnt_pinned(fixture_simple_a: Path) -> None:
+    os.chdir(fixture_simple_a / "lib-enabled")
+    with open("pyproject.toml", "a") as f:
+        f.write('rewrite_mode = "artifacts"\n')
+    # the package of lib-enabled can't be found anymore
+    shutil.rmtree("lib_enabled")
+
+    out, err = run_test_app(["poetry", "build"])
+    assert "No file/folder found for package lib-enabled" in err
+    assert "Pinned" not in out
+
+
+def test_build_artifact_cache(fixture_simple_a: Path, config: Config, mocker: MockerFixture) -> None:
+    """Rebuilding unchanged sources with the same named dependencies reuses the cached artifacts."""
+    module_dir = "lib-enabled"
+    package_name = package_name_of(module_dir)
+    os.chdir(fixture_simple_a / module_dir)
+    with open("pyproject.toml", "a") as f:
+        f.write("artifact_cache = true\n")
+    wheel_path = Path("dist") / f"{package_name}-0.0.1-py3-none-any.whl"
+
+    out, err = run_test_app(["poetry", "build"])
+    assert err == ""
+    assert "Reused cached" not in out
+    wheel_content = wheel_path.read_bytes()
+    cache_dir = Path(config.get("cache-dir")) / "monorepo-deps" / "artifacts"
+    assert len(list(cache_dir.iterdir())) == 2
+
+    shutil.rmtree("dist")
+    out, err = run_test_app(["poetry", "build"])
+    assert err == ""
+    assert f"Reused cached {package_name}-0.0.1.tar.gz" in out
+    assert f"Reused cached {package_name}-0.0.1-py3-none-any.whl" in out
+    assert wheel_path.read_bytes() == wheel_content
+
+    # changed sources, or another version of an internal dependency, are built again
+    (Path(package_name) / "__init__.py").write_text("changed = True\n")
+    out, err = run_test_app(["poetry", "build"])
+    assert err == ""
+    assert "Reused cached" not in out
+    lock_path = Path("poetry.lock")
+    lock_path.write_text(lock_path.read_text().replace('version = "0.0.1"', 'version = "0.0.2"'))
+    out, err = run_test_app(["poetry", "build", "--format", "wheel"])
+    assert "Reused cached" not in out
+    assert len(list(cache_dir.iterdir())) == 5
+    # like a package with a build script, built with another interpreter
+    mocker.patch.object(WheelBuilder, "tag", new_callable=mocker.PropertyMock, return_value="cp311-cp311-linux_x86_64")
+    out, err = run_test_app(["poetry", "build", "--format", "wheel"])
+    assert err == ""
+    assert "Reused cached" not in out
+    assert len(list(cache_dir.iterdir())) == 6
+
+    # the builders are restored after the command
+    assert SdistBuilder.build.__module__ == SdistBuilder.__module__
+
+
+def test_build_artifact_cache_external_sources(fixture_simple_a: Path, config: Config) -> None:
+    """The artifacts of a package with sources outside the project aren't cached, as these aren't part of its key."""
+    os.chdir(fixture_simple_a / "lib-enabled")
+    (fixture_simple_a / "README.md").write_text("# Libraries\n")
+    pyproject = Path("pyproject.toml")
+    pyproject.write_text(
+        pyproject.read_text().replace("[tool.poetry]\n", '[tool.poetry]\nreadme = "../README.md"\n', 1)
+        + "artifact_cache = true\n"
+    )
+
+    _out, err = run_test_app(["poetry", "build", "--format", "wheel"])
+    assert "Not caching the artifacts, as the sources ../README.md are outside the project." in err
+    assert (Path("dist") / "lib_enabled-0.0.1-py3-none-any.whl").exists()
+    assert not (Path(config.get("cache-dir")) / "monorepo-deps" / "artifacts").exists()
+
+
+def test_export_parses_lock_file_once(fixture_simple_a: Path, tmp_path: Path, mocker: MockerFixture) -> None:
+    """The locked packages are indexed from the lock data that the exporter loads, instead of parsing it again."""
+    os.chdir(fixture_simple_a / "lib-enabled")
+    with open("pyproject.toml", "a") as f:
+        f.write("lock_cache = true\n")
+    get_lock_data = mocker.spy(Locker, "_get_lock_data")
+    from_lock_file = mocker.spy(LockedPackageIndex, "from_lock_file")
+
+    _out, err = run_test_app(["poetry", "export", "--output", str(tmp_path / "reqs.txt")])
+    assert err == ""
+    assert "lib-a==0.0.1" in (tmp_path / "reqs.txt").read_text()
+    assert get_lock_data.call_count == 1
+    from_lock_file.assert_not_called()
+
+
+def test_build_lock_cache(fixture_simple_a: Path, config: Config, mocker: MockerFixture) -> None:
+    """Repeated runs reuse the cached summary of the lock file, instead of parsing it again."""
+    os.chdir(fixture_simple_a / "lib-enabled")
+    with open("pyproject.toml", "a") as f:
+        f.write("lock_cache = true\n")
+    cache_dir = Path(config.get("cache-dir")) / "monorepo-deps" / "locks"
+    from_summary = mocker.spy(LockedPackageIndex, "from_summary")
+    get_lock_data = mocker.spy(Locker, "_get_lock_data")
+
+    _out, err = run_test_app(["poetry", "build", "--format", "wheel"])
+    assert err == ""
+    assert len(list(cache_dir.iterdir())) == 1
+    from_summary.assert_not_called()
+
+    _out, err = run_test_app(["poetry", "build", "--format", "wheel"])
+    assert err == ""
+    assert len(list(cache_dir.iterdir())) == 1
+    assert from_summary.call_count == 1
+    # building never loads the lock data of the locker
+    get_lock_data.assert_not_called()
+
+
+def test_export_split(fixture_simple_a: Path, tmp_path: Path) -> None:
+    os.chdir(fixture_simple_a / "lib-enabled")
+    with open("pyproject.toml", "a") as f:
+        f.write('export_mode = "split"\n')
+
+    out, err = run_test_app(["poetry", "export", "--output", str(tmp_path / "reqs.txt")])
+    assert err == ""
+    assert f"Exported the requirements of the internal packages to {tmp_path / 'reqs-internal.txt'}" in out
+    requirements = (tmp_path / "reqs.txt").read_text()
+    assert "dummy-poetry @ git+https://github.com/gerbenoostra/dummy_poetry.git" in requirements
+    assert "lib-a" not in requirements
+    assert (tmp_path / "reqs-internal.txt").read_text().startswith("lib-a==0.0.1 ; ")
+
+    # without an output file, all requirements are exported together
+    out, err = run_test_app(["poetry", "export"])
+    assert "The split export mode needs an output file, exporting all requirements together." in err
+    assert "lib-a==0.0.1 ; " in out
+
+    # nothing is split when the export fails
+    (tmp_path / "reqs-internal.txt").unlink()
+    _out, err = run_test_app(["poetry", "export", "--only", "unknown", "--output", str(tmp_path / "reqs.txt")])
+    assert "Group(s) not found: unknown" in err
+    assert not (tmp_path / "reqs-internal.txt").exists()
+
+
+def test_build_metrics(fixture_simple_a: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    metrics_path = tmp_path / "metrics.jsonl"
+    monkeypatch.setenv("POETRY_MONOREPO_DEPS_METRICS", str(metrics_path))
+    os.chdir(fixture_simple_a / "lib-enabled")
+    original_size = Path("pyproject.toml").stat().st_size
+
+    _out, err = run_test_app(["poetry", "build", "--format", "wheel"])
+    assert err == ""
+    _out, err = run_test_app(["poetry", "export", "--output", str(tmp_path / "reqs.txt")])
+    assert err == ""
+    build, export = (json.loads(line) for line in metrics_path.read_text().splitlines())
+    assert build["command"] == "build"
+    assert set(build["timings"]) == {
+        "config",
+        "locked_packages",
+        "update_locked_repository",
+        "update_pyproject_toml",
+        "save",
+        "restore",
+    }
+    assert build["counters"]["dependencies_scanned"] >= 2
+    assert build["counters"]["dependencies_replaced"] == 1
+    assert build["counters"]["pyproject_dependencies_replaced"] == 1
+    # the modified pyproject.toml, and the original one when it is restored
+    assert build["counters"]["bytes_written"] > original_size
+    assert export["command"] == "export"
+    assert "update_lock_data" in export["timings"]
+    assert export["counters"]["lock_entries_touched"] > 0
+
+
+def test_build_metrics_output(fixture_simple_a: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("POETRY_MONOREPO_DEPS_METRICS", "-")
+    os.chdir(fixture_simple_a / "lib-enabled")
+    with open("pyproject.toml", "a") as f:
+        f.write('rewrite_mode = "artifacts"\n')
+
+    out, err = run_test_app(["poetry", "build", "-vvv"])
+    assert err == ""
+    assert "Plugin metrics: " in out
+    # both the wheel and the sdist, as these are built from the original package
+    assert '"artifacts_pinned": 2' in out
+    assert '"pin_artifacts": ' in out
+
+
+def test_build_artifact_with_path_versions(fixture_simple_a: Path) -> None:
+    """The versions of the path dependencies are read from their pyproject.toml, thus no (fresh) lock is needed."""
+    lib_a_pyproject = fixture_simple_a / "lib-a" / "pyproject.toml"
+    lib_a_pyproject.write_text(lib_a_pyproject.read_text().replace('version = "0.0.1"', 'version = "0.1.2"'))
+    os.chdir(fixture_simple_a / "lib-enabled")
+    with open("pyproject.toml", "a") as f:
+        f.write('version_source = "path"\n')
+    Path("poetry.lock").unlink()
+
+    _out, err = run_test_app(["poetry", "build", "--format", "wheel"])
+    assert err == ""
+    with ZipFile(Path("dist") / "lib_enabled-0.0.1-py3-none-any.whl") as whl:
+        metadata = (zipfile.Path(whl) / "lib_enabled-0.0.1.dist-info" / "METADATA").read_text().splitlines()
+        assert "Requires-Dist: lib-a (>=0.1.2,<0.2.0)" in metadata
+
+
+def test_export_with_path_versions(fixture_simple_a: Path, tmp_path: Path) -> None:
+    """The exported version of a path dependency is read from its pyproject.toml, even when the lock is stale."""
+    lib_a_pyproject = fixture_simple_a / "lib-a" / "pyproject.toml"
+    lib_a_pyproject.write_text(lib_a_pyproject.read_text().replace('version = "0.0.1"', 'version = "0.1.2"'))
+    os.chdir(fixture_simple_a / "lib-enabled")
+    with open("pyproject.toml", "a") as f:
+        f.write('version_source = "path"\n')
+
+    _out, err = run_test_app(["poetry", "export", "--output", str(tmp_path / "reqs.txt")])
+    assert err == ""
+    requirements = (tmp_path / "reqs.txt").read_text()
+    assert "lib-a==0.1.2" in requirements
+    # the dependencies of the path dependency are still exported
+    assert "dummy-poetry @ git+" in requirements
+
+
+def test_export_with_transitive_path_versions(fixture_simple_a: Path, tmp_path: Path) -> None:
+    """The exported version of an internal package that is a dependency of a path dependency is read from its source."""
+    lib_a_pyproject = fixture_simple_a / "lib-a" / "pyproject.toml"
+    lib_a_pyproject.write_text(lib_a_pyproject.read_text().replace('version = "0.0.1"', 'version = "0.1.2"'))
+    os.chdir(fixture_simple_a / "lib-nested")
+    with open("pyproject.toml", "a") as f:
+        f.write('version_source = "path"\n')
+
+    _out, err = run_test_app(["poetry", "export", "--output", str(tmp_path / "reqs.txt")])
+    assert err == ""
+    requirements = (tmp_path / "reqs.txt").read_text()
+    assert "lib-a==0.1.2" in requirements
+    assert "lib-b==0.0.1" in requirements
+
+
 def validate_pyproject_content(setup: TestSetup, content: list[str]) -> None:
     _logger.info("Validating pyproject content:")
     _logger.info("\n".join(content))
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterator
+
+import pytest
+from pytest_mock import MockerFixture
+
+from poetry_plugin_mono_repo_deps import daemon as daemon_module
+from poetry_plugin_mono_repo_deps.api import rewrite_project
+from poetry_plugin_mono_repo_deps.daemon import DAEMON_ENV, Daemon, DaemonClient
+from poetry_plugin_mono_repo_deps.plugin import LockedPackageIndex
+from poetry_plugin_mono_repo_deps.workspace import WorkspaceIndex, load_workspace
+from tests.helpers import run_test_app
+
+
+def start(daemon: Daemon) -> threading.Thread:
+    thread = threading.Thread(target=daemon.serve)
+    thread.start()
+    client = DaemonClient(daemon.socket_path)
+    deadline = time.monotonic() + 5
+    while not client.is_running():
+        assert time.monotonic() < deadline, "The daemon didn't start listening"
+        time.sleep(0.01)
+    return thread
+
+
+@pytest.fixture(autouse=True)
+def poll_interval(monkeypatch: pytest.MonkeyPatch) -> None:
+    # stop the daemons of the tests without delay
+    monkeypatch.setattr(daemon_module, "POLL_INTERVAL", 0.01)
+
+
+@pytest.fixture
+def daemon(tmp_path: Path) -> Iterator[Daemon]:
+    daemon = Daemon(tmp_path / "daemon.sock")
+    thread = start(daemon)
+    yield daemon
+    daemon.stop()
+    thread.join()
+
+
+def test_daemon_lock_summary(fixture_simple_a: Path, daemon: Daemon, mocker: MockerFixture) -> None:
+    lock_path = fixture_simple_a / "lib-enabled" / "poetry.lock"
+    expected = LockedPackageIndex.from_lock_file(lock_path).summary()
+    from_lock_file = mocker.spy(LockedPackageIndex, "from_lock_file")
+    client = DaemonClient(daemon.socket_path)
+
+    assert client.lock_summary(lock_path) == expected
+    assert client.lock_summary(lock_path) == expected
+    assert from_lock_file.call_count == 1
+    # a changed lock file is read again
+    lock_path.write_text(lock_path.read_text().replace('version = "0.0.1"', 'version = "0.0.2"'))
+    assert ["lib-a", "0.0.2", "directory", True, "../lib-a"] in client.lock_summary(lock_path)
+    assert from_lock_file.call_count == 2
+    lock_path.unlink()
+    assert client.lock_summary(lock_path) == []
+
+
+def test_daemon_workspace(fixture_simple_a: Path, daemon: Daemon, mocker: MockerFixture) -> None:
+    expected = load_workspace(fixture_simple_a)
+    load = mocker.spy(WorkspaceIndex, "load")
+    client = DaemonClient(daemon.socket_path)
+
+    workspace = client.workspace(fixture_simple_a)
+    assert workspace.root == expected.root
+    assert workspace.packages == expected.packages
+    # the index is kept in memory, and picks up the changed projects
+    (fixture_simple_a / "lib-independent" / "pyproject.toml").unlink()
+    assert "lib-independent" not in client.workspace(fixture_simple_a).packages
+    assert load.call_count == 1
+
+
+def test_daemon_rewrite(fixture_simple_a: Path, daemon: Daemon) -> None:
+    project_dir = fixture_simple_a / "lib-enabled"
+    expected = rewrite_project(project_dir)
+
+    result = DaemonClient(daemon.socket_path).rewrite(project_dir)
+    assert result["dependencies"]["main"] == ["lib-a (>=0.0.1,<0.1.0)"]
+    assert result["named_requirements"] == expected.named_requirements
+    assert result["lock_data"] == expected.lock_data
+    assert result["pyproject"] == expected.pyproject
+
+
+def test_daemon_reads_files_concurrently(fixture_simple_a: Path, daemon: Daemon, mocker: MockerFixture) -> None:
+    """Reading a lock file doesn't hold up the requests of the other clients."""
+    lock_path = fixture_simple_a / "lib-enabled" / "poetry.lock"
+    parsing, release = threading.Event(), threading.Event()
+    from_lock_file = LockedPackageIndex.from_lock_file
+
+    def slow_from_lock_file(path: Path) -> LockedPackageIndex:
+        parsing.set()
+        assert release.wait(5)
+        return from_lock_file(path)
+
+    mocker.patch.object(LockedPackageIndex, "from_lock_file", side_effect=slow_from_lock_file)
+    client = DaemonClient(daemon.socket_path)
+    summaries: list[list[Any]] = []
+    thread = threading.Thread(target=lambda: summaries.append(client.lock_summary(lock_path)))
+    thread.start()
+    assert parsing.wait(5)
+    assert "lib-a" in client.workspace(fixture_simple_a).packages
+    assert client.lock_summary(fixture_simple_a / "poetry.lock") == []
+    release.set()
+    thread.join()
+    assert summaries[0] == from_lock_file(lock_path).summary()
+
+
+def test_daemon_errors(fixture_simple_a: Path, daemon: Daemon, mocker: MockerFixture) -> None:
+    client = DaemonClient(daemon.socket_path)
+    with pytest.raises(RuntimeError, match="The daemon failed to handle the unknown request: Unknown request"):
+        client.request("unknown")
+    lock_path = fixture_simple_a / "lib-enabled" / "poetry.lock"
+    lock_path.write_text("[[package]\n")
+    with pytest.raises(RuntimeError, match="RuntimeError: Unable to read the lock file"):
+        client.lock_summary(lock_path)
+    assert daemon.handle(b"not json")["error"].startswith("JSONDecodeError: ")
+
+    # a client that is gone doesn't stop the daemon
+    mocker.patch.object(Daemon, "handle", side_effect=BrokenPipeError)
+    with pytest.raises(ConnectionError, match="closed the connection"):
+        client.request("ping")
+    mocker.stopall()
+    assert client.is_running()
+
+
+def test_daemon_unreachable(tmp_path: Path) -> None:
+    client = DaemonClient(tmp_path / "missing.sock")
+    assert not client.is_running()
+    with pytest.raises(OSError):
+        client.lock_summary(tmp_path / "poetry.lock")
+    assert DaemonClient.from_environment() is None
+
+
+def test_daemon_idle(tmp_path: Path) -> None:
+    socket_path = tmp_path / "sockets" / "daemon.sock"
+    socket_path.parent.mkdir()
+    # left behind by a daemon that was killed
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+        stale.bind(str(socket_path))
+    start = time.monotonic()
+    Daemon(socket_path, idle_timeout=0.1).serve()
+    assert time.monotonic() - start >= 0.1
+    assert not socket_path.exists()
+
+
+def test_daemon_already_running(daemon: Daemon) -> None:
+    with pytest.raises(RuntimeError, match="A daemon is listening on .* already"):
+        Daemon(daemon.socket_path).serve()
+
+
+def test_build_with_daemon(
+    fixture_simple_a: Path, tmp_path: Path, daemon: Daemon, monkeypatch: pytest.MonkeyPatch, mocker: MockerFixture
+) -> None:
+    os.chdir(fixture_simple_a / "lib-enabled")
+    lock_summary = mocker.spy(Daemon, "lock_summary")
+    from_lock_file = mocker.spy(LockedPackageIndex, "from_lock_file")
+    monkeypatch.setenv(DAEMON_ENV, str(daemon.socket_path))
+
+    out, err = run_test_app(["poetry", "build", "--format", "wheel"])
+    assert err == ""
+    assert "with lib-a (>=0.0.1,<0.1.0)" in out
+    assert lock_summary.call_count == 1
+    assert from_lock_file.call_count == 1
+    # without a daemon listening, the plugin reads the lock file itself
+    monkeypatch.setenv(DAEMON_ENV, str(tmp_path / "missing.sock"))
+    out, err = run_test_app(["poetry", "build", "--format", "wheel"])
+    assert err == ""
+    assert "with lib-a (>=0.0.1,<0.1.0)" in out
+    assert lock_summary.call_count == 1
+    assert from_lock_file.call_count == 2
+
+
+@pytest.fixture(params=[b"not json\n", b"{}\n", b'{"result": 5}\n'])
+def garbage_daemon(request: pytest.FixtureRequest, tmp_path: Path) -> Iterator[Path]:
+    """A socket on which something else than the daemon (or a daemon of another version) responds."""
+    socket_path = tmp_path / "garbage.sock"
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(socket_path))
+    server.listen()
+
+    def respond() -> None:
+        while True:
+            try:
+                connection, _ = server.accept()
+            except OSError:
+                return
+            with connection, connection.makefile("rb") as stream:
+                stream.readline()
+                connection.sendall(request.param)
+
+    thread = threading.Thread(target=respond)
+    thread.start()
+    yield socket_path
+    server.shutdown(socket.SHUT_RDWR)
+    server.close()
+    thread.join()
+
+
+def test_garbage_daemon(
+    fixture_simple_a: Path, garbage_daemon: Path, monkeypatch: pytest.MonkeyPatch, mocker: MockerFixture
+) -> None:
+    """An unexpected response of the daemon doesn't fail the command, the files are read instead."""
+    os.chdir(fixture_simple_a / "lib-enabled")
+    from_lock_file = mocker.spy(LockedPackageIndex, "from_lock_file")
+    monkeypatch.setenv(DAEMON_ENV, str(garbage_daemon))
+
+    out, err = run_test_app(["poetry", "build", "--format", "wheel"])
+    assert err == ""
+    assert "with lib-a (>=0.0.1,<0.1.0)" in out
+    assert from_lock_file.call_count == 1
+    out, err = run_test_app(["poetry", "monorepo", "list", "--all", "--root", str(fixture_simple_a)])
+    assert err == ""
+    assert "lib-enabled" in out
+
+
+def test_export_without_daemon(
+    fixture_simple_a: Path, tmp_path: Path, daemon: Daemon, monkeypatch: pytest.MonkeyPatch, mocker: MockerFixture
+) -> None:
+    """The exporter loads the lock data itself, from which the locked packages are indexed."""
+    os.chdir(fixture_simple_a / "lib-enabled")
+    lock_summary = mocker.spy(Daemon, "lock_summary")
+    monkeypatch.setenv(DAEMON_ENV, str(daemon.socket_path))
+    _out, err = run_test_app(["poetry", "export", "--output", str(tmp_path / "reqs.txt")])
+    assert err == ""
+    assert "lib-a==0.0.1" in (tmp_path / "reqs.txt").read_text()
+    lock_summary.assert_not_called()
+
+
+def test_monorepo_list_with_daemon(
+    fixture_simple_a: Path, tmp_path: Path, daemon: Daemon, monkeypatch: pytest.MonkeyPatch, mocker: MockerFixture
+) -> None:
+    workspace = mocker.spy(Daemon, "workspace")
+    args = ["poetry", "monorepo", "list", "--all", "--root", str(fixture_simple_a)]
+    monkeypatch.setenv(DAEMON_ENV, str(daemon.socket_path))
+    out, err = run_test_app(args)
+    assert err == ""
+    assert workspace.call_count == 1
+    monkeypatch.setenv(DAEMON_ENV, str(tmp_path / "missing.sock"))
+    assert run_test_app(args) == (out, err)
+    assert workspace.call_count == 1
+
+
+def test_monorepo_daemon(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    socket_path = tmp_path / "daemon.sock"
+    _out, err = run_test_app(["poetry", "monorepo", "daemon"])
+    assert f"Specify the socket with --socket or the {DAEMON_ENV} environment variable" in err
+
+    monkeypatch.setenv(DAEMON_ENV, str(socket_path))
+    out, err = run_test_app(["poetry", "monorepo", "daemon", "--idle-timeout", "0.1"])
+    assert err == ""
+    assert f"Listening on {socket_path}, until idle for 0.1s" in out
+    assert "Stopped the daemon" in out
+
+    out, _err = run_test_app(["poetry", "monorepo", "daemon", "--stop"])
+    assert f"No daemon is listening on {socket_path}" in out
+
+
+def test_monorepo_daemon_stop(daemon: Daemon) -> None:
+    socket_path = str(daemon.socket_path)
+    _out, err = run_test_app(["poetry", "monorepo", "daemon", "--socket", socket_path])
+    assert f"A daemon is listening on {socket_path} already" in err
+    out, err = run_test_app(["poetry", "monorepo", "daemon", "--socket", socket_path, "--stop"])
+    assert err == ""
+    assert f"Stopped the daemon listening on {socket_path}" in out
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from poetry_plugin_mono_repo_deps.export import internal_requirements_path, split_requirements, split_requirements_file
+
+INDEX = "--extra-index-url https://pypi.example.com/simple\n"
+EXTERNAL = """\
+attrs==23.2.0 ; python_version >= "3.8" \\
+    --hash=sha256:1 \\
+    --hash=sha256:2
+"""
+INTERNAL = """\
+Lib_A[extra]==0.0.1 ; python_version >= "3.8" \\
+    --hash=sha256:3
+lib-b==0.0.1 ; python_version >= "3.8"
+"""
+EXTERNAL_PATHS = """\
+-e file:///repo/lib-c ; python_version >= "3.8"
+requests==2.31.0 ; python_version >= "3.8"
+"""
+EXPORTED = INDEX + EXTERNAL + INTERNAL + EXTERNAL_PATHS
+
+
+def test_split_requirements() -> None:
+    # the editable path dependency isn't replaced, thus not part of the internal requirements
+    assert split_requirements(EXPORTED, {"lib-a", "lib-b", "lib-c"}) == (
+        INDEX + EXTERNAL + EXTERNAL_PATHS,
+        INDEX + INTERNAL,
+        2,
+    )
+    assert split_requirements(EXPORTED, set()) == (EXPORTED, INDEX, 0)
+
+
+def test_split_requirements_file(tmp_path: Path) -> None:
+    output = tmp_path / "requirements.txt"
+    output.write_text(EXPORTED)
+    assert internal_requirements_path(output) == tmp_path / "requirements-internal.txt"
+    assert internal_requirements_path(tmp_path / "reqs") == tmp_path / "reqs-internal"
+
+    assert split_requirements_file(output, {"requests"}) == (tmp_path / "requirements-internal.txt", 1)
+    assert "requests" not in output.read_text()
+    assert (
+        tmp_path / "requirements-internal.txt"
+    ).read_text() == INDEX + 'requests==2.31.0 ; python_version >= "3.8"\n'
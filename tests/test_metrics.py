@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+from cleo.io.buffered_io import BufferedIO
+from cleo.io.outputs.output import Verbosity
+
+from poetry_plugin_mono_repo_deps.metrics import Metrics
+
+
+def test_metrics() -> None:
+    metrics = Metrics()
+    with metrics.time("phase"):
+        pass
+    with pytest.raises(RuntimeError), metrics.time("phase"):
+        raise RuntimeError("failed")
+    metrics.count("dependencies")
+    metrics.count("dependencies", 2)
+
+    report = metrics.to_dict("build")
+    assert report["command"] == "build"
+    assert list(report["timings"]) == ["phase"]
+    assert report["timings"]["phase"] >= 0.0
+    assert report["counters"] == {"dependencies": 3}
+
+
+def test_metrics_report(tmp_path: Path) -> None:
+    metrics = Metrics()
+    metrics.count("bytes_written", 10)
+    io = BufferedIO()
+
+    metrics.report(io, "build", str(tmp_path / "metrics.jsonl"))
+    metrics.report(io, "export", str(tmp_path / "metrics.jsonl"))
+    lines = (tmp_path / "metrics.jsonl").read_text().splitlines()
+    assert [json.loads(line)["command"] for line in lines] == ["build", "export"]
+
+    # only written to the debug output
+    metrics.report(io, "build", "-")
+    assert io.fetch_output() == ""
+    io.set_verbosity(Verbosity.DEBUG)
+    metrics.report(io, "build", "-")
+    assert 'Plugin metrics: {"command": "build", "counters": {"bytes_written": 10}, "timings": {}}' in io.fetch_output()
+
+    metrics.report(io, "build", str(tmp_path / "missing" / "metrics.jsonl"))
+    assert "Could not write the plugin metrics to" in io.fetch_error()
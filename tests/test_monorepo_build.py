@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import subprocess
+import zipfile
+from pathlib import Path
+from zipfile import ZipFile
+
+from pytest_mock import MockerFixture
+
+from poetry_plugin_mono_repo_deps import commands
+from poetry_plugin_mono_repo_deps.commands import build_package, initialize_worker
+from tests.helpers import run_test_app
+
+
+def read_metadata(wheel_path: Path) -> list[str]:
+    name, version = wheel_path.name.split("-")[:2]
+    with ZipFile(wheel_path) as whl:
+        return (zipfile.Path(whl) / f"{name}-{version}.dist-info" / "METADATA").read_text().splitlines()
+
+
+def test_monorepo_build_all(fixture_simple_a: Path) -> None:
+    out, err = run_test_app(["poetry", "monorepo", "build", "--all", "--root", str(fixture_simple_a), "--jobs", "2"])
+    assert err == ""
+    assert "Building 11 packages with 2 jobs" in out
+    assert "Built lib-nested in " in out
+    assert "Built 11 packages in " in out
+    # the path dependencies are replaced, like for `poetry build`
+    metadata = read_metadata(fixture_simple_a / "lib-nested" / "dist" / "lib_nested-0.0.1-py3-none-any.whl")
+    assert "Requires-Dist: lib-b (>=0.0.1,<0.1.0)" in metadata
+    assert (fixture_simple_a / "lib-a" / "dist" / "lib_a-0.0.1.tar.gz").exists()
+    assert "lib-b = {path" in (fixture_simple_a / "lib-nested" / "pyproject.toml").read_text()
+
+
+def test_monorepo_build_packages(fixture_simple_a: Path, tmp_path: Path) -> None:
+    output = tmp_path / "wheels"
+    out, err = run_test_app(
+        [
+            "poetry",
+            "monorepo",
+            "build",
+            "lib_nested",
+            "lib-b",
+            "--root",
+            str(fixture_simple_a),
+            "--format",
+            "wheel",
+            "--output",
+            str(output),
+        ]
+    )
+    assert err == ""
+    assert out.index("Built lib-b in ") < out.index("Built lib-nested in ")
+    assert sorted(path.name for path in output.iterdir()) == [
+        "lib_b-0.0.1-py3-none-any.whl",
+        "lib_nested-0.0.1-py3-none-any.whl",
+    ]
+
+
+def crash_worker(*_args: object) -> None:
+    os._exit(1)
+
+
+def test_monorepo_build_worker_crash(fixture_simple_a: Path, mocker: MockerFixture) -> None:
+    mocker.patch.object(commands, "build_package", crash_worker)
+
+    out, err = run_test_app(["poetry", "monorepo", "build", "lib-a", "lib-b", "--root", str(fixture_simple_a)])
+    assert "The worker failed: BrokenProcessPool: " in err
+    assert "Failed to build lib-a in " in err
+    assert "Failed to build lib-a, stopped after " in err
+    assert "lib-b" not in out + err
+
+
+def test_monorepo_build_stops_on_failure(fixture_simple_a: Path) -> None:
+    # the package of lib-a can't be found anymore
+    shutil.rmtree(fixture_simple_a / "lib-a" / "lib_a")
+
+    out, err = run_test_app(
+        ["poetry", "monorepo", "build", "lib-a", "lib-b", "lib-nested", "--root", str(fixture_simple_a)]
+    )
+    assert "Failed to build lib-a in " in err
+    assert "Failed to build lib-a, stopped after " in err
+    assert "Built lib-b" not in out
+    assert not (fixture_simple_a / "lib-b" / "dist").exists()
+
+
+def test_monorepo_build_invalid_selection(fixture_simple_a: Path) -> None:
+    root = ["--root", str(fixture_simple_a)]
+    _out, err = run_test_app(["poetry", "monorepo", "build", *root])
+    assert "Specify the packages, the changes, or select all packages with --all" in err
+    _out, err = run_test_app(["poetry", "monorepo", "build", "lib-unknown", *root])
+    assert "Package lib-unknown is not part of the workspace" in err
+
+    # lib-a depending on lib-nested introduces a cycle
+    pyproject_path = fixture_simple_a / "lib-a" / "pyproject.toml"
+    pyproject_path.write_text(
+        pyproject_path.read_text().replace(
+            "[tool.poetry.dependencies]", '[tool.poetry.dependencies]\nlib-nested = {path = "../lib-nested"}'
+        )
+    )
+    _out, err = run_test_app(["poetry", "monorepo", "build", "--all", *root])
+    assert "Cyclic path dependencies" in err
+
+
+def test_monorepo_list_invalid_workspace(fixture_simple_a: Path) -> None:
+    root = ["--root", str(fixture_simple_a)]
+    shutil.copytree(fixture_simple_a / "lib-a", fixture_simple_a / "lib-a-copy")
+    _out, err = run_test_app(["poetry", "monorepo", "list", "--all", *root])
+    assert f"Both the projects at {fixture_simple_a / 'lib-a'} and {fixture_simple_a / 'lib-a-copy'}" in err
+
+    shutil.rmtree(fixture_simple_a / "lib-a-copy")
+    with open(fixture_simple_a / "lib-b" / "pyproject.toml", "a") as f:
+        f.write('[tool.poetry-monorepo.deps]\nversion_source = "unknown"\n')
+    for command in ["list", "build", "relock-internal"]:
+        _out, err = run_test_app(["poetry", "monorepo", command, "--all", *root])
+        assert f"Invalid configuration in {fixture_simple_a / 'lib-b' / 'pyproject.toml'}: version_source" in err
+
+
+def test_monorepo_build_changed(fixture_simple_a: Path) -> None:
+    changed = fixture_simple_a / "lib-b" / "lib_b" / "__init__.py"
+    out, err = run_test_app(
+        ["poetry", "monorepo", "build", "--changed", str(changed), "--root", str(fixture_simple_a), "-f", "wheel"]
+    )
+    assert err == ""
+    assert "Building 2 packages" in out
+    assert out.index("Built lib-b in ") < out.index("Built lib-nested in ")
+    assert not (fixture_simple_a / "lib-a" / "dist").exists()
+
+    out, err = run_test_app(
+        [
+            "poetry",
+            "monorepo",
+            "build",
+            "--changed",
+            str(fixture_simple_a / "README.md"),
+            "--root",
+            str(fixture_simple_a),
+        ]
+    )
+    assert err == ""
+    assert "No packages affected by the changes" in out
+
+
+def test_monorepo_list_since(fixture_simple_a: Path) -> None:
+    def git(*args: str) -> None:
+        subprocess.run(["git", *args], cwd=fixture_simple_a, check=True, capture_output=True)
+
+    git("init")
+    git("add", ".")
+    git("-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-m", "initial")
+    (fixture_simple_a / "lib-a" / "lib_a" / "__init__.py").write_text("changed = True\n")
+    git("add", ".")
+
+    root = ["--root", str(fixture_simple_a)]
+    out, err = run_test_app(["poetry", "monorepo", "list", "--since", "HEAD", "lib-independent", *root])
+    assert err == ""
+    # the test application runs in debug mode, thus also prints the debug output of the plugin
+    listed = [line for line in out.splitlines() if line.startswith(str(fixture_simple_a))]
+    # lib-a and all packages depending on it
+    assert len(listed) == 11
+    assert listed[0] == str(fixture_simple_a / "lib-a")
+    assert listed.index(str(fixture_simple_a / "lib-b")) < listed.index(str(fixture_simple_a / "lib-nested"))
+
+    _out, err = run_test_app(["poetry", "monorepo", "list", "--since", "unknown-revision", *root])
+    assert "Failed to determine the changes in unknown-revision" in err
+    _out, err = run_test_app(["poetry", "monorepo", "list", *root])
+    assert "Specify the packages, the changes, or select all packages with --all" in err
+
+
+def test_build_package(fixture_simple_a: Path) -> None:
+    result = build_package("lib-enabled", str(fixture_simple_a / "lib-enabled"), ["--format", "wheel"])
+    assert result.name == "lib-enabled"
+    assert result.exit_code == 0
+    assert result.duration > 0
+    metadata = read_metadata(fixture_simple_a / "lib-enabled" / "dist" / "lib_enabled-0.0.1-py3-none-any.whl")
+    assert "Requires-Dist: lib-a (>=0.0.1,<0.1.0)" in metadata
+
+
+def test_initialize_worker() -> None:
+    logging.root.addHandler(logging.NullHandler())
+    initialize_worker()
+    assert logging.root.handlers == []
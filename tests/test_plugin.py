@@ -1,37 +1,138 @@
 from __future__ import annotations
 
+import os
+import zipfile
 from pathlib import Path
 
 import pytest
+import tomlkit
+from poetry.core.packages.dependency import Dependency
+from poetry.core.packages.dependency_group import DependencyGroup
+from poetry.core.packages.directory_dependency import DirectoryDependency
 from poetry.core.packages.package import Package
+from poetry.core.packages.project_package import ProjectPackage
 from poetry.factory import Factory
+from poetry.utils._compat import tomllib
+from pytest_mock import MockerFixture
 
+from poetry_plugin_mono_repo_deps import plugin
+from poetry_plugin_mono_repo_deps.cache import LockSummaryCache
 from poetry_plugin_mono_repo_deps.plugin import (
     ALLOWED_CONSTRAINTS,
     Config,
+    LockedPackage,
+    LockedPackageIndex,
+    RewriteStage,
+    UndoJournal,
     create_named_dependency,
+    load_config_file,
     modify_locked_package_to_named,
+    read_path_version,
+    replace_group_dependencies,
+    resolve_path_versions,
+    stages_for_command,
+    update_locked_dependencies,
+    update_locked_packages,
 )
+from tests.conftest import FixtureDirGetter
 from tests.helpers import POETRY_VERSION, lock_packages, prepare_test_poetry
 
 
 def test_config_empty() -> None:
     assert Config.from_dict({}) == Config(
         enabled=True,
-        commands=["build", "export"],
+        commands=frozenset({"build", "export"}),
         constraint="~=",
-        source_types=["file", "directory"],
+        source_types=frozenset({"file", "directory"}),
         only_develop=False,
     )
 
 
-@pytest.mark.parametrize("field_name", ["enabled", "commands", "constraint", "source_types", "only_develop"])
+@pytest.mark.parametrize(
+    "field_name",
+    [
+        "enabled",
+        "commands",
+        "constraint",
+        "source_types",
+        "only_develop",
+        "rewrite_mode",
+        "artifact_cache",
+        "artifact_cache_size",
+        "version_source",
+        "lock_cache",
+        "export_mode",
+    ],
+)
 def test_config_missing_required_value(field_name: str) -> None:
     with pytest.raises(ValueError) as e_info:
         Config.from_dict({field_name: None})
     assert str(e_info.value).startswith(f"{field_name} should be of type")
 
 
+def test_config_invalid_rewrite_mode() -> None:
+    with pytest.raises(ValueError) as e_info:
+        Config.from_dict({"rewrite_mode": "elsewhere"})
+    assert str(e_info.value).startswith("rewrite_mode should be one of")
+
+
+def test_config_invalid_version_source() -> None:
+    with pytest.raises(ValueError) as e_info:
+        Config.from_dict({"version_source": "registry"})
+    assert str(e_info.value).startswith("version_source should be one of")
+
+
+def test_config_invalid_export_mode() -> None:
+    with pytest.raises(ValueError) as e_info:
+        Config.from_dict({"export_mode": "separate"})
+    assert str(e_info.value).startswith("export_mode should be one of")
+
+
+def test_stages_for_command() -> None:
+    assert stages_for_command("build") == {RewriteStage.PACKAGE, RewriteStage.PYPROJECT}
+    assert stages_for_command("export") == {RewriteStage.PACKAGE, RewriteStage.LOCK_DATA}
+    # commands without declared stages get all of them
+    assert stages_for_command("install") == set(RewriteStage)
+
+
+def test_load_config_file(fixture_dir: FixtureDirGetter) -> None:
+    assert load_config_file(fixture_dir("simple_a") / "lib-enabled" / "pyproject.toml") == Config.from_dict({})
+    assert load_config_file(fixture_dir("simple_a") / "lib-enabled-no-commands" / "pyproject.toml") == Config.from_dict(
+        {"commands": []}
+    )
+    assert load_config_file(fixture_dir("simple_a") / "lib-disabled" / "pyproject.toml") is None
+    assert load_config_file(fixture_dir("simple_a") / "lib-missing" / "pyproject.toml") is None
+
+
+def test_load_config_file_cached(tmp_path: Path, mocker: MockerFixture) -> None:
+    mocker.patch.object(plugin, "_config_cache", {})
+    mocker.patch.object(plugin, "CONFIG_CACHE_SIZE", 2)
+    loads = mocker.spy(tomllib, "loads")
+    pyproject_path = tmp_path / "pyproject.toml"
+    pyproject_path.write_text("[tool.poetry-monorepo.deps]\n")
+
+    config = load_config_file(pyproject_path)
+    assert load_config_file(pyproject_path) is config
+    assert loads.call_count == 1
+    assert hash(config) == hash(Config.from_dict({}))
+
+    # a modified file is parsed again, the oldest entry is evicted once the cache is full
+    pyproject_path.write_text('[tool.poetry-monorepo.deps]\nconstraint = "^"\n')
+    assert load_config_file(pyproject_path) == Config.from_dict({"constraint": "^"})
+    pyproject_path.write_text("[tool.poetry-monorepo.deps]\nenabled = false\n")
+    assert load_config_file(pyproject_path) is None
+    assert loads.call_count == 3
+    assert len(plugin._config_cache) == 2
+
+
+def test_config_replaces_source_type() -> None:
+    config = Config.from_dict({})
+    assert config.replaces_source_type("directory")
+    assert config.replaces_source_type("git", "file")
+    assert not config.replaces_source_type("git", "url")
+    assert not config.replaces_source_type(None)
+
+
 @pytest.mark.parametrize("constraint", ALLOWED_CONSTRAINTS)
 @pytest.mark.parametrize(
     "package",
@@ -130,13 +231,13 @@ def test_lock_to_name_files(fixture_simple_a: Path) -> None:
     modify_locked_package_to_named(
         Config(
             enabled=True,
-            commands=["build", "export"],
+            commands=frozenset({"build", "export"}),
             constraint="~=",
-            source_types=["file", "directory"],
+            source_types=frozenset({"file", "directory"}),
             only_develop=False,
         ),
         locked_packages[0],
-        locked_packages,
+        LockedPackageIndex(locked_packages),
     )
     assert locked_packages[0] == {
         **default_locked_package,
@@ -157,13 +258,13 @@ def test_lock_to_name_for_path_dependency(fixture_simple_a: Path) -> None:
     modify_locked_package_to_named(
         Config(
             enabled=True,
-            commands=["build", "export"],
+            commands=frozenset({"build", "export"}),
             constraint="~=",
-            source_types=["file", "directory"],
+            source_types=frozenset({"file", "directory"}),
             only_develop=False,
         ),
         locked_packages[0],
-        locked_packages,
+        LockedPackageIndex(locked_packages),
     )
     assert locked_packages[0] == {
         **default_locked_package,
@@ -184,13 +285,13 @@ def test_lock_to_name_for_transitive_path_dependency(fixture_simple_a: Path) ->
     modify_locked_package_to_named(
         Config(
             enabled=True,
-            commands=["build", "export"],
+            commands=frozenset({"build", "export"}),
             constraint="~=",
-            source_types=["file", "directory"],
+            source_types=frozenset({"file", "directory"}),
             only_develop=False,
         ),
         locked_packages[1],
-        locked_packages,
+        LockedPackageIndex(locked_packages),
     )
     assert locked_packages[1] == {
         **default_locked_package,
@@ -212,13 +313,13 @@ def test_lock_to_name_for_transitive_path_dependency_with_extras(fixture_simple_
     modify_locked_package_to_named(
         Config(
             enabled=True,
-            commands=["build", "export"],
+            commands=frozenset({"build", "export"}),
             constraint="~=",
-            source_types=["file", "directory"],
+            source_types=frozenset({"file", "directory"}),
             only_develop=False,
         ),
         locked_packages[1],
-        locked_packages,
+        LockedPackageIndex(locked_packages),
     )
     assert locked_packages[1] == {
         **default_locked_package,
@@ -240,13 +341,13 @@ def test_lock_to_name_for_transitive_non_path_dependency(fixture_simple_a: Path)
     modify_locked_package_to_named(
         Config(
             enabled=True,
-            commands=["build", "export"],
+            commands=frozenset({"build", "export"}),
             constraint="~=",
-            source_types=["file", "directory"],
+            source_types=frozenset({"file", "directory"}),
             only_develop=False,
         ),
         locked_packages[1],
-        locked_packages,
+        LockedPackageIndex(locked_packages),
     )
     assert locked_packages[1] == {
         **default_locked_package,
@@ -268,13 +369,13 @@ def test_lock_to_name_for_unknown_dependency_version(fixture_simple_a: Path) ->
     modify_locked_package_to_named(
         Config(
             enabled=True,
-            commands=["build", "export"],
+            commands=frozenset({"build", "export"}),
             constraint="~=",
-            source_types=["file", "directory"],
+            source_types=frozenset({"file", "directory"}),
             only_develop=False,
         ),
         locked_packages[0],
-        locked_packages,
+        LockedPackageIndex(locked_packages),
     )
     assert locked_packages[0] == {
         **default_locked_package,
@@ -297,13 +398,13 @@ def test_lock_to_name_for_version_dependency(fixture_simple_a: Path) -> None:
     modify_locked_package_to_named(
         Config(
             enabled=True,
-            commands=["build", "export"],
+            commands=frozenset({"build", "export"}),
             constraint="~=",
-            source_types=["file", "directory"],
+            source_types=frozenset({"file", "directory"}),
             only_develop=False,
         ),
         locked_packages[0],
-        locked_packages,
+        LockedPackageIndex(locked_packages),
     )
     assert locked_packages[0] == {
         **default_locked_package,
@@ -329,13 +430,13 @@ def test_lock_to_name_with_git_dependency(fixture_simple_a: Path) -> None:
         modify_locked_package_to_named(
             Config(
                 enabled=True,
-                commands=["build", "export"],
+                commands=frozenset({"build", "export"}),
                 constraint="~=",
-                source_types=["file", "directory", "git"],
+                source_types=frozenset({"file", "directory", "git"}),
                 only_develop=False,
             ),
             locked_package,
-            locked_packages,
+            LockedPackageIndex(locked_packages),
         )
     assert locked_packages[0] == {
         **default_locked_package,
@@ -353,3 +454,265 @@ def test_lock_to_name_with_git_dependency(fixture_simple_a: Path) -> None:
             "dependencies": {"a": {"version": "1.0.0"}},
         },
     }
+
+
+def test_locked_package_index_uses_canonical_names() -> None:
+    locked = LockedPackageIndex(
+        [
+            {"name": "Lib_A", "version": "1.0.0"},
+            {"name": "lib-a", "version": "2.0.0"},
+            {"name": "lib.b", "version": "3.0.0"},
+        ]
+    )
+    # the first locked entry wins, as with a linear scan
+    assert locked.get_version("lib-a", "*") == "1.0.0"
+    assert locked.get_version("LIB_B", "*") == "3.0.0"
+    assert locked.get_version("lib-c", "*") == "*"
+    assert locked.get_entry("lib-c") is None
+    assert locked.get_package("lib-c") is None
+
+
+def test_locked_package_from_lock_data() -> None:
+    locked = LockedPackageIndex(
+        [
+            {"name": "lib-a", "version": "1.0.0", "source": {"type": "directory", "url": "../lib-a"}, "develop": True},
+            {"name": "requests", "version": "2.0.0", "files": [], "dependencies": {"idna": ">=2.5"}},
+        ]
+    )
+    assert locked.get_entry("lib-a") == LockedPackage(
+        "lib-a", "1.0.0", "directory", develop=True, source_url="../lib-a"
+    )
+    assert locked.get_entry("requests") == LockedPackage("requests", "2.0.0")
+    assert locked.get_entry("requests") != LockedPackage("requests", "2.0.1")
+    assert locked.get_entry("requests") != {"name": "requests", "version": "2.0.0"}
+    assert repr(locked.get_entry("requests")) == (
+        "LockedPackage(name='requests', version='2.0.0', source_type=None, develop=False, source_url=None)"
+    )
+    # only the used fields are kept
+    assert not hasattr(locked.get_entry("requests"), "__dict__")
+
+
+def test_locked_package_index_replaced_names() -> None:
+    locked = LockedPackageIndex(
+        [
+            {"name": "Lib_A", "version": "1.0.0", "source": {"type": "directory", "url": "../lib-a"}, "develop": True},
+            {"name": "lib-b", "version": "1.0.0", "source": {"type": "directory", "url": "../lib-b"}},
+            {"name": "lib-c", "version": "1.0.0", "source": {"type": "file", "url": "../lib_c-1.0.0.whl"}},
+            {"name": "requests", "version": "2.0.0"},
+        ]
+    )
+    assert locked.replaced_names(Config.from_dict({})) == {"lib-a", "lib-b", "lib-c"}
+    assert locked.replaced_names(Config.from_dict({"only_develop": True})) == {"lib-a", "lib-c"}
+    assert locked.replaced_names(Config.from_dict({"source_types": ["file"]})) == {"lib-c"}
+
+
+def test_locked_package_index_from_lock_file(fixture_simple_a: Path, tmp_path: Path) -> None:
+    locked = LockedPackageIndex.from_lock_file(fixture_simple_a / "lib-enabled" / "poetry.lock")
+    assert locked.get_entry("lib-a") == LockedPackage(
+        "lib-a", "0.0.1", "directory", develop=True, source_url="../lib-a"
+    )
+
+    (tmp_path / "poetry.lock").write_text("[[package]\n")
+    with pytest.raises(RuntimeError, match="Unable to read the lock file"):
+        LockedPackageIndex.from_lock_file(tmp_path / "poetry.lock")
+    (tmp_path / "poetry.lock").write_text("[metadata]\n")
+    assert LockedPackageIndex.from_lock_file(tmp_path / "poetry.lock").get_entry("lib-a") is None
+
+
+def test_locked_package_index_from_cached_summary(fixture_simple_a: Path, tmp_path: Path) -> None:
+    lock_path = fixture_simple_a / "lib-enabled" / "poetry.lock"
+    cache = LockSummaryCache(tmp_path / "locks")
+    locked = LockedPackageIndex.from_lock_file(lock_path, cache)
+    summary = cache.get(cache.key(lock_path.read_bytes()))
+    assert summary == locked.summary()
+    assert ["lib-a", "0.0.1", "directory", True, "../lib-a"] in summary
+
+    cached = LockedPackageIndex.from_lock_file(lock_path, cache)
+    assert cached.summary() == summary
+    assert cached.get_entry("LIB_A") == locked.get_entry("lib-a")
+    # the cache is keyed by the content of the lock file
+    lock_path.write_text(lock_path.read_text().replace('version = "0.0.1"', 'version = "0.0.2"'))
+    assert LockedPackageIndex.from_lock_file(lock_path, cache).get_version("lib-a", "*") == "0.0.2"
+    assert len(list(cache.directory.iterdir())) == 2
+
+
+def test_locked_package_index_creates_packages_from_lock_data() -> None:
+    locked = LockedPackageIndex([{"name": "Lib_A", "version": "1.0.0"}])
+    package = locked.get_package("lib-a")
+    assert package is not None
+    assert package.name == "lib-a"
+    assert package.version.text == "1.0.0"
+    # packages are created only once
+    assert locked.get_package("LIB_A") is package
+
+
+def test_locked_package_index_set_version() -> None:
+    entry = {"name": "Lib_A", "version": "1.0.0", "optional": False}
+    locked = LockedPackageIndex([entry])
+    assert locked.get_package("lib-a") is not None
+    locked.set_version("lib-a", "1.1.0")
+    locked.set_version("lib-b", "2.0.0")
+    assert locked.get_entry("lib-a") == LockedPackage("Lib_A", "1.1.0")
+    assert locked.get_entry("lib-b") == LockedPackage("lib-b", "2.0.0")
+    package = locked.get_package("lib-a")
+    assert package is not None
+    assert package.version.text == "1.1.0"
+    assert locked.get_version("lib-b", "*") == "2.0.0"
+    # the lock data itself is left untouched
+    assert entry["version"] == "1.0.0"
+
+
+def test_update_locked_packages() -> None:
+    config = Config.from_dict({})
+    locked_packages = [
+        {"name": "lib-a", "version": "1.0.0", "source": {"type": "directory", "url": "../lib-a"}},
+        {"name": "lib-b", "version": "2.0.0", "dependencies": {"lib-a": {"path": "../lib-a", "develop": True}}},
+        {
+            "name": "lib-c",
+            "version": "3.0.0",
+            "source": {"type": "directory", "url": "../lib-c"},
+            "dependencies": {"lib-a": {"path": "../lib-a"}},
+        },
+    ]
+    locked = LockedPackageIndex(locked_packages)
+    # like the version of its pyproject.toml, with a stale lock
+    locked.set_version("lib-c", "3.1.0")
+    assert update_locked_packages(config, locked_packages, locked) == 2
+    # only the locked path packages are rewritten
+    assert locked_packages == [
+        {"name": "lib-a", "version": "1.0.0"},
+        {"name": "lib-b", "version": "2.0.0", "dependencies": {"lib-a": {"path": "../lib-a", "develop": True}}},
+        {"name": "lib-c", "version": "3.1.0", "dependencies": {"lib-a": {"version": "1.0.0"}}},
+    ]
+
+
+def test_read_path_version(tmp_path: Path) -> None:
+    (tmp_path / "lib-a").mkdir()
+    (tmp_path / "lib-a" / "pyproject.toml").write_text('[project]\nname = "lib-a"\nversion = "1.0.0"\n')
+    (tmp_path / "lib-b").mkdir()
+    (tmp_path / "lib-b" / "pyproject.toml").write_text('[tool.poetry]\nname = "lib-b"\nversion = "2.0.0"\n')
+    (tmp_path / "lib-c").mkdir()
+    (tmp_path / "lib-c" / "pyproject.toml").write_text('[tool.poetry]\nname = "lib-c"\n')
+    with zipfile.ZipFile(tmp_path / "lib_d-3.0.0-py3-none-any.whl", "w") as whl:
+        whl.writestr("lib_d/__init__.py", "")
+        whl.writestr(
+            "lib_d-3.0.0.dist-info/METADATA", "Metadata-Version: 2.1\nName: lib-d\nVersion: 3.0.0\n\nVersion: 4\n"
+        )
+    with zipfile.ZipFile(tmp_path / "lib_e-1.0.0-py3-none-any.whl", "w") as whl:
+        whl.writestr("lib_e-1.0.0.dist-info/METADATA", "Name: lib-e\n\nVersion: 4\n")
+    with zipfile.ZipFile(tmp_path / "lib_g-1.0.0-py3-none-any.whl", "w") as whl:
+        whl.writestr("lib_g/METADATA", "Version: 1.0.0\n")
+    with zipfile.ZipFile(tmp_path / "lib_h-1.0.0-py3-none-any.whl", "w") as whl:
+        whl.writestr("lib_h-1.0.0.dist-info/METADATA", "Name: lib-h")
+    (tmp_path / "lib_f-1.0.0.tar.gz").write_bytes(b"")
+
+    assert read_path_version(tmp_path / "lib-a") == "1.0.0"
+    assert read_path_version(tmp_path / "lib-b") == "2.0.0"
+    assert read_path_version(tmp_path / "lib-c") is None
+    assert read_path_version(tmp_path / "lib_d-3.0.0-py3-none-any.whl") == "3.0.0"
+    assert read_path_version(tmp_path / "lib_e-1.0.0-py3-none-any.whl") is None
+    assert read_path_version(tmp_path / "lib_f-1.0.0.tar.gz") is None
+    assert read_path_version(tmp_path / "lib_g-1.0.0-py3-none-any.whl") is None
+    assert read_path_version(tmp_path / "lib_h-1.0.0-py3-none-any.whl") is None
+    assert read_path_version(tmp_path / "lib-missing") is None
+
+    # cached until the project changes
+    pyproject_path = tmp_path / "lib-a" / "pyproject.toml"
+    mtime = pyproject_path.stat().st_mtime_ns
+    pyproject_path.write_text('[project]\nname = "lib-a"\nversion = "9.0.0"\n')
+    os.utime(pyproject_path, ns=(mtime, mtime))
+    assert read_path_version(tmp_path / "lib-a") == "1.0.0"
+    os.utime(pyproject_path, ns=(mtime + 1, mtime + 1))
+    assert read_path_version(tmp_path / "lib-a") == "9.0.0"
+
+
+def test_resolve_path_versions(tmp_path: Path) -> None:
+    (tmp_path / "lib-a").mkdir()
+    (tmp_path / "lib-a" / "pyproject.toml").write_text('[tool.poetry]\nname = "lib-a"\nversion = "1.1.0"\n')
+    package = ProjectPackage("app", "1.0.0")
+    package.add_dependency(DirectoryDependency("lib-a", tmp_path / "lib-a", develop=True))
+    package.add_dependency(DirectoryDependency("lib-missing", tmp_path / "lib-missing"))
+    package.add_dependency(Dependency("requests", "^2.0"))
+    locked = LockedPackageIndex([{"name": "lib-a", "version": "1.0.0"}, {"name": "lib-missing", "version": "2.0.0"}])
+
+    resolve_path_versions(Config.from_dict({}), package, locked)
+    assert locked.get_version("lib-a", "*") == "1.1.0"
+    # without a readable version, the locked one is kept
+    assert locked.get_version("lib-missing", "*") == "2.0.0"
+    assert locked.get_entry("requests") is None
+
+
+def test_resolve_path_versions_of_locked_packages(tmp_path: Path) -> None:
+    """The versions of the locked path packages, like the dependencies of path dependencies, are resolved too."""
+    for name, version in [("lib-a", "1.1.0"), ("lib-b", "2.1.0")]:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "pyproject.toml").write_text(f'[tool.poetry]\nname = "{name}"\nversion = "{version}"\n')
+    (tmp_path / "app").mkdir()
+    locked = LockedPackageIndex(
+        [
+            {"name": "lib-a", "version": "1.0.0", "source": {"type": "directory", "url": "../lib-a"}},
+            {"name": "lib-b", "version": "2.0.0", "source": {"type": "directory", "url": "../lib-b"}, "develop": True},
+            {"name": "lib-c", "version": "3.0.0", "source": {"type": "directory", "url": "../lib-c"}},
+            {"name": "dummy", "version": "1.0.0", "source": {"type": "git", "url": "https://example.com/dummy.git"}},
+        ]
+    )
+
+    resolve_path_versions(
+        Config.from_dict({"only_develop": True}), ProjectPackage("app", "1.0.0"), locked, tmp_path / "app"
+    )
+    # only the replaced packages
+    assert locked.get_version("lib-a", "*") == "1.0.0"
+    assert locked.get_version("lib-b", "*") == "2.1.0"
+    resolve_path_versions(Config.from_dict({}), ProjectPackage("app", "1.0.0"), locked, tmp_path / "app")
+    assert locked.get_version("lib-a", "*") == "1.1.0"
+    assert locked.get_version("lib-c", "*") == "3.0.0"
+    assert locked.get_entry("lib-b") == LockedPackage(
+        "lib-b", "2.1.0", "directory", develop=True, source_url="../lib-b"
+    )
+
+
+def test_undo_journal_restores_toml_document() -> None:
+    content = """[tool.poetry.dependencies]
+python = "^3.8"
+lib-a = {path = "../lib-a", develop = true}  # a comment
+lib-b = { path = "../lib-b" }
+"""
+    toml_data = tomlkit.parse(content)
+    dependencies = toml_data["tool"]["poetry"]["dependencies"]
+    journal = UndoJournal()
+    update_locked_dependencies(
+        Config.from_dict({}),
+        dependencies,
+        LockedPackageIndex([{"name": "lib-a", "version": "1.0.0"}]),
+        journal,
+    )
+    assert len(journal) == 2
+    assert dependencies["lib-a"] == {"version": "1.0.0"}
+    assert dependencies["lib-b"] == {"version": "*"}
+
+    journal.restore()
+    assert len(journal) == 0
+    assert toml_data.as_string() == content
+
+
+def test_replace_group_dependencies() -> None:
+    group = DependencyGroup("main")
+    for dependency in [
+        Dependency("lib-a", "^1.0"),
+        DirectoryDependency("lib-b", Path("../lib-b")),
+        Dependency("lib-c", "^2.0"),
+        # multiple dependencies with the same name, for different markers
+        DirectoryDependency("lib-d", Path("../lib-d")),
+        DirectoryDependency("lib-d", Path("../lib-d2")),
+    ]:
+        group.add_dependency(dependency)
+    replacements = {"lib-b": Dependency("lib-b", "~=1.1"), "lib-d": Dependency("lib-d", "~=0.1")}
+
+    replace_group_dependencies(group, replacements)
+    assert [dep.to_pep_508() for dep in group.dependencies] == [
+        "lib-a (>=1.0,<2.0)",
+        "lib-b (>=1.1,<2.0)",
+        "lib-c (>=2.0,<3.0)",
+        "lib-d (>=0.1,<1.0)",
+    ]
+    assert group.dependencies[1] is replacements["lib-b"]
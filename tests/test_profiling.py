@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import os
+import pstats
+import tracemalloc
+from pathlib import Path
+from typing import Any
+
+import pytest
+from cleo.events.event import Event
+from cleo.events.event_dispatcher import EventDispatcher
+
+from poetry_plugin_mono_repo_deps.profiling import HandlerProfiler
+from tests.helpers import run_test_app
+
+
+def allocate(_event: Event, _event_name: str, _dispatcher: EventDispatcher) -> None:
+    allocations.append(bytearray(1 << 20))
+
+
+allocations: list[Any] = []
+
+
+def test_handler_profiler(tmp_path: Path) -> None:
+    profiler = HandlerProfiler(tmp_path / "profiles", ["cpu", "memory"])
+    profiled = profiler.wrap(allocate)
+    assert profiled.__name__ == "allocate"
+
+    profiled(Event(), "event", EventDispatcher())
+    name = f"unknown-allocate-{os.getpid()}-0"
+    assert sorted(path.name for path in (tmp_path / "profiles").iterdir()) == [
+        f"{name}-allocations.txt",
+        f"{name}.pstats",
+        f"{name}.tracemalloc",
+    ]
+    stats = pstats.Stats(str(tmp_path / "profiles" / f"{name}.pstats")).stats  # type: ignore[attr-defined]
+    assert any(function == "allocate" for _file, _line, function in stats)
+    top_allocations = (tmp_path / "profiles" / f"{name}-allocations.txt").read_text().splitlines()
+    assert "test_profiling.py" in top_allocations[1]
+    assert tracemalloc.Snapshot.load(str(tmp_path / "profiles" / f"{name}.tracemalloc")).traces
+    assert not tracemalloc.is_tracing()
+
+
+def test_handler_profiler_single_mode(tmp_path: Path) -> None:
+    def fail(_event: Event, _event_name: str, _dispatcher: EventDispatcher) -> None:
+        raise RuntimeError("failed")
+
+    # the profiles of failing handlers are written as well
+    with pytest.raises(RuntimeError, match="failed"):
+        HandlerProfiler(tmp_path / "cpu", ["cpu"]).wrap(fail)(Event(), "event", EventDispatcher())
+    assert [path.suffix for path in (tmp_path / "cpu").iterdir()] == [".pstats"]
+
+    # tracing that was already started, keeps running
+    tracemalloc.start()
+    try:
+        HandlerProfiler(tmp_path / "memory", ["memory"]).wrap(allocate)(Event(), "event", EventDispatcher())
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+    assert sorted(path.suffix for path in (tmp_path / "memory").iterdir()) == [".tracemalloc", ".txt"]
+
+
+def test_handler_profiler_from_environment(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    assert HandlerProfiler.from_environment(tmp_path).modes == ["cpu", "memory"]
+    monkeypatch.setenv("POETRY_MONOREPO_DEPS_PROFILE_MODES", " memory, ")
+    assert HandlerProfiler.from_environment(tmp_path).modes == ["memory"]
+    for value in ["", "cpu,disk"]:
+        monkeypatch.setenv("POETRY_MONOREPO_DEPS_PROFILE_MODES", value)
+        with pytest.raises(ValueError, match="POETRY_MONOREPO_DEPS_PROFILE_MODES should be a comma separated list"):
+            HandlerProfiler.from_environment(tmp_path)
+
+
+def test_build_profiles(fixture_simple_a: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("POETRY_MONOREPO_DEPS_PROFILE", str(tmp_path / "profiles"))
+    monkeypatch.setenv("POETRY_MONOREPO_DEPS_PROFILE_MODES", "cpu")
+    os.chdir(fixture_simple_a / "lib-enabled")
+
+    _out, err = run_test_app(["poetry", "build", "--format", "wheel"])
+    assert err == ""
+    profiles = sorted(path.name for path in (tmp_path / "profiles").iterdir())
+    assert profiles == [
+        f"build-handle_command-{os.getpid()}-0.pstats",
+        f"build-handle_terminate-{os.getpid()}-1.pstats",
+    ]
+    stats = pstats.Stats(str(tmp_path / "profiles" / profiles[0])).stats  # type: ignore[attr-defined]
+    assert any(function == "update_locked_repository" for _file, _line, function in stats)
+
+
+def test_build_invalid_profile_modes(fixture_simple_a: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("POETRY_MONOREPO_DEPS_PROFILE", str(tmp_path / "profiles"))
+    monkeypatch.setenv("POETRY_MONOREPO_DEPS_PROFILE_MODES", "cpu,disk")
+    os.chdir(fixture_simple_a / "lib-enabled")
+
+    out, err = run_test_app(["poetry", "build", "--format", "wheel"])
+    assert (
+        "Not profiling, as POETRY_MONOREPO_DEPS_PROFILE_MODES should be a comma separated list of ['cpu', 'memory']."
+        in err
+    )
+    assert "Building lib-enabled (0.0.1)" in out
+    assert not (tmp_path / "profiles").exists()
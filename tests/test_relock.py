@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import os
+import shutil
+import zipfile
+from pathlib import Path
+
+from poetry.factory import Factory
+from pytest_mock import MockerFixture
+
+from poetry_plugin_mono_repo_deps import commands
+from poetry_plugin_mono_repo_deps.commands import relock_package
+from poetry_plugin_mono_repo_deps.relock import file_hashes, patch_lock_file
+from tests.helpers import run_test_app
+
+
+def bump_version(project_dir: Path, version: str) -> None:
+    pyproject_path = project_dir / "pyproject.toml"
+    pyproject_path.write_text(pyproject_path.read_text().replace('version = "0.0.1"', f'version = "{version}"'))
+
+
+def add_dependency(project_dir: Path, dependency: str) -> None:
+    pyproject_path = project_dir / "pyproject.toml"
+    pyproject_path.write_text(
+        pyproject_path.read_text().replace("[tool.poetry.dependencies]", f"[tool.poetry.dependencies]\n{dependency}")
+    )
+
+
+def test_patch_lock_file(fixture_simple_a: Path) -> None:
+    bump_version(fixture_simple_a / "lib-a", "0.1.0")
+    lock_path = fixture_simple_a / "lib-nested" / "poetry.lock"
+    original_lines = lock_path.read_text().splitlines()
+
+    assert patch_lock_file(fixture_simple_a / "lib-nested") == ["lib-a (0.0.1 -> 0.1.0)"]
+    # only the version of lib-a is patched, the lock file stays fresh
+    changed = [(old, new) for old, new in zip(original_lines, lock_path.read_text().splitlines()) if old != new]
+    assert changed == [('version = "0.0.1"', 'version = "0.1.0"')]
+    assert Factory().create_poetry(fixture_simple_a / "lib-nested").locker.is_fresh()
+    assert patch_lock_file(fixture_simple_a / "lib-nested") == []
+
+
+def test_patch_lock_file_needs_resolve(fixture_simple_a: Path) -> None:
+    lock_content = (fixture_simple_a / "lib-nested" / "poetry.lock").read_text()
+    # lib-b (a path dependency of lib-nested) got a new requirement
+    add_dependency(fixture_simple_a / "lib-b", 'requests = "^2.0"')
+    assert patch_lock_file(fixture_simple_a / "lib-nested") is None
+    assert (fixture_simple_a / "lib-nested" / "poetry.lock").read_text() == lock_content
+    # the dependencies of lib-b itself changed
+    assert patch_lock_file(fixture_simple_a / "lib-b") is None
+    # as lib-a can't be read, or found, anymore
+    (fixture_simple_a / "lib-a" / "pyproject.toml").unlink()
+    assert patch_lock_file(fixture_simple_a / "lib-enabled") is None
+    shutil.rmtree(fixture_simple_a / "lib-a")
+    assert patch_lock_file(fixture_simple_a / "lib-enabled") is None
+    # without a lock file
+    (fixture_simple_a / "lib-independent" / "poetry.lock").unlink()
+    assert patch_lock_file(fixture_simple_a / "lib-independent") is None
+
+
+def test_patch_lock_file_of_file_dependency(tmp_path: Path) -> None:
+    wheel_path = tmp_path / "lib_w-1.0.0-py3-none-any.whl"
+
+    def write_wheel(version: str) -> None:
+        with zipfile.ZipFile(wheel_path, "w") as whl:
+            whl.writestr(
+                "lib_w-1.0.0.dist-info/METADATA",
+                f"Metadata-Version: 2.1\nName: lib-w\nVersion: {version}\nRequires-Python: >=3.8\n"
+                'Provides-Extra: attrs\nRequires-Dist: attrs>=23.2.0; extra == "attrs"\n',
+            )
+
+    project_dir = tmp_path / "app"
+    project_dir.mkdir()
+    (project_dir / "pyproject.toml").write_text(
+        """[tool.poetry]
+name = "app"
+version = "0.0.1"
+description = ""
+authors = []
+
+[tool.poetry.dependencies]
+python = "^3.8"
+lib-w = {path = "../lib_w-1.0.0-py3-none-any.whl"}
+"""
+    )
+    write_wheel("1.0.0")
+    content_hash = Factory().create_poetry(project_dir).locker._get_content_hash()
+    (project_dir / "poetry.lock").write_text(
+        f"""[[package]]
+name = "lib-w"
+version = "1.0.0"
+description = ""
+optional = false
+python-versions = ">=3.8"
+files = [
+    {{file = "lib_w-1.0.0-py3-none-any.whl", hash = "sha256:0000"}},
+]
+
+[package.dependencies]
+attrs = {{version = ">=23.2.0", optional = true}}
+
+[package.extras]
+attrs = ["attrs (>=23.2.0)"]
+
+[package.source]
+type = "file"
+url = "../lib_w-1.0.0-py3-none-any.whl"
+
+[metadata]
+lock-version = "2.0"
+python-versions = "^3.8"
+content-hash = "{content_hash}"
+"""
+    )
+
+    # a rebuilt wheel, only its hash changed
+    assert patch_lock_file(project_dir) == ["lib-w (1.0.0 -> 1.0.0)"]
+    write_wheel("1.0.1")
+    assert patch_lock_file(project_dir) == ["lib-w (1.0.0 -> 1.0.1)"]
+    lock_data = Factory().create_poetry(project_dir).locker.lock_data
+    assert lock_data["package"][0]["version"] == "1.0.1"
+    assert lock_data["package"][0]["files"] == file_hashes(wheel_path)
+
+
+def test_relock_package(fixture_simple_a: Path) -> None:
+    project_dir = fixture_simple_a / "lib-independent"
+    result = relock_package("lib-independent", str(project_dir))
+    assert result.exit_code == 0
+    assert result.patched == ()
+
+    # outdated lock files are resolved again
+    pyproject_path = project_dir / "pyproject.toml"
+    pyproject_path.write_text(pyproject_path.read_text().replace('python = "^3.8"', 'python = ">=3.8"'))
+    result = relock_package("lib-independent", str(project_dir))
+    assert result.exit_code == 0
+    assert result.patched is None
+    assert "Writing lock file" in result.output
+    assert Factory().create_poetry(project_dir).locker.is_fresh()
+
+    # as are projects that can't be read, such that `poetry lock` reports why
+    pyproject_path.write_text(pyproject_path.read_text().replace('python = ">=3.8"', 'python = "^"'))
+    result = relock_package("lib-independent", str(project_dir))
+    assert result.exit_code == 1
+    assert "Could not parse version constraint: ^" in result.output
+
+
+def test_monorepo_relock_internal(fixture_simple_a: Path) -> None:
+    bump_version(fixture_simple_a / "lib-a", "0.1.0")
+    (fixture_simple_a / "lib-disabled" / "poetry.lock").unlink()
+    pyproject_path = fixture_simple_a / "lib-independent" / "pyproject.toml"
+    pyproject_path.write_text(pyproject_path.read_text().replace('python = "^3.8"', 'python = ">=3.8"'))
+    root = ["--root", str(fixture_simple_a)]
+
+    out, err = run_test_app(["poetry", "monorepo", "relock-internal", "--all", "--jobs", "2", "-v", *root])
+    assert err == ""
+    assert "Updating 10 lock files with 2 jobs" in out
+    assert "Patched lib-nested: lib-a (0.0.1 -> 0.1.0)" in out
+    assert "Locked lib-independent in " in out
+    assert "lib-a is up to date" in out
+    assert "Updated 10 lock files in " in out
+    assert 'version = "0.1.0"' in (fixture_simple_a / "lib-b" / "poetry.lock").read_text()
+
+    out, err = run_test_app(["poetry", "monorepo", "relock-internal", "lib-disabled", *root])
+    assert err == ""
+    assert "No lock files to update" in out
+    _out, err = run_test_app(["poetry", "monorepo", "relock-internal", *root])
+    assert "Specify the packages, the changes, or select all packages with --all" in err
+
+
+def test_monorepo_relock_internal_failure(fixture_simple_a: Path) -> None:
+    # an invalid constraint can't be locked
+    pyproject_path = fixture_simple_a / "lib-independent" / "pyproject.toml"
+    pyproject_path.write_text(pyproject_path.read_text().replace('python = "^3.8"', 'python = "^3.8"\nlib-x = "^"'))
+
+    _out, err = run_test_app(
+        ["poetry", "monorepo", "relock-internal", "lib-independent", "--root", str(fixture_simple_a)]
+    )
+    assert "Failed to lock lib-independent in " in err
+    assert "Failed to update the lock files of lib-independent" in err
+
+
+def crash_worker(*_args: object) -> None:
+    os._exit(1)
+
+
+def test_monorepo_relock_internal_worker_crash(fixture_simple_a: Path, mocker: MockerFixture) -> None:
+    mocker.patch.object(commands, "relock_package", crash_worker)
+
+    _out, err = run_test_app(
+        ["poetry", "monorepo", "relock-internal", "lib-a", "lib-b", "--root", str(fixture_simple_a)]
+    )
+    assert "The worker failed: BrokenProcessPool: " in err
+    assert "Failed to lock lib-a in " in err
+    assert "Failed to lock lib-b in " in err
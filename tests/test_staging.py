@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+from poetry_plugin_mono_repo_deps.staging import STAGING_DIRECTORY, StagingDirectory, link_tree
+from tests.helpers import prepare_test_poetry
+
+
+def test_link_tree(tmp_path: Path) -> None:
+    source = tmp_path / "source"
+    (source / "pkg" / "__pycache__").mkdir(parents=True)
+    (source / "pkg" / "__init__.py").write_text("")
+    (source / "pkg" / "__pycache__" / "__init__.pyc").write_text("")
+    (source / "pkg" / "pyproject.toml").write_text("")
+    (source / "pyproject.toml").write_text("")
+    (source / "dist").mkdir()
+    (source / "dist" / "pkg.whl").write_text("")
+    os.symlink("pkg", source / "linked")
+    os.symlink("__init__.py", source / "pkg" / "linked.py")
+    (tmp_path / "LICENSE").write_text("MIT\n")
+    os.symlink("../LICENSE", source / "LICENSE")
+    (tmp_path / "shared").mkdir()
+    os.symlink("../shared", source / "shared")
+    destination = tmp_path / "staging" / "destination"
+    destination.mkdir(parents=True)
+
+    link_tree(source, destination, ["__pycache__"], [Path("pyproject.toml"), Path("dist")])
+
+    assert sorted(path.relative_to(destination).as_posix() for path in destination.rglob("*")) == [
+        "LICENSE",
+        "linked",
+        "pkg",
+        "pkg/__init__.py",
+        "pkg/linked.py",
+        "pkg/pyproject.toml",
+        "shared",
+    ]
+    # the files are linked, not copied
+    assert (destination / "pkg" / "__init__.py").stat().st_ino == (source / "pkg" / "__init__.py").stat().st_ino
+    assert (destination / "linked").is_symlink()
+    assert (destination / "pkg" / "linked.py").is_symlink()
+    # the symlinks within the tree stay relative, those leaving it would dangle from the destination
+    assert os.readlink(destination / "linked") == "pkg"
+    assert os.readlink(destination / "shared") == str(tmp_path / "shared")
+    # a file outside the tree is linked itself
+    assert not (destination / "LICENSE").is_symlink()
+    assert (destination / "LICENSE").stat().st_ino == (tmp_path / "LICENSE").stat().st_ino
+
+
+def test_staging_directory(fixture_simple_a: Path, tmp_path: Path) -> None:
+    project_dir = fixture_simple_a / "lib-enabled"
+    poetry = prepare_test_poetry(project_dir)
+    pyproject = poetry.pyproject
+    staging = StagingDirectory(project_dir, str(tmp_path / "dist"))
+
+    staging.install(poetry)
+    assert poetry.pyproject_path == staging.path / "pyproject.toml"
+    assert poetry.pyproject.data is pyproject.data
+    assert (staging.path / "lib_enabled" / "__init__.py").exists()
+
+    staging.uninstall(poetry)
+    assert poetry.pyproject is pyproject
+    assert not (project_dir / STAGING_DIRECTORY).exists()
+
+
+def test_staging_directory_external_sources(fixture_simple_a: Path, tmp_path: Path) -> None:
+    project_dir = fixture_simple_a / "lib-enabled"
+    (fixture_simple_a / "README.md").write_text("# Libraries\n")
+    poetry = prepare_test_poetry(project_dir)
+    poetry.pyproject.data["tool"]["poetry"]["readme"] = [
+        "../README.md",
+        "../docs/usage.md",
+        "../docs/other.md",
+        "/absolute.md",
+    ]
+    staging = StagingDirectory(project_dir, str(tmp_path / "dist"))
+
+    staging.install(poetry)
+    # staged as deep as the project, relative to its sources
+    assert staging.path.name == "lib-enabled"
+    assert (staging.path / "../README.md").read_text() == "# Libraries\n"
+    assert os.readlink(staging.path / "../docs") == str(fixture_simple_a / "docs")
+
+    staging.uninstall(poetry)
+    assert not (project_dir / STAGING_DIRECTORY).exists()
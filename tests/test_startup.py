@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+from typing import Any
+
+# Poetry imports the plugin module on every invocation, thus it should only cost a fraction of Poetry's own startup
+IMPORT_BUDGET_SECONDS = 0.05
+
+# The modules needed to rewrite dependencies, which should only be imported when a configured command is run
+DEFERRED_MODULES = [
+    "packaging.utils",
+    "poetry.core.packages.dependency",
+    "poetry.core.packages.package",
+    "poetry.factory",
+    "poetry.packages.locker",
+    "poetry.poetry",
+    "poetry.repositories.lockfile_repository",
+    "poetry.utils.helpers",
+    "tomlkit",
+]
+
+MEASURE_IMPORT = """
+import json
+import sys
+import time
+
+# the modules Poetry already imported at the moment it loads the application plugins
+import poetry.console.application
+import poetry.plugins.application_plugin
+
+before = set(sys.modules)
+start = time.perf_counter()
+import poetry_plugin_mono_repo_deps.plugin
+duration = time.perf_counter() - start
+print(json.dumps({"duration": duration, "modules": sorted(set(sys.modules) - before)}))
+"""
+
+
+def measure_plugin_import() -> dict[str, Any]:
+    # a fresh interpreter, as the test session already imported the plugin
+    result = subprocess.run([sys.executable, "-c", MEASURE_IMPORT], check=True, capture_output=True, text=True)
+    measurement: dict[str, Any] = json.loads(result.stdout)
+    return measurement
+
+
+def test_plugin_import_defers_rewrite_modules() -> None:
+    imported_modules = measure_plugin_import()["modules"]
+    assert [module for module in DEFERRED_MODULES if module in imported_modules] == []
+
+
+def test_plugin_import_within_budget() -> None:
+    # best of a few runs, to be robust against a busy machine
+    durations = [measure_plugin_import()["duration"] for _ in range(3)]
+    assert min(durations) < IMPORT_BUDGET_SECONDS
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from poetry_plugin_mono_repo_deps import workspace
+from poetry_plugin_mono_repo_deps.workspace import (
+    INDEX_VERSION,
+    WORKSPACE_INDEX,
+    Workspace,
+    WorkspacePackage,
+    changed_paths,
+    load_workspace,
+    parse_pyproject,
+)
+from tests.conftest import FixtureDirGetter
+
+
+@pytest.fixture
+def repo(tmp_path: Path, fixture_dir: FixtureDirGetter) -> Path:
+    root = tmp_path / "repo"
+    shutil.copytree(fixture_dir("simple_a"), root)
+    return root
+
+
+def test_load_workspace(repo: Path) -> None:
+    (repo / ".venv" / "lib-venv").mkdir(parents=True)
+    (repo / ".venv" / "lib-venv" / "pyproject.toml").write_text('[tool.poetry]\nname = "lib-venv"\n')
+    # virtualenvs that aren't hidden are recognized by their configuration
+    (repo / "venv" / "lib" / "lib-env").mkdir(parents=True)
+    (repo / "venv" / "pyvenv.cfg").write_text("home = /usr/bin\n")
+    (repo / "venv" / "lib" / "lib-env" / "pyproject.toml").write_text('[tool.poetry]\nname = "lib-env"\n')
+    # the root of a monorepo commonly isn't a project itself
+    (repo / "pyproject.toml").write_text("[tool.ruff]\n")
+
+    result = load_workspace(repo)
+    assert result.root == repo.resolve()
+    assert "lib-venv" not in result.packages
+    assert "lib-env" not in result.packages
+    assert result.get_package("Lib_Nested") == WorkspacePackage("lib-nested", "0.0.1", "lib-nested", ("lib-b",))
+    assert [package.name for package in result.dependencies("lib-b")] == ["lib-a"]
+    order = [package.name for package in result.topological_order()]
+    assert order.index("lib-a") < order.index("lib-b") < order.index("lib-nested")
+    assert sorted(order) == sorted(result.packages)
+    assert json.loads((repo / WORKSPACE_INDEX).read_text())["version"] == INDEX_VERSION
+
+
+def test_load_workspace_uses_index(repo: Path, mocker: MockerFixture) -> None:
+    parse = mocker.spy(workspace, "parse_pyproject")
+    expected = load_workspace(repo).packages
+    project_count = parse.call_count
+    assert project_count == len(expected)
+
+    # a warm index doesn't parse any project, nor rewrites the index
+    index_mtime = (repo / WORKSPACE_INDEX).stat().st_mtime_ns
+    assert load_workspace(repo).packages == expected
+    assert parse.call_count == project_count
+    assert (repo / WORKSPACE_INDEX).stat().st_mtime_ns == index_mtime
+
+    # touched, but unchanged, projects aren't parsed again
+    pyproject_path = repo / "lib-b" / "pyproject.toml"
+    os.utime(pyproject_path, ns=(0, 0))
+    assert load_workspace(repo).packages == expected
+    assert parse.call_count == project_count
+
+    # changed projects are, removed projects are dropped
+    pyproject_path.write_text(pyproject_path.read_text().replace('version = "0.0.1"', 'version = "0.0.2"'))
+    shutil.rmtree(repo / "lib-nested")
+    result = load_workspace(repo)
+    assert parse.call_count == project_count + 1
+    assert result.packages["lib-b"].version == "0.0.2"
+    assert "lib-nested" not in result.packages
+    assert "lib-nested" not in json.loads((repo / WORKSPACE_INDEX).read_text())["entries"]
+
+    # an invalid index is rebuilt
+    (repo / WORKSPACE_INDEX).write_text("{")
+    assert load_workspace(repo).packages == result.packages
+    assert parse.call_count == project_count + 1 + len(result.packages)
+    # as is an index of another version
+    (repo / WORKSPACE_INDEX).write_text(json.dumps({"version": INDEX_VERSION + 1, "entries": {}}))
+    assert load_workspace(repo).packages == result.packages
+    assert parse.call_count == project_count + 1 + 2 * len(result.packages)
+
+
+def test_parse_pyproject(tmp_path: Path) -> None:
+    pyproject_path = tmp_path / "libs" / "lib-c" / "pyproject.toml"
+    toml_data = {
+        "project": {"name": "Lib_C", "version": "1.0.0"},
+        "tool": {
+            "poetry": {
+                "dependencies": {
+                    "python": "^3.8",
+                    "lib-a": {"path": "../lib-a", "develop": True},
+                    "lib-b": {"path": "../lib-b"},
+                    "requests": {"version": "^2.0"},
+                },
+                "group": {"dev": {"dependencies": {"lib-d": {"path": "../../../lib-d", "develop": True}}}},
+            },
+            "poetry-monorepo": {"deps": {"only_develop": True}},
+        },
+    }
+
+    assert parse_pyproject(tmp_path, pyproject_path, toml_data) == WorkspacePackage(
+        name="lib-c", version="1.0.0", path="libs/lib-c", dependencies=("libs/lib-a", "../lib-d")
+    )
+    assert parse_pyproject(tmp_path, pyproject_path, {"tool": {"poetry": {}}}) is None
+
+
+def test_parse_pyproject_invalid_config(tmp_path: Path) -> None:
+    toml_data = {"project": {"name": "lib-a"}, "tool": {"poetry-monorepo": {"deps": {"version_source": "git"}}}}
+    with pytest.raises(ValueError, match="Invalid configuration in .*pyproject.toml: version_source"):
+        parse_pyproject(tmp_path, tmp_path / "pyproject.toml", toml_data)
+
+
+def test_workspace_with_duplicate_names() -> None:
+    packages = [WorkspacePackage("lib-a", "1.0.0", "lib-a", ()), WorkspacePackage("lib-a", "2.0.0", "libs/lib-a", ())]
+    with pytest.raises(ValueError, match=r"Both the projects at lib-a and libs.lib-a are named lib-a"):
+        Workspace(Path("."), packages)
+
+
+def test_topological_order_with_cycle() -> None:
+    result = Workspace(
+        Path("."),
+        [
+            WorkspacePackage("lib-a", "1.0.0", "lib-a", ("lib-b",)),
+            WorkspacePackage("lib-b", "1.0.0", "lib-b", ("lib-a",)),
+        ],
+    )
+    with pytest.raises(ValueError, match="Cyclic path dependencies"):
+        result.topological_order()
+
+
+def test_affected_packages() -> None:
+    result = Workspace(
+        Path("/repo"),
+        [
+            WorkspacePackage("lib-a", "1.0.0", "libs/lib-a", ()),
+            WorkspacePackage("lib-b", "1.0.0", "libs/lib-b", ("lib-a",)),
+            WorkspacePackage("lib-c", "1.0.0", "libs/lib-b/nested/lib-c", ("lib-b",)),
+            WorkspacePackage("app", "1.0.0", "app", ("lib-a", "lib-b")),
+        ],
+    )
+    assert [package.name for package in result.dependents("lib-b")] == ["lib-c", "app"]
+    assert result.packages_for_paths(
+        [Path("libs/lib-b/lib_b/__init__.py"), Path("/repo/libs/lib-b/nested/lib-c/pyproject.toml"), Path("README.md")]
+    ) == {"lib-b", "lib-c"}
+    assert [package.name for package in result.affected(["lib-b"])] == ["lib-b", "app", "lib-c"]
+    assert [package.name for package in result.affected(["LIB_A"])] == ["lib-a", "lib-b", "app", "lib-c"]
+    assert result.affected([]) == []
+
+
+def test_changed_paths(tmp_path: Path) -> None:
+    with pytest.raises(RuntimeError, match="Failed to determine the changes in HEAD"):
+        changed_paths(tmp_path, "HEAD")